@@ -37,7 +37,7 @@ communityCenters.features.forEach(f => {
 const floodplain100 = {
   ...floodplainAll,
   features: floodplainAll.features.filter(f =>
-    ['AE', 'A', 'AO', 'VE'].includes(f.properties.FLD_ZONE)
+    ['A', 'AE', 'AH', 'AO', 'AR', 'A99', 'V', 'VE'].includes(f.properties.FLD_ZONE)
   )
 };
 
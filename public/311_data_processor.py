@@ -1,9 +1,22 @@
 import pandas as pd
+import numpy as np
+import argparse
 import json
 import os
-from datetime import datetime
-import time
 from math import radians, cos, sin, asin, sqrt
+from convert_311_to_parquet import parquet_dataset_path, iter_311_parquet
+from community_center_index import CommunityCenterIndex
+from date_windows import DEFAULT_WINDOWS, parse_dates, window_membership, windows_span
+from dedup_311_store import STORE_SUFFIX, iter_store_chunks
+from geojson_writer import GEOJSON_MODES, PointDatasetWriter, geojson_path
+from incremental_state import EXTRACT_COLUMN, CaseStateStore, existing_rows_to_keep, incremental_chunks
+from load_311_extract import read_311_extract
+from parallel_chunks import map_chunks
+
+# Columns this processor reads from the data file or a converted Parquet dataset
+PROCESSOR_COLUMNS = [
+    '365 Case Number', 'Title', 'Description', 'Created Date Local', 'Status', 'Latitude', 'Longitude'
+]
 
 def haversine(lon1, lat1, lon2, lat2):
     """Calculate distance between two points in meters"""
@@ -33,8 +46,16 @@ def load_community_centers():
         print("Community centers GeoJSON not found. Please ensure the file exists.")
         return []
 
-def filter_power_outage_requests(df):
-    """Filter for power outage, storm, and related requests"""
+def build_center_index():
+    """Community center index used for matching (None when no centers are found)"""
+    centers = load_community_centers()
+    if not centers:
+        print("No community centers found. Cannot filter by distance.")
+        return None
+    return CommunityCenterIndex.from_centers(centers, distance_fn=center_distance)
+
+def power_outage_request_mask(df):
+    """Boolean mask of power outage, storm, and related requests"""
     # Expanded keywords
     keywords = [
         'power', 'electricity', 'outage', 'blackout', 'no power', 'power off',
@@ -42,147 +63,222 @@ def filter_power_outage_requests(df):
         'storm', 'rain', 'flood', 'debris', 'tree', 'wind', 'downed', 'branch', 'weather', 'hurricane', 'tornado', 'lightning', 'storm damage', 'flooding', 'blocked', 'obstruction'
     ]
     
-    title_filter = pd.Series([False] * len(df))
-    desc_filter = pd.Series([False] * len(df))
+    title_filter = pd.Series(False, index=df.index)
+    desc_filter = pd.Series(False, index=df.index)
     
     if 'Title' in df.columns:
         title_filter = df['Title'].str.contains('|'.join(keywords), case=False, na=False)
     if 'Description' in df.columns:
         desc_filter = df['Description'].str.contains('|'.join(keywords), case=False, na=False)
     
-    return df[title_filter | desc_filter]
+    return title_filter | desc_filter
+
+def filter_power_outage_requests(df):
+    """Filter for power outage, storm, and related requests"""
+    return df[power_outage_request_mask(df)]
+
+def numeric_column(df, column):
+    """Column as a float array; missing columns and unparseable values become NaN"""
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+def column_or_unknown(df, column):
+    """Column values, or 'Unknown' for every row when the column is missing"""
+    if column not in df.columns:
+        return ['Unknown'] * len(df)
+    return df[column].to_numpy()
 
-def filter_date_range(df, month=None, year=2024):
-    """Filter for a specific month (or all if month=None)"""
-    if 'Created Date Local' not in df.columns:
+def chunk_window_membership(chunk, windows):
+    """Parse dates once and return the rows x windows membership matrix for a chunk"""
+    if 'Created Date Local' not in chunk.columns:
         print("Warning: 'Created Date Local' column not found. Cannot filter by date.")
-        return df
-    try:
-        df['date_parsed'] = pd.to_datetime(df['Created Date Local'], errors='coerce')
-        if month:
-            start_date = datetime(year, month, 1)
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1) - pd.Timedelta(seconds=1)
-            else:
-                end_date = datetime(year, month + 1, 1) - pd.Timedelta(seconds=1)
-        else:
-            # All three months: June, July, August
-            start_date = datetime(year, 6, 1)
-            end_date = datetime(year, 9, 1) - pd.Timedelta(seconds=1)
-        date_filter = (df['date_parsed'] >= start_date) & (df['date_parsed'] <= end_date)
-        filtered_df = df[date_filter].copy()
-        filtered_df = filtered_df.drop('date_parsed', axis=1)
-        return filtered_df
-    except Exception as e:
-        print(f"Error filtering by date: {e}")
-        return df
+        return np.ones((len(chunk), len(windows)), dtype=bool)
+    return window_membership(parse_dates(chunk['Created Date Local']), windows)
+
+def center_distance(lat, lon, center_lat, center_lon):
+    """Distance from a request to a center, argument order as in the original loop"""
+    return haversine(center_lon, center_lat, lon, lat)
+
+def process_chunk(chunk, center_index, windows):
+    """Date windows, keyword filter and center matching for one chunk; returns {window label: matches}"""
+    # Parse dates once and find every window each row belongs to
+    membership = chunk_window_membership(chunk, windows)
+    in_any_window = membership.any(axis=1)
+    if not in_any_window.any():
+        return {}
+
+    # Keyword filtering runs once per row, not once per window
+    candidates = chunk[in_any_window]
+    membership = membership[in_any_window]
+    keyword_mask = power_outage_request_mask(candidates).to_numpy()
+    if not keyword_mask.any():
+        return {}
+    power_requests = candidates[keyword_mask]
+    membership = membership[keyword_mask]
 
-def process_311_file(file_path, chunk_size=10000):
-    """Process 311 data file in chunks to avoid memory issues"""
+    # Match every request against the center index at once
+    lats = numeric_column(power_requests, 'Latitude')
+    lons = numeric_column(power_requests, 'Longitude')
+    center_ids, distances = center_index.first_within(lats, lons, 1609)  # 1 mile in meters
+    found = center_ids >= 0  # Only count once per request
+    if not found.any():
+        return {}
+    matched = power_requests[found]
+    matches = pd.DataFrame({
+        'request_id': column_or_unknown(matched, '365 Case Number'),
+        'title': column_or_unknown(matched, 'Title'),
+        'description': column_or_unknown(matched, 'Description'),
+        'created_date': column_or_unknown(matched, 'Created Date Local'),
+        'status': column_or_unknown(matched, 'Status'),
+        'lat': lats[found],
+        'lon': lons[found],
+        'distance_meters': distances[found],
+        'nearby_center': center_index.names_for(center_ids[found])
+    })
+
+    # Fan the matches out to every window the request falls in
+    membership = membership[found]
+    results = {}
+    for column, (label, _, _) in enumerate(windows):
+        in_window = membership[:, column]
+        if in_window.any():
+            results[label] = matches[in_window]
+    return results
+
+def count_rows(chunks, totals):
+    """Pass chunks through, adding their row count to totals['rows']"""
+    for chunk in chunks:
+        totals['rows'] += len(chunk)
+        yield chunk
+
+def process_311_file(file_path, chunk_size=10000, windows=DEFAULT_WINDOWS, workers=1, incremental=False,
+                     state_path='public/311_processor_state.sqlite', geojson_mode='pretty', report_memory=False,
+                     output_prefix='public/311', center_index=None, header_in_file=True):
+    """
+    Process 311 data file in chunks to avoid memory issues, bucketing requests into date windows.
+    With workers > 1 chunks are processed on a process pool and merged back in chunk order.
+    With incremental=True only cases that are new or changed since the last run are processed,
+    and the existing per-window outputs are updated in place.
+    geojson_mode is 'pretty', 'compact' or 'ndjson' (see geojson_writer).
+    With report_memory=True the memory of every chunk read from a .csv/.txt file is printed.
+    Outputs are written to <output_prefix>_<window label>.csv/.geojson. A prebuilt center_index
+    (see build_center_index) can be shared between runs; with header_in_file=False the extract
+    has no header line and the fixed column names are used.
+    Returns {'rows': rows read, 'matches': {window label: requests written}}, or None on failure.
+    """
     print(f"Processing 311 data file: {file_path}")
     
-    # Load community centers
-    centers = load_community_centers()
-    if not centers:
-        print("No community centers found. Cannot filter by distance.")
-        return
+    # Load community centers and index them once for the whole run
+    if center_index is None:
+        center_index = build_center_index()
+        if center_index is None:
+            return
     
-    # Determine file format and delimiter
-    if file_path.endswith('.csv'):
-        delimiter = ','
-    elif file_path.endswith('.txt'):
-        # For Houston 311 data, it's pipe-delimited
-        delimiter = '|'
+    # A deduplicated case store, or the converted Parquet dataset when it exists
+    columns = PROCESSOR_COLUMNS + [EXTRACT_COLUMN] if incremental else PROCESSOR_COLUMNS
+    dataset_dir = parquet_dataset_path(file_path)
+    if file_path.endswith(STORE_SUFFIX):
+        print(f"Reading deduplicated case store: {file_path}")
+        chunks = iter_store_chunks(file_path, columns, chunk_size)
+    elif os.path.isdir(dataset_dir):
+        print(f"Reading Parquet dataset: {dataset_dir}")
+        start_date, end_date = windows_span(windows)
+        chunks = iter_311_parquet(dataset_dir, columns=columns, start_date=start_date,
+                                  end_date=end_date, batch_size=chunk_size)
     else:
-        print("Unsupported file format. Please use .csv or .txt files.")
-        return
+        # Determine file format and delimiter
+        if file_path.endswith('.csv'):
+            delimiter = ','
+        elif file_path.endswith('.txt'):
+            # For Houston 311 data, it's pipe-delimited
+            delimiter = '|'
+        else:
+            print("Unsupported file format. Please use .csv or .txt files.")
+            return
+        
+        print(f"Using delimiter: '{delimiter}'")
+        
+        # Skip header lines (first 5 lines are metadata, header is on line 6) and parse only the needed columns
+        chunks = read_311_extract(file_path, columns, chunk_size, delimiter=delimiter, header_in_file=header_in_file,
+                                  report_memory=report_memory)
+    
+    totals = {'rows': 0}
+    chunks = count_rows(chunks, totals)
+    
+    # Skip cases already processed by an earlier run
+    store = None
+    changed_ids = set()
+    if incremental:
+        store = CaseStateStore(state_path)
+        print(f"Incremental mode: {len(store)} cases already processed ({state_path})")
+        chunks = incremental_chunks(chunks, store, changed_ids)
     
-    print(f"Using delimiter: '{delimiter}'")
+    # Stream each window's matches straight to its CSV and GeoJSON as chunks finish
+    writers = {}
     
-    # Prepare output containers for each month and all months
-    results = {
-        'June': [],
-        'July': [],
-        'August': [],
-        'JJA': []
-    }
+    def window_writer(label):
+        if label not in writers:
+            writers[label] = PointDatasetWriter(f"{output_prefix}_{label}.csv",
+                                                geojson_path(f"{output_prefix}_{label}", geojson_mode),
+                                                mode=geojson_mode, default=str)
+        return writers[label]
     
     try:
-        # Skip header lines (first 5 lines are metadata, header is on line 6)
-        skip_rows = 5
+        for chunk_results in map_chunks(process_chunk, chunks, workers, context=(center_index, windows)):
+            for label, matches in chunk_results.items():
+                window_writer(label).write_frame(matches)
         
-        for chunk in pd.read_csv(file_path, delimiter=delimiter, chunksize=chunk_size, 
-                                skiprows=skip_rows, low_memory=False, on_bad_lines='skip'):
-            # For each month and all three months
-            for label, month in [('June', 6), ('July', 7), ('August', 8), ('JJA', None)]:
-                date_filtered = filter_date_range(chunk, month=month)
-                if len(date_filtered) == 0:
-                    continue
-                power_requests = filter_power_outage_requests(date_filtered)
-                if len(power_requests) == 0:
-                    continue
-                for _, request in power_requests.iterrows():
-                    lat = None
-                    lon = None
-                    try:
-                        if 'Latitude' in request.index and pd.notna(request['Latitude']):
-                            lat = float(request['Latitude'])
-                        if 'Longitude' in request.index and pd.notna(request['Longitude']):
-                            lon = float(request['Longitude'])
-                    except (ValueError, TypeError):
-                        continue
-                    if lat is not None and lon is not None:
-                        for center in centers:
-                            distance = haversine(center['lon'], center['lat'], lon, lat)
-                            if distance <= 1609:  # 1 mile in meters
-                                results[label].append({
-                                    'request_id': request.get('365 Case Number', 'Unknown'),
-                                    'title': request.get('Title', 'Unknown'),
-                                    'description': request.get('Description', 'Unknown'),
-                                    'created_date': request.get('Created Date Local', 'Unknown'),
-                                    'status': request.get('Status', 'Unknown'),
-                                    'lat': lat,
-                                    'lon': lon,
-                                    'distance_meters': distance,
-                                    'nearby_center': center['name']
-                                })
-                                break  # Only count once per request
+        if incremental:
+            # Carry over unchanged cases from the previous outputs
+            for label, _, _ in windows:
+                kept = existing_rows_to_keep(f"{output_prefix}_{label}.csv", changed_ids)
+                if kept is not None:
+                    window_writer(label).write_frame(kept)
         
-        # Write CSV and GeoJSON for each (after processing all chunks)
-        for label in results:
-            if results[label]:
-                df = pd.DataFrame(results[label])
-                csv_out = f"public/311_{label}.csv"
-                geojson_out = f"public/311_{label}.geojson"
-                df.to_csv(csv_out, index=False)
-                features = [
-                    {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Point",
-                            "coordinates": [row['lon'], row['lat']]
-                        },
-                        "properties": {
-                            k: row[k] for k in row.index if k not in ['lat', 'lon']
-                        }
-                    }
-                    for _, row in df.iterrows()
-                ]
-                with open(geojson_out, 'w') as f:
-                    json.dump({"type": "FeatureCollection", "features": features}, f, indent=2)
-                print(f"Saved {csv_out} and {geojson_out} ({len(df)} requests)")
+        # Move the finished outputs into place
+        for label, writer in writers.items():
+            writer.close()
+            print(f"Saved {writer.csv_path} and {writer.geojson_path} ({writer.count} requests)")
+        
+        if store is not None:
+            store.commit()
+            print(f"Updated {len(changed_ids)} new or changed cases")
     
     except Exception as e:
         print(f"Error processing file: {e}")
+        for writer in writers.values():
+            writer.discard()
+        if store is not None:
+            store.rollback()
         return
+    finally:
+        if store is not None:
+            store.close()
     
     print("\nProcessing complete!")
+    return {'rows': totals['rows'], 'matches': {label: writers[label].count if label in writers else 0
+                                                for label, _, _ in windows}}
 
 def main():
     """Main function to process 311 data"""
+    parser = argparse.ArgumentParser(description='Process 311 data for power outage analysis')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for chunk processing (default: 1, serial)')
+    parser.add_argument('--incremental', action='store_true', help='Only process new or changed cases and update outputs in place')
+    parser.add_argument('--state', default='public/311_processor_state.sqlite', help='State store used by --incremental')
+    parser.add_argument('--geojson-format', choices=GEOJSON_MODES, default='pretty', help='pretty (indented), compact, or ndjson')
+    parser.add_argument('--memory-report', action='store_true', help='Print the memory of every chunk read')
+    parser.add_argument('--input', help='311 data file (or deduplicated case store, .sqlite) to process without searching or prompting')
+    args = parser.parse_args()
+    
     print("311 Data Processor for Power Outage Analysis (May-September 2024)")
     print("=" * 60)
     
+    if args.input:
+        process_311_file(args.input, workers=args.workers, incremental=args.incremental, state_path=args.state,
+                         geojson_mode=args.geojson_format, report_memory=args.memory_report)
+        return
+    
     # Look for 311 data files
     possible_files = []
     for root, dirs, files in os.walk('.'):
@@ -212,7 +308,8 @@ def main():
     print(f"\nProcessing: {selected_file}")
     
     # Process the file
-    process_311_file(selected_file)
+    process_311_file(selected_file, workers=args.workers, incremental=args.incremental, state_path=args.state,
+                     geojson_mode=args.geojson_format, report_memory=args.memory_report)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
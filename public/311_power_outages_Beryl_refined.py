@@ -4,11 +4,25 @@ Refined 311 Power Outage Analysis for Hurricane Beryl (July 8-30, 2024)
 This script filters for ACTUAL power outages only, excluding traffic lights, storm debris, etc.
 """
 
+import argparse
 import pandas as pd
 import json
 from datetime import datetime
 import math
 import os
+from category_rules import classify_power_outages
+from community_center_index import CommunityCenterIndex
+from convert_311_to_parquet import parquet_dataset_path, iter_311_parquet
+from dedup_311_store import STORE_SUFFIX, iter_store_chunks
+from geojson_writer import GEOJSON_MODES, FeatureCollectionWriter, geojson_path
+from incremental_state import EXTRACT_COLUMN, CaseStateStore, incremental_chunks, merge_with_existing
+from load_311_extract import read_311_extract
+from parallel_chunks import map_chunks
+
+# Columns this script reads from the extract or a converted Parquet dataset
+BERYL_COLUMNS = [
+    '365 Case Number', 'Title', 'Description', 'Created Date Local', 'Status', 'Latitude', 'Longitude'
+]
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points using Haversine formula"""
@@ -47,84 +61,49 @@ def load_community_centers():
         print("Warning: community_centers.geojson not found. Distance calculations will be skipped.")
         return []
 
-def is_actual_power_outage(title, description):
-    """
-    Refined filter to identify ACTUAL power outages only.
-    Excludes storm debris, garbage, and other unrelated calls, but includes traffic lights and street lights.
-    """
-    # Convert to lowercase for case-insensitive matching
-    title_lower = title.lower()
-    desc_lower = description.lower()
-    
-    # Keywords that indicate ACTUAL power outages
-    power_outage_keywords = [
-        'power out', 'electricity out', 'no power', 'lost power', 'power outage',
-        'electrical outage', 'power failure', 'electricity failure', 'power down',
-        'electricity down', 'power off', 'electricity off', 'power cut',
-        'electricity cut', 'power loss', 'electricity loss'
-    ]
+def process_chunk(chunk, center_index, start_date, end_date):
+    """Date filter, outage classification and nearest center for one chunk (None when nothing matched)"""
+    # Convert date column (using 'Created Date Local' column)
+    chunk['Created Date Local'] = pd.to_datetime(chunk['Created Date Local'], errors='coerce')
     
-    # Keywords that indicate power line issues (actual outages)
-    power_line_keywords = [
-        'power line down', 'power line hanging', 'power line broken',
-        'power line damaged', 'power line fallen', 'power line on ground',
-        'electrical line down', 'electrical line hanging', 'electrical line broken',
-        'electrical line damaged', 'electrical line fallen', 'electrical line on ground'
-    ]
+    # Filter by date range
+    date_filter = (chunk['Created Date Local'] >= start_date) & (chunk['Created Date Local'] <= end_date)
+    chunk = chunk[date_filter]
     
-    # Keywords that indicate utility/power company issues
-    utility_keywords = [
-        'centerpoint', 'center point', 'electric company', 'power company',
-        'utility company', 'electrical company'
-    ]
+    if chunk.empty:
+        return None
     
-    # Keywords that indicate Beryl-related power issues
-    beryl_power_keywords = [
-        'beryl power', 'hurricane beryl power', 'beryl electricity',
-        'hurricane beryl electricity', 'beryl outage', 'hurricane beryl outage'
-    ]
+    # Apply refined power outage filter
+    power_outage_filter = classify_power_outages(chunk['Title'], chunk['Description'])
     
-    # Keywords for traffic lights and street lights (keeping these)
-    traffic_street_light_keywords = [
-        'traffic light', 'traffic signal', 'street light', 'street lamp',
-        'lights out', 'light out', 'lights not working', 'light not working',
-        'flashing red', 'flashing lights', 'traffic lights out', 'traffic light out'
-    ]
+    power_outages = chunk[power_outage_filter].copy()
     
-    # Check for actual power outage indicators
-    for keyword in power_outage_keywords + power_line_keywords + utility_keywords + beryl_power_keywords + traffic_street_light_keywords:
-        if keyword in title_lower or keyword in desc_lower:
-            return True
+    if power_outages.empty:
+        return None
     
-    # Additional context checks for power-related issues
-    if any(word in title_lower or word in desc_lower for word in ['outage', 'out', 'down', 'off', 'cut', 'loss']):
-        # But exclude storm debris, garbage, and other non-power issues
-        exclude_keywords = [
-            'storm debris', 'tree debris', 'garbage', 'trash', 'recycling',
-            'water', 'sewer', 'drainage', 'flooding', 'parking', 'graffiti',
-            'building code', 'nuisance', 'occupancy', 'health code',
-            'missed garbage', 'missed trash', 'missed recycling', 'missed heavy trash',
-            'container replacement', 'bandit sign', 'fire hydrant'
-        ]
-        
-        # If it contains exclusion keywords, it's not a power outage
-        for exclude in exclude_keywords:
-            if exclude in title_lower or exclude in desc_lower:
-                return False
-        
-        # If it passed the exclusion check and contains power-related words, it might be a power outage
-        power_indicators = ['power', 'electric', 'electrical', 'electricity', 'utility', 'light']
-        if any(indicator in title_lower or indicator in desc_lower for indicator in power_indicators):
-            return True
-    
-    return False
+    # Nearest community center for every outage at once
+    lats = pd.to_numeric(power_outages['Latitude'], errors='coerce').to_numpy(dtype=float)
+    lons = pd.to_numeric(power_outages['Longitude'], errors='coerce').to_numpy(dtype=float)
+    center_ids, distances = center_index.nearest(lats, lons)
+    power_outages['distance_meters'] = distances[:, 0]
+    power_outages['nearby_center'] = center_index.names_for(center_ids[:, 0])
+    return power_outages
 
-def process_311_data(input_file, output_prefix):
-    """Process 311 data with refined power outage filtering"""
+def process_311_data(input_file, output_prefix, workers=1, incremental=False, state_path=None, geojson_mode='pretty',
+                     report_memory=False):
+    """
+    Process 311 data with refined power outage filtering.
+    With workers > 1 chunks are processed on a process pool and merged back in chunk order.
+    With incremental=True only cases that are new or changed since the last run are processed,
+    and the existing CSV/GeoJSON outputs are updated in place.
+    geojson_mode is 'pretty', 'compact' or 'ndjson' (see geojson_writer).
+    With report_memory=True the memory of every chunk read from the raw extract is printed.
+    """
     print(f"Processing {input_file}...")
     
-    # Load community centers
+    # Load community centers and index them once for the whole run
     centers = load_community_centers()
+    center_index = CommunityCenterIndex.from_centers(centers, distance_fn=haversine_distance)
     
     # Define date range for Beryl (July 8-30, 2024)
     start_date = datetime(2024, 7, 8)
@@ -134,74 +113,54 @@ def process_311_data(input_file, output_prefix):
     chunk_size = 10000
     all_power_outages = []
     
-    # The header row has line breaks, so we need to handle it manually
-    column_names = [
-        '365 Case Number', 'Case Number', 'Incident Address', 'Latitude', 'Longitude', 
-        'Status', 'Created Date Local', 'Closed Date', 'Title', 'Incident Case Type',
-        'SLA Time', 'Resolve By Time', 'Service Area', 'Council District', 'Key Map',
-        'Department', 'Division', 'AVA Case Type', 'State Code', 'State Code Name',
-        'SLA Start Time', 'X', 'Y', 'Incident Street', 'Incident City', 'Incident State',
-        'Zip Code', 'TaxID', 'Created Date UTC', 'Customer SuperNeighborhood',
-        'Management District', 'Garbage Route', 'Garbage Day', 'SWM Quadrant',
-        'Recycling Route', 'Recycling Day', 'Recycling Quadrant', 'Recycling Areas',
-        'Heavy Trash Day', 'Heavy Trash Quadrant', 'Queue', 'ETJ', 'SLA Name',
-        'Channel', 'Extract Date', 'Latest Case Notes', 'Sample Case Confilcts Notes',
-        'Description', 'Resolution Notes'
-    ]
-    for chunk_num, chunk in enumerate(pd.read_csv(input_file, delimiter='|', chunksize=chunk_size, low_memory=False, skiprows=6, header=None, on_bad_lines='skip')):
-        print(f"Processing chunk {chunk_num + 1}...")
-        chunk.columns = column_names
-        
-        # Convert date column (using 'Created Date Local' column)
-        chunk['Created Date Local'] = pd.to_datetime(chunk['Created Date Local'], errors='coerce')
-        
-        # Filter by date range
-        date_filter = (chunk['Created Date Local'] >= start_date) & (chunk['Created Date Local'] <= end_date)
-        chunk = chunk[date_filter]
-        
-        if chunk.empty:
-            continue
+    # A deduplicated case store, or the converted Parquet dataset when it exists (only Beryl's columns and dates)
+    columns = BERYL_COLUMNS + [EXTRACT_COLUMN] if incremental else BERYL_COLUMNS
+    dataset_dir = parquet_dataset_path(input_file)
+    if input_file.endswith(STORE_SUFFIX):
+        print(f"Reading deduplicated case store: {input_file}")
+        chunks = iter_store_chunks(input_file, columns, chunk_size)
+    elif os.path.isdir(dataset_dir):
+        print(f"Reading Parquet dataset: {dataset_dir}")
+        chunks = iter_311_parquet(dataset_dir, columns=columns, start_date=start_date,
+                                  end_date=end_date, batch_size=chunk_size)
+    else:
+        # Only the columns Beryl needs, typed while parsing
+        chunks = read_311_extract(input_file, columns, chunk_size, report_memory=report_memory)
+    
+    # Skip cases already processed by an earlier run
+    store = None
+    changed_ids = set()
+    if incremental:
+        state_path = state_path or f"{output_prefix}_state.sqlite"
+        store = CaseStateStore(state_path)
+        print(f"Incremental mode: {len(store)} cases already processed ({state_path})")
+        chunks = incremental_chunks(chunks, store, changed_ids)
+    
+    try:
+        for chunk_num, power_outages in enumerate(map_chunks(process_chunk, chunks, workers,
+                                                             context=(center_index, start_date, end_date))):
+            print(f"Processed chunk {chunk_num + 1}...")
+            if power_outages is not None:
+                all_power_outages.append(power_outages)
         
-        # Apply refined power outage filter
-        power_outage_filter = chunk.apply(
-            lambda row: is_actual_power_outage(str(row['Title']), str(row['Description'])), 
-            axis=1
-        )
+        if not all_power_outages and not incremental:
+            print("No power outages found in the specified date range.")
+            return
         
-        power_outages = chunk[power_outage_filter].copy()
+        write_outputs(all_power_outages, output_prefix, start_date, end_date, changed_ids if incremental else None,
+                      geojson_mode)
         
-        if not power_outages.empty:
-            # Calculate distances to community centers
-            for idx, row in power_outages.iterrows():
-                min_distance = float('inf')
-                nearest_center = None
-                
-                for center in centers:
-                    try:
-                        distance = haversine_distance(
-                            float(row['Latitude']), float(row['Longitude']),
-                            center['lat'], center['lon']
-                        )
-                        if distance < min_distance:
-                            min_distance = distance
-                            nearest_center = center['name']
-                    except (ValueError, TypeError):
-                        continue
-                
-                power_outages.at[idx, 'distance_meters'] = min_distance if min_distance != float('inf') else None
-                power_outages.at[idx, 'nearby_center'] = nearest_center
-            
-            all_power_outages.append(power_outages)
-    
-    if not all_power_outages:
-        print("No power outages found in the specified date range.")
-        return
-    
-    # Combine all results
-    final_df = pd.concat(all_power_outages, ignore_index=True)
-    
-    # Sort by date
-    final_df = final_df.sort_values('Created Date Local', ascending=False)
+        if store is not None:
+            store.commit()
+            print(f"Updated {len(changed_ids)} new or changed cases")
+    finally:
+        # Closing without commit discards the staged state of a failed run
+        if store is not None:
+            store.close()
+
+def write_outputs(all_power_outages, output_prefix, start_date, end_date, changed_ids=None, geojson_mode='pretty'):
+    """Write the CSV, GeoJSON and summary; with changed_ids, merge into the existing outputs"""
+    csv_filename = f"{output_prefix}.csv"
     
     # Select and rename columns for output
     output_columns = {
@@ -216,44 +175,47 @@ def process_311_data(input_file, output_prefix):
         'nearby_center': 'nearby_center'
     }
     
-    final_df = final_df[list(output_columns.keys())].rename(columns=output_columns)
+    if all_power_outages:
+        # Combine all results
+        final_df = pd.concat(all_power_outages, ignore_index=True)
+        
+        # Sort by date
+        final_df = final_df.sort_values('Created Date Local', ascending=False)
+        
+        final_df = final_df[list(output_columns.keys())].rename(columns=output_columns)
+        
+        # Status is categorical per chunk; summarize and write it as plain strings
+        final_df['status'] = final_df['status'].astype(object)
+    else:
+        final_df = pd.DataFrame(columns=list(output_columns.values()))
+    
+    if changed_ids is not None:
+        # Replace changed cases in the previous output, append new ones and restore the date order
+        final_df = merge_with_existing(csv_filename, final_df, changed_ids)
+        # Rows read back from the CSV have NaN where a fresh run has no center (None, written as null)
+        centers = final_df['nearby_center'].astype(object)
+        final_df['nearby_center'] = centers.where(centers.notna(), None)
+        final_df['created_date'] = pd.to_datetime(final_df['created_date'], errors='coerce')
+        final_df = final_df.sort_values('created_date', ascending=False)
     
     # Save to CSV
-    csv_filename = f"{output_prefix}.csv"
     final_df.to_csv(csv_filename, index=False)
     print(f"Saved {len(final_df)} power outages to {csv_filename}")
     
-    # Create GeoJSON
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": []
-    }
+    # Stream GeoJSON features from the columns; rows whose coordinates aren't numbers are skipped
+    lons = pd.to_numeric(final_df['lon'], errors='coerce')
+    lats = pd.to_numeric(final_df['lat'], errors='coerce')
+    valid = ~((lons.isna() & final_df['lon'].notna()) | (lats.isna() & final_df['lat'].notna()))
+    geojson_rows = final_df[valid].assign(lon=lons[valid].astype(float), lat=lats[valid].astype(float))
     
-    for _, row in final_df.iterrows():
-        try:
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [float(row['lon']), float(row['lat'])]
-                },
-                "properties": {
-                    "request_id": row['request_id'],
-                    "title": row['title'],
-                    "description": row['description'],
-                    "created_date": str(row['created_date']),
-                    "status": row['status'],
-                    "distance_meters": row['distance_meters'],
-                    "nearby_center": row['nearby_center']
-                }
-            }
-            geojson_data["features"].append(feature)
-        except (ValueError, TypeError):
-            continue
-    
-    geojson_filename = f"{output_prefix}.geojson"
-    with open(geojson_filename, 'w') as f:
-        json.dump(geojson_data, f, indent=2)
+    geojson_filename = geojson_path(output_prefix, geojson_mode)
+    with FeatureCollectionWriter(geojson_filename, mode=geojson_mode) as writer:
+        writer.write_frame(
+            geojson_rows,
+            property_columns=['request_id', 'title', 'description', 'created_date', 'status',
+                              'distance_meters', 'nearby_center'],
+            converters={'created_date': str}
+        )
     print(f"Saved GeoJSON to {geojson_filename}")
     
     # Print summary statistics
@@ -273,7 +235,16 @@ def process_311_data(input_file, output_prefix):
 
 def main():
     """Main function"""
-    input_file = input("Enter the path to your 311 data file (e.g., public/311.txt): ").strip()
+    parser = argparse.ArgumentParser(description='Refined 311 power outage analysis for Hurricane Beryl')
+    parser.add_argument('input_file', nargs='?', help='311 data file or deduplicated case store (.sqlite); prompted for when omitted')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for chunk processing (default: 1, serial)')
+    parser.add_argument('--incremental', action='store_true', help='Only process new or changed cases and update outputs in place')
+    parser.add_argument('--state', help='State store used by --incremental (default: <output prefix>_state.sqlite)')
+    parser.add_argument('--geojson-format', choices=GEOJSON_MODES, default='pretty', help='pretty (indented), compact, or ndjson')
+    parser.add_argument('--memory-report', action='store_true', help='Print the memory of every chunk read')
+    args = parser.parse_args()
+    
+    input_file = args.input_file or input("Enter the path to your 311 data file (e.g., public/311.txt): ").strip()
     
     if not os.path.exists(input_file):
         print(f"Error: File {input_file} not found.")
@@ -281,7 +252,8 @@ def main():
     
     # Generate refined power outage analysis
     output_prefix = "public/311_power_outages_Beryl_refined"
-    process_311_data(input_file, output_prefix)
+    process_311_data(input_file, output_prefix, workers=args.workers, incremental=args.incremental, state_path=args.state,
+                     geojson_mode=args.geojson_format, report_memory=args.memory_report)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
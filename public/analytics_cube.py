@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated call counts for the monthly 311 reports.
+
+The June/July/August category datasets are merged once (deduplicated by case,
+see dedup_311_store), labelled with their spatial attributes (see
+spatial_enrichment) and reduced to a cube of call counts over
+
+  day x dataset_month x category x subcategory x super_neighborhood x zip_code x nearest_center x status
+
+where dataset_month is the month a call's dataset is tagged with (June, July,
+August), which can differ from the month of its Created Date Local.
+
+Every dimension is integer-coded against a sorted label list and only non-empty
+cells are stored (one small int array per dimension plus the counts), so the
+cube stays small however many calls went in. Any per-month, per-category or
+per-neighborhood count, and comparisons such as the June baseline against July
+(Beryl), are bincounts over those arrays and take milliseconds.
+
+The CLI builds the cube and regenerates the category text reports, per-neighborhood
+breakdowns (neighborhood_311_cube_analysis.json) and a month-over-month comparison
+from it, without touching the call data again. The text reports keep the file names
+and header layout of the hand-written <month>_2024_*_analysis.txt reports in public/
+but hold only the counts (no methodology or commentary), so they go to reports/
+rather than over them. The breakdowns are keyed by the
+Super Neighborhood ID of the enrichment layer, so they are written next to, not
+over, extract_neighborhood_311_data's neighborhood_311_analysis.json.
+"""
+
+import argparse
+import json
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from dedup_311_store import LAT_COLUMN, LON_COLUMN, build_store
+from spatial_enrichment import SpatialEnricher
+
+CUBE_FILE = 'analytics_cube_311.npz'
+NEIGHBORHOOD_ANALYSIS_FILE = 'neighborhood_311_cube_analysis.json'
+CUBE_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics_cube_cases.sqlite')
+
+DIMENSIONS = ['day', 'dataset_month', 'category', 'subcategory', 'super_neighborhood', 'zip_code', 'nearest_center',
+              'status']
+
+# Source column per dimension (day is derived from Created Date Local)
+SOURCE_COLUMNS = {
+    'dataset_month': 'month',
+    'category': 'Category',
+    'subcategory': 'Subcategory',
+    'status': 'Status',
+}
+
+UNKNOWN = 'Unknown'
+
+# Reports before, during and after the landfall month are headed as the hand-written ones are
+BERYL_LANDFALL = pd.Timestamp('2024-07-08')
+
+DEFAULT_DATASETS = [
+    ('June_Comprehensive_Category_Dataset.geojson', {'month': 'June'}),
+    ('July_Comprehensive_Category_Dataset.geojson', {'month': 'July'}),
+    ('August_Comprehensive_Category_Dataset.geojson', {'month': 'August'}),
+]
+
+def _labels(values):
+    """Dimension values as text, with missing values as UNKNOWN"""
+    values = pd.Series(values, dtype=object)
+    return values.where(values.notna() & (values.astype(str) != ''), UNKNOWN).astype(str).to_numpy(dtype=object)
+
+def _code_dtype(size):
+    return np.uint8 if size <= 0xFF else np.uint16 if size <= 0xFFFF else np.uint32
+
+def created_times(calls):
+    """Created Date Local of every call as a datetime Series (NaT where missing or unparseable)"""
+    if 'Created Date Local' not in calls.columns:
+        return pd.Series(pd.NaT, index=calls.index)
+    # The monthly datasets do not share one timestamp format, so each value is parsed on its own
+    return pd.to_datetime(calls['Created Date Local'], format='mixed', errors='coerce')
+
+def cube_dimensions(calls):
+    """Label of every dimension for each call, from category dataset rows that carry enrichment columns"""
+    dimensions = {'day': _labels(created_times(calls).dt.strftime('%Y-%m-%d'))}
+    for name in DIMENSIONS[1:]:
+        column = SOURCE_COLUMNS.get(name, name)
+        dimensions[name] = _labels(calls[column] if column in calls.columns else [None] * len(calls))
+    return dimensions
+
+class AnalyticsCube:
+    """Sparse, integer-coded count cube; queries are vectorized group-bys over its cells"""
+
+    def __init__(self, labels, codes, counts):
+        # labels: {dimension: sorted label array}; codes: {dimension: code per cell}; counts: calls per cell
+        self.labels = labels
+        self.codes = codes
+        self.counts = np.asarray(counts)
+
+    @classmethod
+    def from_dimensions(cls, dimensions):
+        """Aggregate per-call dimension labels into non-empty cells"""
+        labels, codes = {}, {}
+        for name in DIMENSIONS:
+            labels[name], codes[name] = np.unique(np.asarray(dimensions[name], dtype=str), return_inverse=True)
+        # Mixed-radix key over all dimensions, then one count per distinct key
+        key = np.zeros(len(codes[DIMENSIONS[0]]), dtype=np.int64)
+        for name in DIMENSIONS:
+            key = key * len(labels[name]) + codes[name]
+        keys, counts = np.unique(key, return_counts=True)
+        cell_codes = {}
+        for name in reversed(DIMENSIONS):
+            size = len(labels[name])
+            keys, cell_codes[name] = np.divmod(keys, size)
+            cell_codes[name] = cell_codes[name].astype(_code_dtype(size))
+        return cls(labels, cell_codes, counts.astype(np.int32))
+
+    @classmethod
+    def load(cls, path=CUBE_FILE):
+        """Cube saved by save(); dimensions the file predates hold UNKNOWN for every cell"""
+        with np.load(path) as data:
+            counts = data['counts']
+            labels, codes = {}, {}
+            for name in DIMENSIONS:
+                if f'labels_{name}' in data:
+                    labels[name], codes[name] = data[f'labels_{name}'], data[f'codes_{name}']
+                else:
+                    labels[name], codes[name] = np.array([UNKNOWN]), np.zeros(len(counts), dtype=np.uint8)
+            return cls(labels, codes, counts)
+
+    def save(self, path=CUBE_FILE):
+        # Write under a temporary name so an interrupted run never leaves a truncated cube
+        temp_path = path + '.tmp.npz'
+        arrays = {f'labels_{name}': self.labels[name] for name in DIMENSIONS}
+        arrays.update({f'codes_{name}': self.codes[name] for name in DIMENSIONS})
+        np.savez_compressed(temp_path, counts=self.counts, **arrays)
+        os.replace(temp_path, path)
+
+    def __len__(self):
+        """Number of non-empty cells"""
+        return len(self.counts)
+
+    def total(self, **filters):
+        return int(self.counts[self._mask(**filters)].sum())
+
+    def _mask(self, start=None, end=None, **filters):
+        """Cells within [start, end] (YYYY-MM-DD, inclusive) matching every dimension filter (a value or list)"""
+        mask = np.ones(len(self.counts), dtype=bool)
+        if start is not None or end is not None:
+            days = self.labels['day']
+            valid = days != UNKNOWN
+            if start is not None:
+                valid &= days >= start
+            if end is not None:
+                valid &= days <= end
+            mask &= valid[self.codes['day']]
+        for name, values in filters.items():
+            values = [values] if isinstance(values, str) else list(values)
+            mask &= np.isin(self.labels[name], values)[self.codes[name]]
+        return mask
+
+    def query(self, by, start=None, end=None, **filters):
+        """
+        Call counts grouped by one or more dimensions as a Series (largest first, empty groups left out).
+        by may also be 'month' (YYYY-MM, from the day dimension).
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        mask = self._mask(start, end, **filters)
+        counts = self.counts[mask]
+        group_labels, group_codes = [], []
+        for name in by:
+            if name == 'month':
+                months, month_codes = np.unique([day[:7] for day in self.labels['day']], return_inverse=True)
+                group_labels.append(months)
+                group_codes.append(month_codes[self.codes['day'][mask]])
+            else:
+                group_labels.append(self.labels[name])
+                group_codes.append(self.codes[name][mask].astype(np.int64))
+        sizes = [len(labels) for labels in group_labels]
+        key = np.zeros(len(counts), dtype=np.int64)
+        for codes, size in zip(group_codes, sizes):
+            key = key * size + codes
+        totals = np.bincount(key, weights=counts, minlength=int(np.prod(sizes))).astype(np.int64)
+        present = np.flatnonzero(totals)
+        index_codes = np.unravel_index(present, sizes)
+        if len(by) == 1:
+            index = pd.Index(group_labels[0][index_codes[0]], name=by[0])
+        else:
+            index = pd.MultiIndex.from_arrays([labels[codes] for labels, codes in zip(group_labels, index_codes)],
+                                              names=by)
+        result = pd.Series(totals[present], index=index, name='calls')
+        return result.sort_values(ascending=False, kind='stable')
+
+    def compare(self, by, baseline, event, **filters):
+        """Counts by a dimension for a baseline and an event period ((start, end) each), with change and ratio"""
+        table = pd.DataFrame({
+            'baseline': self.query(by, *baseline, **filters),
+            'event': self.query(by, *event, **filters),
+        }).fillna(0).astype(int)
+        table['change'] = table['event'] - table['baseline']
+        table['ratio'] = np.divide(table['event'], table['baseline'], out=np.full(len(table), np.nan),
+                                   where=table['baseline'] > 0)
+        return table.sort_values('event', ascending=False, kind='stable')
+
+def load_calls(datasets=DEFAULT_DATASETS, store_path=CUBE_STORE):
+    """Deduplicated calls of the category datasets, with the spatial columns added where they are missing"""
+    store = build_store(store_path, datasets)
+    try:
+        calls = store.read_frame()
+    finally:
+        store.close()
+    missing = [name for name in ['super_neighborhood', 'zip_code', 'nearest_center'] if name not in calls.columns]
+    if missing and len(calls):
+        print(f"Adding spatial columns to {len(calls)} calls...")
+        enricher = SpatialEnricher.from_files()
+        enriched = enricher.enrich_coordinates(pd.to_numeric(calls[LAT_COLUMN], errors='coerce'),
+                                               pd.to_numeric(calls[LON_COLUMN], errors='coerce'))
+        calls = calls.assign(**{name: enriched.get(name) for name in missing})
+    return calls
+
+def build_cube(datasets=DEFAULT_DATASETS, store_path=CUBE_STORE):
+    """Merge the category datasets, add missing spatial columns and aggregate them into a cube"""
+    calls = load_calls(datasets, store_path)
+    cube = AnalyticsCube.from_dimensions(cube_dimensions(calls))
+    print(f"Aggregated {len(calls)} calls into {len(cube)} cells "
+          f"({', '.join(f'{name} {len(cube.labels[name])}' for name in DIMENSIONS)})")
+    return cube
+
+def month_range(month):
+    """First and last day (YYYY-MM-DD) of a YYYY-MM month"""
+    start = pd.Timestamp(f'{month}-01')
+    return f'{start:%Y-%m-%d}', f'{start + pd.offsets.MonthEnd(0):%Y-%m-%d}'
+
+def category_slug(category):
+    """e.g. 'Flood & Drainage' -> 'flood_drainage'"""
+    return re.sub(r'[^a-z0-9]+', '_', category.lower()).strip('_')
+
+def _breakdown_lines(counts, total, limit=None):
+    lines = []
+    for rank, (label, count) in enumerate(counts.head(limit).items() if limit else counts.items(), 1):
+        lines.append(f"{rank}. {label}: {count:,} cases ({count / total:.0%})")
+    return lines
+
+def _report_header(month, subject, total_line):
+    """Title, time period and Beryl lines of the hand-written monthly reports"""
+    start, end = month_range(month)
+    first, last = pd.Timestamp(start), pd.Timestamp(end)
+    title = f"{first:%B %Y} {subject} ANALYSIS - AUTOMATED CATEGORIZATION RESULTS".upper()
+    if last < BERYL_LANDFALL:
+        phase = ' (not yet occurred)'
+    elif first > BERYL_LANDFALL:
+        phase = ' (recovery period)'
+    else:
+        phase = ''
+    return [title, '=' * len(title), '',
+            f"TIME PERIOD: {first:%B} {first.day}-{last.day}, {first.year} ({(last - first).days + 1} days)",
+            f"HURRICANE BERYL: Made landfall {BERYL_LANDFALL:%B} {BERYL_LANDFALL.day}, {BERYL_LANDFALL.year}{phase}",
+            total_line, '']
+
+def month_report(cube, month):
+    """Comprehensive text report of one month, every number read from the cube"""
+    start, end = month_range(month)
+    month_name = f"{pd.Timestamp(start):%B}"
+    total = cube.total(start=start, end=end)
+    lines = _report_header(month, 'COMPREHENSIVE', f"TOTAL {month_name.upper()} CASES: {total:,} cases")
+    lines += ['CATEGORY BREAKDOWN', '==================', '']
+    for number, (category, count) in enumerate(cube.query('category', start, end).items(), 1):
+        heading = f"CATEGORY {number}: {category.upper()}"
+        lines += [heading, '-' * len(heading),
+                  f"TOTAL: {count:,} cases ({count / total:.1%} of all {month_name} requests)", '', 'SUBCATEGORIES:']
+        lines += _breakdown_lines(cube.query('subcategory', start, end, category=category), count)
+        lines.append('')
+    lines += ['TOP SUPER NEIGHBORHOODS', '=======================']
+    lines += _breakdown_lines(cube.query('super_neighborhood', start, end), total, limit=10)
+    return '\n'.join(lines) + '\n'
+
+def category_report(cube, month, category):
+    """Text report of one category in one month"""
+    start, end = month_range(month)
+    month_name = f"{pd.Timestamp(start):%B}"
+    month_total = cube.total(start=start, end=end)
+    total = cube.total(start=start, end=end, category=category)
+    daily = cube.query('day', start, end, category=category)
+    lines = _report_header(month, category, f"TOTAL {category.upper()} CASES: {total:,} cases "
+                           f"({total / month_total if month_total else 0:.1%} of all {month_name} requests)")
+    if total:
+        lines += [f"PEAK DAY: {daily.index[0]} ({daily.iloc[0]:,} cases)", '']
+    lines += ['SUBCATEGORY BREAKDOWN', '=====================']
+    lines += _breakdown_lines(cube.query('subcategory', start, end, category=category), total or 1)
+    lines += ['', 'STATUS', '======']
+    lines += _breakdown_lines(cube.query('status', start, end, category=category), total or 1)
+    lines += ['', 'TOP SUPER NEIGHBORHOODS', '=======================']
+    lines += _breakdown_lines(cube.query('super_neighborhood', start, end, category=category), total or 1, limit=10)
+    return '\n'.join(lines) + '\n'
+
+def neighborhood_analysis(cube):
+    """
+    Breakdowns for every Super Neighborhood in the cube, with the fields of neighborhood_311_analysis.json;
+    monthly_breakdown counts calls by their dataset month tag, as extract_neighborhood_311_data does
+    """
+    by_month = cube.query(['super_neighborhood', 'dataset_month'])
+    by_category = cube.query(['super_neighborhood', 'category'])
+    by_subcategory = cube.query(['super_neighborhood', 'subcategory'])
+    totals = cube.query('super_neighborhood')
+
+    def breakdown(table, neighborhood):
+        if neighborhood not in table.index.get_level_values(0):
+            return {}
+        counts = table.xs(neighborhood, level=0)
+        return {label: int(count) for label, count in counts.items()}
+
+    return {neighborhood: {
+        'total_calls': int(totals[neighborhood]),
+        'monthly_breakdown': breakdown(by_month, neighborhood),
+        'category_breakdown': breakdown(by_category, neighborhood),
+        'subcategory_breakdown': breakdown(by_subcategory, neighborhood),
+    } for neighborhood in totals.index if neighborhood != UNKNOWN}
+
+def write_reports(cube, output_dir, compare=None):
+    """Regenerate every monthly and per-category text report and the neighborhood breakdowns from the cube"""
+    os.makedirs(output_dir, exist_ok=True)
+    months = sorted({day[:7] for day in cube.labels['day'] if day != UNKNOWN})
+    written = []
+    for month in months:
+        prefix = datetime.strptime(month, '%Y-%m').strftime('%B_%Y').lower()
+        reports = {f'{prefix}_comprehensive_analysis.txt': month_report(cube, month)}
+        for category in cube.query('category', *month_range(month)).index:
+            reports[f'{prefix}_{category_slug(category)}_analysis.txt'] = category_report(cube, month, category)
+        for filename, text in reports.items():
+            with open(os.path.join(output_dir, filename), 'w') as f:
+                f.write(text)
+            written.append(filename)
+
+    with open(os.path.join(output_dir, NEIGHBORHOOD_ANALYSIS_FILE), 'w') as f:
+        json.dump(neighborhood_analysis(cube), f, indent=2)
+    written.append(NEIGHBORHOOD_ANALYSIS_FILE)
+
+    if compare:
+        baseline, event = compare
+        table = cube.compare('category', month_range(baseline), month_range(event))
+        filename = f'{baseline}_vs_{event}_comparison.csv'
+        table.to_csv(os.path.join(output_dir, filename))
+        written.append(filename)
+        print(f"\n{baseline} vs {event} by category:\n{table.to_string()}")
+    print(f"\nWrote {len(written)} reports to {output_dir}")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the 311 analytics cube and generate the reports from it')
+    parser.add_argument('--cube', default=CUBE_FILE)
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the cube from the category datasets')
+    parser.add_argument('--output-dir', default='reports', help='Directory for the generated reports')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'EVENT'), default=['2024-06', '2024-07'],
+                        help='Months (YYYY-MM) to compare by category (default: June vs July 2024)')
+    args = parser.parse_args()
+
+    if args.rebuild or not os.path.exists(args.cube):
+        cube = build_cube()
+        cube.save(args.cube)
+        print(f"Saved {args.cube} ({os.path.getsize(args.cube) / 1024:,.0f} KB)")
+    else:
+        cube = AnalyticsCube.load(args.cube)
+        print(f"Loaded {args.cube} ({len(cube)} cells)")
+    write_reports(cube, args.output_dir, args.compare)
+
+if __name__ == '__main__':
+    main()
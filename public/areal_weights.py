@@ -0,0 +1,96 @@
+"""
+Areal weighting between polygon layers in an equal-area projection.
+
+Both layers are projected once to an equal-area CRS and every target x source
+intersection area (square meters) is stored in a sparse matrix, one row per
+target polygon and one column per source polygon, in file order. Boundaries
+rarely change, so matrices are cached on disk keyed by the SHA-256 of both
+input files and the CRS; a later run only loads the matrix and reduces area
+weighting to a sparse matrix-vector product.
+"""
+
+import hashlib
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from scipy import sparse
+
+# NAD83 / Texas Centric Albers Equal Area
+EQUAL_AREA_CRS = 'EPSG:3083'
+
+CACHE_DIR = 'areal_weights_cache'
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def intersection_areas(targets, sources, crs=EQUAL_AREA_CRS):
+    """Sparse (targets x sources) matrix of intersection areas and the target areas, in CRS units"""
+    target_geoms = targets.geometry.to_crs(crs).reset_index(drop=True)
+    source_geoms = sources.geometry.to_crs(crs).reset_index(drop=True)
+    source_ids, target_ids = target_geoms.sindex.query(source_geoms, predicate='intersects')
+    areas = shapely.area(shapely.intersection(np.asarray(source_geoms)[source_ids], np.asarray(target_geoms)[target_ids]))
+    matrix = sparse.csr_matrix((areas, (target_ids, source_ids)), shape=(len(target_geoms), len(source_geoms)))
+    return matrix, shapely.area(np.asarray(target_geoms))
+
+class ArealWeights:
+    """Intersection areas of source polygons within target polygons"""
+
+    def __init__(self, matrix, target_areas):
+        self.matrix = matrix.tocsr()
+        self.target_areas = np.asarray(target_areas, dtype=float)
+
+    @classmethod
+    def load_or_compute(cls, target_path, source_path, targets=None, sources=None, crs=EQUAL_AREA_CRS,
+                        cache_dir=CACHE_DIR):
+        """
+        Weights between two files, from the cache when neither file has changed. Layers that are
+        already loaded can be passed in; otherwise they are only read on a cache miss.
+        """
+        key = hashlib.sha256(f"{file_hash(target_path)}:{file_hash(source_path)}:{crs}".encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{key}.npz")
+        if os.path.exists(cache_path):
+            print(f"Using cached areal weights for {source_path} ({cache_path})")
+            return cls.load(cache_path)
+
+        print(f"Computing areal weights: {source_path} within {target_path}...")
+        targets = targets if targets is not None else gpd.read_file(target_path)
+        sources = sources if sources is not None else gpd.read_file(source_path)
+        weights = cls(*intersection_areas(targets, sources, crs))
+        os.makedirs(cache_dir, exist_ok=True)
+        weights.save(cache_path)
+        return weights
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+        return cls(matrix, data['target_areas'])
+
+    def save(self, path):
+        # Write under a temporary name so an interrupted run never leaves a truncated cache entry
+        temp_path = path + '.tmp.npz'
+        np.savez(temp_path, data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+                 shape=np.array(self.matrix.shape), target_areas=self.target_areas)
+        os.replace(temp_path, path)
+
+    def weighted_mean(self, values):
+        """Area-weighted mean of a per-source value for every target (0 where no source overlaps)"""
+        totals = self.matrix @ np.asarray(values, dtype=float)
+        weights = self.covered_area()
+        return np.divide(totals, weights, out=np.zeros(len(weights)), where=weights > 0)
+
+    def covered_area(self):
+        """Total source area intersecting each target (overlapping sources count more than once)"""
+        return np.asarray(self.matrix.sum(axis=1)).ravel()
+
+    def coverage_percentage(self):
+        """covered_area as a percentage of each target's area"""
+        return np.divide(self.covered_area() * 100, self.target_areas, out=np.zeros(len(self.target_areas)),
+                         where=self.target_areas > 0)
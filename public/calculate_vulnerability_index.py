@@ -3,8 +3,115 @@ import pandas as pd
 import numpy as np
 from shapely.geometry import Point
 import json
+import os
+import argparse
+import areal_weights
+import flood_raster
+from areal_weights import ArealWeights
+from dedup_311_store import LAT_COLUMN, LON_COLUMN, build_store
+from dissolve_floodplains import FLOOD_ZONES_FILE
+from flood_raster import CELL_SIZE_M, FloodRaster
+from factor_cache import FACTOR_CACHE_DIR, FactorCache
+from geography_ids import NEIGHBORHOOD_ID_COLUMNS, layer_ids
+from incremental_state import as_text
+from polygon_export import export_polygons
+from spatial_enrichment import data_path
+from vulnerability_scenarios import FACTORS_FILE
 
-def calculate_vulnerability_index():
+# Inputs, outputs and caches all live in the data directory (public/), whichever directory this runs from
+NEIGHBORHOODS_FILE = data_path('houston-super-neighborhoods.geojson')
+CALLS_FILE = data_path('July_Comprehensive_Category_Dataset.geojson')
+INCOME_FILE = data_path('harris_tracts_2022_income copy.geojson')
+CENTERS_FILE = data_path('houston-community-centers-vulnerability-4326.geojson')
+CHURCHES_FILE = data_path('houston_churches_with_grace.geojson')
+FLOOD_PLAINS_FILE = data_path('houston-texas-flood-100-500.geojson')
+INDEX_FILE = data_path('super-neighborhoods-vulnerability-index.geojson')
+
+FACTOR_CACHE = data_path(FACTOR_CACHE_DIR)
+WEIGHTS_CACHE = data_path(areal_weights.CACHE_DIR)
+RASTER_CACHE = data_path(flood_raster.CACHE_DIR)
+
+# Deduplicated July calls, kept across runs (see dedup_311_store)
+CALLS_STORE = data_path('vulnerability_311_cases.sqlite')
+
+def join_pairs(features, neighborhoods, predicate):
+    """
+    Row positions of every (feature, neighborhood) pair matching predicate in one spatial join,
+    ordered by neighborhood and then by feature row, the order the per-neighborhood scans visited them
+    """
+    joined = gpd.sjoin(
+        gpd.GeoDataFrame(geometry=features.geometry.reset_index(drop=True)),
+        gpd.GeoDataFrame(geometry=neighborhoods.geometry.reset_index(drop=True)),
+        how='inner',
+        predicate=predicate
+    )
+    feature_ids = joined.index.to_numpy()
+    neighborhood_ids = joined['index_right'].to_numpy()
+    order = np.lexsort((feature_ids, neighborhood_ids))
+    return feature_ids[order], neighborhood_ids[order]
+
+def label_positions(labels, neighborhood_ids):
+    """Neighborhood row of every label, for labels naming a neighborhood (first row when an ID repeats)"""
+    positions = {}
+    for position, neighborhood_id in enumerate(neighborhood_ids):
+        positions.setdefault(neighborhood_id, position)
+    # IDs may have been read back as numbers; compare them as text like layer_ids
+    found = [positions.get(label) for label in as_text(labels)]
+    return np.array([position for position in found if position is not None], dtype=np.int64)
+
+def running_totals(groups, values, size):
+    """Per-neighborhood `total += value` in pair order, so sums match the sequential loops exactly"""
+    totals = [0] * size
+    for group, value in zip(groups.tolist(), np.asarray(values).tolist()):
+        totals[group] += value
+    return totals
+
+def positive_number(value):
+    """Numeric value of a property, counting only positive numbers (0 otherwise)"""
+    try:
+        number = float(value) if value else 0
+    except (ValueError, TypeError):
+        number = 0
+    return number if number > 0 else 0
+
+def positive_totals(features, column, feature_ids, groups, size):
+    """Per-neighborhood total of the positive values of a property column"""
+    if column not in features.columns:
+        return [0] * size
+    values = [positive_number(value) for value in features[column].to_numpy()[feature_ids]]
+    keep = [value > 0 for value in values]
+    return running_totals(groups[keep], [value for value in values if value > 0], size)
+
+def load_calls():
+    """
+    July calls as points in EPSG:4326, read through the deduplicated case store so a case listed
+    more than once is counted once (no rows when there are no calls)
+    """
+    store = build_store(CALLS_STORE, [CALLS_FILE])
+    try:
+        calls = store.read_frame()
+    finally:
+        store.close()
+    if calls.empty:
+        return gpd.GeoDataFrame(calls, geometry=[], crs='EPSG:4326')
+    return gpd.GeoDataFrame(
+        calls.drop(columns=[LON_COLUMN, LAT_COLUMN]),
+        geometry=gpd.points_from_xy(calls[LON_COLUMN], calls[LAT_COLUMN]),
+        crs='EPSG:4326'
+    )
+
+def flood_source_path():
+    """
+    Dissolved flood zone tiles when they exist, otherwise the raw flood plains.
+    The tiles don't overlap; the raw layer double counts overlapping polygons.
+    """
+    flood_zones = data_path(FLOOD_ZONES_FILE)
+    if os.path.exists(flood_zones):
+        return flood_zones
+    print(f"{flood_zones} not found, using raw flood plains (run dissolve_floodplains.py first)")
+    return FLOOD_PLAINS_FILE
+
+def calculate_vulnerability_index(flood_method='vector', cell_size=CELL_SIZE_M):
     """
     Calculate vulnerability index for Super Neighborhoods based on:
     1. July 311 calls (higher = more vulnerable)
@@ -12,122 +119,131 @@ def calculate_vulnerability_index():
     3. Flood plain coverage (higher = more vulnerable)
     4. Community centers (no center = more vulnerable)
     5. Churches (more and larger churches = less vulnerable)
+    
+    Tract and flood plain overlaps are measured in an equal-area projection and cached
+    (see areal_weights), so unchanged boundaries are only intersected once.
+    With flood_method='raster' flood coverage is read from a cached flood grid of cell_size
+    meters instead (see flood_raster).
+    Each factor is also cached by the content hash of its inputs (see factor_cache), so a new
+    month of 311 calls only re-runs the call join before the index is reassembled.
     """
     
     print("Loading data files...")
     
     # Load Super Neighborhoods
-    super_neighborhoods = gpd.read_file('houston-super-neighborhoods.geojson')
+    target_crs = 'EPSG:4326'
+    super_neighborhoods = gpd.read_file(NEIGHBORHOODS_FILE).to_crs(target_crs)
     print(f"Loaded {len(super_neighborhoods)} Super Neighborhoods")
     
-    # Load July 311 calls
-    july_311_calls = gpd.read_file('July_Comprehensive_Category_Dataset.geojson')
-    print(f"Loaded {len(july_311_calls)} July 311 calls")
+    # Every factor is cached by the content hash of its input files; only factors whose inputs
+    # changed are recomputed (STRtree-backed spatial joins of a layer to every neighborhood at once)
+    cache = FactorCache(FACTOR_CACHE)
+    neighborhood_count = len(super_neighborhoods)
+    neighborhood_geoms = np.asarray(super_neighborhoods.geometry)
     
-    # Load 2022 median income (census tracts)
-    income_data = gpd.read_file('harris_tracts_2022_income copy.geojson')
-    print(f"Loaded {len(income_data)} census tracts with income data")
+    # 1. July 311 calls within each Super Neighborhood
+    def compute_calls():
+        july_311_calls = load_calls()
+        if july_311_calls.empty:
+            print("No July 311 calls found")
+            return {'call_count': np.zeros(neighborhood_count, dtype=np.int64)}
+        july_311_calls = july_311_calls.to_crs(target_crs)
+        print(f"Loaded {len(july_311_calls)} July 311 calls")
+        if 'super_neighborhood' in july_311_calls.columns:
+            # Calls enriched at ingest (see spatial_enrichment) already carry their neighborhood
+            call_neighborhoods = label_positions(july_311_calls['super_neighborhood'],
+                                                 layer_ids(super_neighborhoods, NEIGHBORHOOD_ID_COLUMNS, 'Neighborhood'))
+        else:
+            _, call_neighborhoods = join_pairs(july_311_calls, super_neighborhoods, 'within')
+        return {'call_count': np.bincount(call_neighborhoods, minlength=neighborhood_count)}
     
-    # Load community centers
-    community_centers = gpd.read_file('houston-community-centers-vulnerability-4326.geojson')
-    print(f"Loaded {len(community_centers)} community centers")
+    call_counts = cache.get_or_compute('calls', [NEIGHBORHOODS_FILE, CALLS_FILE], compute_calls)['call_count']
     
-    # Load churches
-    churches = gpd.read_file('houston_churches_with_grace.geojson')
-    print(f"Loaded {len(churches)} churches")
+    # 2. Census tract income weighted by intersection area (square meters, equal-area CRS)
+    def compute_income():
+        income_data = gpd.read_file(INCOME_FILE).to_crs(target_crs)
+        print(f"Loaded {len(income_data)} census tracts with income data")
+        income_weights = ArealWeights.load_or_compute(NEIGHBORHOODS_FILE, INCOME_FILE, super_neighborhoods, income_data,
+                                                      cache_dir=WEIGHTS_CACHE)
+        if 'median_income_2022' in income_data.columns:
+            tract_incomes = income_data['median_income_2022'].to_numpy(dtype=float)
+        else:
+            tract_incomes = np.zeros(len(income_data))
+        return {'avg_median_income': income_weights.weighted_mean(tract_incomes)}
     
-    # Load flood plains
-    flood_plains = gpd.read_file('houston-texas-flood-100-500.geojson')
-    print(f"Loaded {len(flood_plains)} flood plain features")
+    avg_median_incomes = cache.get_or_compute('income', [NEIGHBORHOODS_FILE, INCOME_FILE],
+                                              compute_income)['avg_median_income']
     
-    # Ensure all data is in the same CRS
-    target_crs = 'EPSG:4326'
-    super_neighborhoods = super_neighborhoods.to_crs(target_crs)
-    july_311_calls = july_311_calls.to_crs(target_crs)
-    income_data = income_data.to_crs(target_crs)
-    churches = churches.to_crs(target_crs)
-    flood_plains = flood_plains.to_crs(target_crs)
+    # 3. Flood plain area as a percentage of each Super Neighborhood (flood plains are only read on a cache miss)
+    flood_source = flood_source_path()
+    
+    def compute_flood():
+        if flood_method == 'raster':
+            return {'flood_percentage': FloodRaster.load_or_build(flood_source, cell_size, RASTER_CACHE)
+                    .coverage_percentage(super_neighborhoods)}
+        flood_weights = ArealWeights.load_or_compute(NEIGHBORHOODS_FILE, flood_source, super_neighborhoods,
+                                                     cache_dir=WEIGHTS_CACHE)
+        return {'flood_percentage': flood_weights.coverage_percentage()}
+    
+    flood_params = {'method': flood_method, 'cell_size': cell_size if flood_method == 'raster' else None}
+    flood_percentages = cache.get_or_compute('flood', [NEIGHBORHOODS_FILE, flood_source], compute_flood,
+                                             flood_params)['flood_percentage']
+    
+    # 4. Community centers and their total square footage
+    def compute_centers():
+        community_centers = gpd.read_file(CENTERS_FILE)
+        print(f"Loaded {len(community_centers)} community centers")
+        center_ids, center_neighborhoods = join_pairs(community_centers, super_neighborhoods, 'within')
+        return {
+            'center_count': np.bincount(center_neighborhoods, minlength=neighborhood_count),
+            'total_square_footage': np.asarray(positive_totals(community_centers, 'Square_Foo', center_ids,
+                                                               center_neighborhoods, neighborhood_count), dtype=float)
+        }
+    
+    centers = cache.get_or_compute('centers', [NEIGHBORHOODS_FILE, CENTERS_FILE], compute_centers)
+    center_counts = centers['center_count']
+    center_square_footage = centers['total_square_footage'].tolist()
+    
+    # 5. Churches and their total property area
+    def compute_churches():
+        churches = gpd.read_file(CHURCHES_FILE).to_crs(target_crs)
+        print(f"Loaded {len(churches)} churches")
+        church_ids, church_neighborhoods = join_pairs(churches, super_neighborhoods, 'within')
+        return {
+            'church_count': np.bincount(church_neighborhoods, minlength=neighborhood_count),
+            'total_church_area': np.asarray(positive_totals(churches, 'area_sq_ft', church_ids, church_neighborhoods,
+                                                            neighborhood_count), dtype=float)
+        }
+    
+    church_factor = cache.get_or_compute('churches', [NEIGHBORHOODS_FILE, CHURCHES_FILE], compute_churches)
+    church_counts = church_factor['church_count']
+    church_areas = church_factor['total_church_area'].tolist()
+    cache.report()
+    
+    if 'SUPER_NEIGHBORHOOD' in super_neighborhoods.columns:
+        neighborhood_names = super_neighborhoods['SUPER_NEIGHBORHOOD'].tolist()
+    else:
+        neighborhood_names = [f'Neighborhood_{idx}' for idx in super_neighborhoods.index]
     
     # Initialize vulnerability scores
     vulnerability_scores = []
     
     print("Calculating vulnerability index for each Super Neighborhood...")
     
-    for idx, neighborhood in super_neighborhoods.iterrows():
-        neighborhood_geom = neighborhood.geometry
-        neighborhood_name = neighborhood.get('SUPER_NEIGHBORHOOD', f'Neighborhood_{idx}')
-        
-        print(f"Processing {neighborhood_name}...")
+    for position in range(neighborhood_count):
+        neighborhood_geom = neighborhood_geoms[position]
+        neighborhood_name = neighborhood_names[position]
         
-        # 1. Count July 311 calls within this Super Neighborhood
-        calls_in_neighborhood = july_311_calls[july_311_calls.geometry.within(neighborhood_geom)]
-        call_count = len(calls_in_neighborhood)
+        call_count = int(call_counts[position])
         
-        # 2. Calculate average median income for census tracts within this Super Neighborhood
-        tracts_in_neighborhood = income_data[income_data.geometry.intersects(neighborhood_geom)]
-        if len(tracts_in_neighborhood) > 0:
-            # Calculate weighted average based on intersection area
-            weighted_income = 0
-            total_weight = 0
-            
-            for _, tract in tracts_in_neighborhood.iterrows():
-                intersection = tract.geometry.intersection(neighborhood_geom)
-                weight = intersection.area
-                income = tract.get('median_income_2022', 0)
-                weighted_income += income * weight
-                total_weight += weight
-            
-            avg_median_income = weighted_income / total_weight if total_weight > 0 else 0
-        else:
-            avg_median_income = 0
-        
-        # 3. Calculate flood plain coverage within this Super Neighborhood
-        flood_in_neighborhood = flood_plains[flood_plains.geometry.intersects(neighborhood_geom)]
-        flood_coverage = 0
-        
-        if len(flood_in_neighborhood) > 0:
-            for _, flood in flood_in_neighborhood.iterrows():
-                intersection = flood.geometry.intersection(neighborhood_geom)
-                flood_coverage += intersection.area
-            
-            # Convert to percentage of neighborhood area
-            neighborhood_area = neighborhood_geom.area
-            flood_percentage = (flood_coverage / neighborhood_area) * 100 if neighborhood_area > 0 else 0
-        else:
-            flood_percentage = 0
-        
-        # 4. Check if Super Neighborhood has a community center and calculate total square footage
-        centers_in_neighborhood = community_centers[community_centers.geometry.within(neighborhood_geom)]
-        has_community_center = len(centers_in_neighborhood) > 0
+        avg_median_income = float(avg_median_incomes[position])
+        flood_percentage = float(flood_percentages[position])
         
-        # Calculate total square footage of community centers in this neighborhood
-        total_square_footage = 0
-        if has_community_center:
-            for _, center in centers_in_neighborhood.iterrows():
-                # Get square footage from the center data and convert to number
-                square_footage_raw = center.get('Square_Foo', 0)
-                try:
-                    square_footage = float(square_footage_raw) if square_footage_raw else 0
-                except (ValueError, TypeError):
-                    square_footage = 0
-                if square_footage > 0:
-                    total_square_footage += square_footage
+        has_community_center = bool(center_counts[position] > 0)
+        total_square_footage = center_square_footage[position]
         
-        # 5. Count churches and calculate total church area in this Super Neighborhood
-        churches_in_neighborhood = churches[churches.geometry.within(neighborhood_geom)]
-        church_count = len(churches_in_neighborhood)
-        
-        # Calculate total church area (property size)
-        total_church_area = 0
-        if church_count > 0:
-            for _, church in churches_in_neighborhood.iterrows():
-                church_area = church.get('area_sq_ft', 0)
-                try:
-                    church_area = float(church_area) if church_area else 0
-                except (ValueError, TypeError):
-                    church_area = 0
-                if church_area > 0:
-                    total_church_area += church_area
+        church_count = int(church_counts[position])
+        total_church_area = church_areas[position]
         
         # Calculate community center score based on presence and size
         # No center = high vulnerability (1.0)
@@ -205,45 +321,20 @@ def calculate_vulnerability_index():
         church_status = f"Churches: {church_count} ({total_church_area:,.0f} sq ft)" if church_count > 0 else "No Churches"
         print(f"  - Calls: {call_count}, Income: ${avg_median_income:,.0f}, Flood: {flood_percentage:.1f}%, {center_status}, {church_status}, Vulnerability: {vulnerability_index:.3f}")
     
-    # Create GeoJSON output
-    output_features = []
-    for score in vulnerability_scores:
-        feature = {
-            'type': 'Feature',
-            'geometry': {
-                'type': 'Polygon',
-                'coordinates': [list(score['geometry'].exterior.coords)]
-            },
-            'properties': {
-                'neighborhood_name': score['neighborhood_name'],
-                'call_count': score['call_count'],
-                'avg_median_income': score['avg_median_income'],
-                'flood_percentage': score['flood_percentage'],
-                'has_community_center': score['has_community_center'],
-                'total_square_footage': score['total_square_footage'],
-                'church_count': score['church_count'],
-                'total_church_area': score['total_church_area'],
-                'call_score': score['call_score'],
-                'income_score': score['income_score'],
-                'flood_score': score['flood_score'],
-                'community_center_score': score['community_center_score'],
-                'church_score': score['church_score'],
-                'vulnerability_index': score['vulnerability_index']
-            }
-        }
-        output_features.append(feature)
-    
-    output_geojson = {
-        'type': 'FeatureCollection',
-        'features': output_features
-    }
-    
-    # Save to file
-    with open('super-neighborhoods-vulnerability-index.geojson', 'w') as f:
-        json.dump(output_geojson, f)
+    # Save the full-fidelity GeoJSON (holes and MultiPolygons kept) and simplified levels for the map
+    output_properties = [{name: value for name, value in score.items() if name != 'geometry'}
+                         for score in vulnerability_scores]
+    export_polygons(INDEX_FILE, super_neighborhoods.geometry, output_properties)
     
     print(f"\nVulnerability index calculated for {len(vulnerability_scores)} Super Neighborhoods")
-    print("Results saved to: super-neighborhoods-vulnerability-index.geojson")
+    print(f"Results saved to: {INDEX_FILE}")
+    
+    # Save the raw factors so weight scenarios can be scored without rerunning the spatial joins
+    factor_columns = ['neighborhood_name', 'call_count', 'avg_median_income', 'flood_percentage',
+                      'has_community_center', 'total_square_footage', 'church_count', 'total_church_area']
+    factors_file = data_path(FACTORS_FILE)
+    pd.DataFrame(vulnerability_scores, columns=factor_columns).to_csv(factors_file, index=False)
+    print(f"Raw factors saved to: {factors_file} (see vulnerability_scenarios.py)")
     
     # Print summary statistics
     indices = [score['vulnerability_index'] for score in vulnerability_scores]
@@ -256,4 +347,9 @@ def calculate_vulnerability_index():
     return vulnerability_scores
 
 if __name__ == "__main__":
-    calculate_vulnerability_index() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Calculate the Super Neighborhood vulnerability index')
+    parser.add_argument('--flood-method', choices=['vector', 'raster'], default='vector',
+                        help='Flood coverage from the exact vector overlay or a rasterized flood grid')
+    parser.add_argument('--cell-size', type=float, default=CELL_SIZE_M, help='Flood grid cell edge in meters')
+    args = parser.parse_args()
+    calculate_vulnerability_index(args.flood_method, args.cell_size) 
\ No newline at end of file
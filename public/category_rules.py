@@ -0,0 +1,206 @@
+"""
+Keyword rules for classifying 311 requests into categories.
+
+The power outage rules are the refined Hurricane Beryl filter; the storm debris,
+building damage and maintenance lists come from the debris count. Every category
+is evaluated on the same compiled matchers in one scan, and CATEGORY_PRECEDENCE
+decides which category a request lands in when several match.
+"""
+
+import numpy as np
+import pandas as pd
+
+from keyword_matcher import KeywordMatcher, has_any
+
+# Keywords that indicate ACTUAL power outages
+POWER_OUTAGE_KEYWORDS = [
+    'power out', 'electricity out', 'no power', 'lost power', 'power outage',
+    'electrical outage', 'power failure', 'electricity failure', 'power down',
+    'electricity down', 'power off', 'electricity off', 'power cut',
+    'electricity cut', 'power loss', 'electricity loss'
+]
+
+# Keywords that indicate power line issues (actual outages)
+POWER_LINE_KEYWORDS = [
+    'power line down', 'power line hanging', 'power line broken',
+    'power line damaged', 'power line fallen', 'power line on ground',
+    'electrical line down', 'electrical line hanging', 'electrical line broken',
+    'electrical line damaged', 'electrical line fallen', 'electrical line on ground'
+]
+
+# Keywords that indicate utility/power company issues
+UTILITY_KEYWORDS = [
+    'centerpoint', 'center point', 'electric company', 'power company',
+    'utility company', 'electrical company'
+]
+
+# Keywords that indicate Beryl-related power issues
+BERYL_POWER_KEYWORDS = [
+    'beryl power', 'hurricane beryl power', 'beryl electricity',
+    'hurricane beryl electricity', 'beryl outage', 'hurricane beryl outage'
+]
+
+# Keywords for traffic lights and street lights (keeping these)
+TRAFFIC_STREET_LIGHT_KEYWORDS = [
+    'traffic light', 'traffic signal', 'street light', 'street lamp',
+    'lights out', 'light out', 'lights not working', 'light not working',
+    'flashing red', 'flashing lights', 'traffic lights out', 'traffic light out'
+]
+
+# Words that make a call worth a second look when no direct keyword matched
+CONTEXT_WORDS = ['outage', 'out', 'down', 'off', 'cut', 'loss']
+
+# Storm debris, garbage, and other non-power issues (power outage context check)
+POWER_EXCLUDE_KEYWORDS = [
+    'storm debris', 'tree debris', 'garbage', 'trash', 'recycling',
+    'water', 'sewer', 'drainage', 'flooding', 'parking', 'graffiti',
+    'building code', 'nuisance', 'occupancy', 'health code',
+    'missed garbage', 'missed trash', 'missed recycling', 'missed heavy trash',
+    'container replacement', 'bandit sign', 'fire hydrant'
+]
+
+# Power-related words that confirm a context match
+POWER_INDICATORS = ['power', 'electric', 'electrical', 'electricity', 'utility', 'light']
+
+# One compiled pattern per keyword category, built once for the whole run
+POWER_OUTAGE_MATCHER = KeywordMatcher({
+    'power_outage': POWER_OUTAGE_KEYWORDS,
+    'power_line': POWER_LINE_KEYWORDS,
+    'utility': UTILITY_KEYWORDS,
+    'beryl_power': BERYL_POWER_KEYWORDS,
+    'traffic_street_light': TRAFFIC_STREET_LIGHT_KEYWORDS,
+    'context': CONTEXT_WORDS,
+    'exclude': POWER_EXCLUDE_KEYWORDS,
+    'indicator': POWER_INDICATORS,
+})
+
+def is_actual_power_outage(title, description):
+    """
+    Refined filter to identify ACTUAL power outages only.
+    Excludes storm debris, garbage, and other unrelated calls, but includes traffic lights and street lights.
+    """
+    # Convert to lowercase for case-insensitive matching
+    title_lower = title.lower()
+    desc_lower = description.lower()
+    
+    # Check for actual power outage indicators
+    for keyword in POWER_OUTAGE_KEYWORDS + POWER_LINE_KEYWORDS + UTILITY_KEYWORDS + BERYL_POWER_KEYWORDS + TRAFFIC_STREET_LIGHT_KEYWORDS:
+        if keyword in title_lower or keyword in desc_lower:
+            return True
+    
+    # Additional context checks for power-related issues
+    if any(word in title_lower or word in desc_lower for word in CONTEXT_WORDS):
+        # If it contains exclusion keywords, it's not a power outage
+        for exclude in POWER_EXCLUDE_KEYWORDS:
+            if exclude in title_lower or exclude in desc_lower:
+                return False
+        
+        # If it passed the exclusion check and contains power-related words, it might be a power outage
+        if any(indicator in title_lower or indicator in desc_lower for indicator in POWER_INDICATORS):
+            return True
+    
+    return False
+
+def classify_power_outages(titles, descriptions):
+    """
+    Vectorized is_actual_power_outage over whole Title and Description columns.
+    Returns a boolean array with the same result as the scalar function for every row.
+    """
+    bits = POWER_OUTAGE_MATCHER.match_any(titles, descriptions)
+    direct = POWER_OUTAGE_MATCHER.mask('power_outage', 'power_line', 'utility', 'beryl_power', 'traffic_street_light')
+    return (
+        has_any(bits, direct)
+        | (has_any(bits, POWER_OUTAGE_MATCHER.mask('context'))
+           & ~has_any(bits, POWER_OUTAGE_MATCHER.mask('exclude'))
+           & has_any(bits, POWER_OUTAGE_MATCHER.mask('indicator')))
+    )
+
+DEBRIS_KEYWORDS = [
+    'debris', 'tree down', 'tree fallen', 'tree debris', 'tree limb', 'tree branch', 'branches', 'limbs',
+    'fallen tree', 'fallen branch', 'fallen limb', 'brush', 'yard waste', 'storm debris', 'natural debris', 'uprooted',
+    'obstruction', 'blockage', 'street blocked', 'road blocked', 'pile'
+]
+
+# Exclusion keywords for building/infrastructure debris
+DEBRIS_EXCLUDE_KEYWORDS = [
+    'fence', 'sign', 'building', 'roof', 'wall', 'construction', 'material', 'garage', 'porch', 'balcony',
+    'attic', 'ceiling', 'floor', 'property', 'house', 'home', 'apartment', 'structure', 'barricade', 'barricaded', 'closed for construction', 'city barricade'
+]
+
+# Tree-related reports belong with storm debris rather than infrastructure
+TREE_KEYWORDS = ['tree']
+
+MAINTENANCE_KEYWORDS = [
+    'missed garbage', 'missed recycling', 'missed heavy trash', 'container replacement',
+    'routine service', 'garbage pickup', 'recycling pickup', 'trash pickup',
+    'waste collection', 'cart replacement', 'bin replacement', 'heavy trash'
+]
+
+BUILDING_DAMAGE_KEYWORDS = [
+    'building damage', 'roof damage', 'collapsed', 'wall down', 'ceiling collapse',
+    'window broken', 'door broken', 'fire damage', 'major damage', 'structural',
+    'foundation', 'crack in wall', 'crack in ceiling', 'crack in foundation',
+    'partial collapse', 'total collapse', 'chimney damage', 'garage damage',
+    'balcony damage', 'porch damage', 'interior damage', 'exterior damage',
+    'floor damage', 'attic damage', 'water damage to building', 'damaged house',
+    'damaged home', 'damaged apartment', 'damaged structure', 'damaged property'
+]
+
+# Streets, drainage, signs and other public infrastructure
+INFRASTRUCTURE_KEYWORDS = [
+    'pothole', 'sinkhole', 'street damage', 'road damage', 'pavement', 'sidewalk', 'curb',
+    'bridge', 'guardrail', 'manhole', 'storm drain', 'drainage', 'culvert', 'ditch',
+    'water main', 'water leak', 'sewer', 'fire hydrant', 'traffic sign', 'stop sign',
+    'street sign', 'sign down', 'utility pole', 'pole down', 'road closed', 'street flooding'
+]
+
+POWER_OUTAGE = 'power_outage'
+STORM_DEBRIS = 'storm_debris'
+BUILDING_DAMAGE = 'building_damage'
+INFRASTRUCTURE = 'infrastructure'
+MAINTENANCE = 'maintenance'
+OTHER = 'other'
+
+# First matching category wins:
+# - power outages keep the refined Beryl rules regardless of other keywords
+# - routine maintenance and building damage are never counted as storm debris
+# - debris (including anything tree-related) is taken before infrastructure
+CATEGORY_PRECEDENCE = [POWER_OUTAGE, MAINTENANCE, BUILDING_DAMAGE, STORM_DEBRIS, INFRASTRUCTURE, OTHER]
+
+# Manually reviewed requests (tree debris misclassified by keywords)
+CATEGORY_OVERRIDES = {
+    '2400280615': STORM_DEBRIS,
+    '2400280557': STORM_DEBRIS,
+}
+
+CATEGORY_MATCHER = KeywordMatcher({
+    'maintenance': MAINTENANCE_KEYWORDS,
+    'building_damage': BUILDING_DAMAGE_KEYWORDS,
+    'debris': DEBRIS_KEYWORDS,
+    'debris_exclude': DEBRIS_EXCLUDE_KEYWORDS,
+    'tree': TREE_KEYWORDS,
+    'infrastructure': INFRASTRUCTURE_KEYWORDS,
+})
+
+def classify_categories(titles, descriptions, case_numbers=None):
+    """
+    Category of every request in one scan, following CATEGORY_PRECEDENCE.
+    Returns an object array of category names.
+    """
+    bits = CATEGORY_MATCHER.match_any(titles, descriptions)
+    matches = {
+        POWER_OUTAGE: np.asarray(classify_power_outages(titles, descriptions), dtype=bool),
+        MAINTENANCE: has_any(bits, CATEGORY_MATCHER.mask('maintenance')),
+        BUILDING_DAMAGE: has_any(bits, CATEGORY_MATCHER.mask('building_damage')),
+        STORM_DEBRIS: (has_any(bits, CATEGORY_MATCHER.mask('debris', 'tree'))
+                       & ~has_any(bits, CATEGORY_MATCHER.mask('debris_exclude'))),
+        INFRASTRUCTURE: has_any(bits, CATEGORY_MATCHER.mask('infrastructure')),
+    }
+    ordered = [category for category in CATEGORY_PRECEDENCE if category != OTHER]
+    categories = np.select([matches[c] for c in ordered], ordered, default=OTHER).astype(object)
+
+    if case_numbers is not None:
+        overrides = pd.Series(case_numbers).map(str).map(CATEGORY_OVERRIDES).to_numpy(dtype=object)
+        forced = pd.notna(overrides)
+        categories[forced] = overrides[forced]
+    return categories
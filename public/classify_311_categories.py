@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Single-pass multi-category 311 classification.
+
+One scan over a 311 extract classifies every request in the date range as power
+outage, storm debris, building damage, infrastructure, maintenance or other
+(see category_rules.CATEGORY_PRECEDENCE), matches it to its nearest community
+center, and streams every category to its own CSV + GeoJSON. This replaces
+running the power outage script first and then re-reading its CSV (and the
+building damage / infrastructure CSVs) to build exclusion sets for debris.
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from category_rules import CATEGORY_PRECEDENCE, classify_categories
+from community_center_index import CommunityCenterIndex
+from convert_311_to_parquet import parquet_dataset_path, iter_311_parquet
+from dedup_311_store import STORE_SUFFIX, iter_store_chunks
+from geojson_writer import GEOJSON_MODES, PointDatasetWriter, geojson_path
+from load_311_extract import read_311_extract
+from parallel_chunks import map_chunks
+
+# Columns read from the extract or a converted Parquet dataset
+CATEGORY_COLUMNS = [
+    '365 Case Number', 'Title', 'Description', 'Created Date Local', 'Status', 'Latitude', 'Longitude'
+]
+
+# Output file stem per category, following the existing *_calls_<start>_to_<end> files.
+# Storm debris is not 'debris_calls': count_debris_calls writes those files with its own columns
+CATEGORY_FILE_STEMS = {
+    'power_outage': 'power_outage_calls',
+    'storm_debris': 'storm_debris_calls',
+    'building_damage': 'building_damage_calls',
+    'infrastructure': 'infrastructure_damage_calls',
+    'maintenance': 'maintenance_calls',
+    'other': 'other_calls',
+}
+
+def classify_chunk(chunk, center_index, start_date, end_date, max_distance_m, enricher=None):
+    """Classify one chunk; returns {category: output rows}. An enricher adds its polygon label columns."""
+    dates = pd.to_datetime(chunk['Created Date Local'], errors='coerce')
+    in_range = (dates >= start_date) & (dates <= end_date)
+    chunk = chunk[in_range]
+    dates = dates[in_range]
+    if chunk.empty:
+        return {}
+
+    categories = classify_categories(chunk['Title'], chunk['Description'], chunk['365 Case Number'])
+
+    lats = pd.to_numeric(chunk['Latitude'], errors='coerce').to_numpy(dtype=float)
+    lons = pd.to_numeric(chunk['Longitude'], errors='coerce').to_numpy(dtype=float)
+    center_ids, distances = center_index.nearest(lats, lons)
+
+    rows = pd.DataFrame({
+        'request_id': chunk['365 Case Number'].to_numpy(),
+        'title': chunk['Title'].to_numpy(),
+        'description': chunk['Description'].to_numpy(),
+        'created_date': dates.dt.strftime('%Y-%m-%d %H:%M:%S').to_numpy(),
+        'status': chunk['Status'].to_numpy(),
+        'lat': lats,
+        'lon': lons,
+        'distance_meters': distances[:, 0],
+        'nearby_center': center_index.names_for(center_ids[:, 0]),
+        'category': categories
+    })
+    if enricher is not None:
+        rows = rows.assign(**enricher.enrich_coordinates(lats, lons))
+    if max_distance_m is not None:
+        rows = rows[rows['distance_meters'] <= max_distance_m]
+
+    return {category: group for category, group in rows.groupby('category', sort=False)}
+
+def classify_311_file(input_file, start_date, end_date, output_dir='public', workers=1, max_distance_m=None,
+                      geojson_mode='pretty', centers_path='public/houston-texas-community-centers-latlon.geojson',
+                      chunk_size=10000, enrich=False):
+    """
+    Classify every request in [start_date, end_date] and write one CSV + GeoJSON per category.
+    With enrich=True every call also gets its super neighborhood, block group, tract, ZIP and
+    flood zone (see spatial_enrichment).
+    """
+    print(f"Classifying {input_file} ({start_date:%Y-%m-%d} to {end_date:%Y-%m-%d})...")
+    center_index = CommunityCenterIndex.from_geojson(centers_path)
+    # nearby_center / distance_meters already come from center_index
+    enricher = None
+    if enrich:
+        # The layers (and their geopandas stack) are only needed with --enrich
+        from spatial_enrichment import SpatialEnricher
+        enricher = SpatialEnricher.from_files(centers_path=None)
+
+    dataset_dir = parquet_dataset_path(input_file)
+    if input_file.endswith(STORE_SUFFIX):
+        print(f"Reading deduplicated case store: {input_file}")
+        chunks = iter_store_chunks(input_file, CATEGORY_COLUMNS, chunk_size)
+    elif os.path.isdir(dataset_dir):
+        print(f"Reading Parquet dataset: {dataset_dir}")
+        chunks = iter_311_parquet(dataset_dir, columns=CATEGORY_COLUMNS, start_date=start_date,
+                                  end_date=end_date, batch_size=chunk_size)
+    else:
+        chunks = read_311_extract(input_file, CATEGORY_COLUMNS, chunk_size)
+
+    suffix = f"{start_date:%Y-%m-%d}_to_{end_date:%Y-%m-%d}"
+    writers = {}
+    try:
+        for chunk_results in map_chunks(classify_chunk, chunks, workers,
+                                        context=(center_index, start_date, end_date, max_distance_m, enricher)):
+            for category, rows in chunk_results.items():
+                if category not in writers:
+                    prefix = os.path.join(output_dir, f"{CATEGORY_FILE_STEMS[category]}_{suffix}")
+                    writers[category] = PointDatasetWriter(f"{prefix}.csv", geojson_path(prefix, geojson_mode),
+                                                           mode=geojson_mode)
+                writers[category].write_frame(rows)
+    except Exception:
+        for writer in writers.values():
+            writer.discard()
+        raise
+
+    counts = {}
+    for category in CATEGORY_PRECEDENCE:
+        if category in writers:
+            writers[category].close()
+            counts[category] = writers[category].count
+            print(f"Saved {writers[category].csv_path} and {writers[category].geojson_path} ({counts[category]} calls)")
+        else:
+            counts[category] = 0
+
+    print("\nCategory breakdown:")
+    for category, count in counts.items():
+        print(f"  {category}: {count}")
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify 311 requests into every category in a single pass')
+    parser.add_argument('input_file', help='Path to the raw 311 extract (e.g. public/311.txt) or a deduplicated case store (.sqlite)')
+    parser.add_argument('--start', default='2024-07-08', help='First day (default: 2024-07-08, Beryl landfall)')
+    parser.add_argument('--end', default='2024-07-30', help='Last day, inclusive (default: 2024-07-30)')
+    parser.add_argument('--output-dir', default='public')
+    parser.add_argument('--max-distance', type=float, help='Only keep calls within this many meters of a center (e.g. 1609.34)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--geojson-format', choices=GEOJSON_MODES, default='pretty')
+    parser.add_argument('--enrich', action='store_true', help='Add neighborhood, block group, tract, ZIP and flood zone columns')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_file) and not os.path.isdir(parquet_dataset_path(args.input_file)):
+        print(f"Error: File {args.input_file} not found.")
+        return
+
+    start_date = datetime.strptime(args.start, '%Y-%m-%d')
+    end_date = datetime.strptime(args.end, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+    classify_311_file(args.input_file, start_date, end_date, args.output_dir, args.workers, args.max_distance,
+                      args.geojson_format, enrich=args.enrich)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Nearest-community-center engine for 311 requests.
+
+Centers are placed on the unit sphere and indexed with a KD-tree, where straight-line
+(chord) distance orders points exactly like great-circle distance. Queries take whole
+coordinate arrays: the tree narrows each request down to a handful of candidate
+centers, and one vectorized haversine over every (request, candidate) pair checks
+the radius and ranks the candidates.
+
+Callers that must reproduce the original per-center loops pass their scalar
+haversine as a reference distance_fn (haversine_m by default; None skips it). It is
+only evaluated for the reported matches and for the rare pairs whose vectorized distance is too close to the radius
+or to another candidate to decide in the last bits, so names and distances stay
+byte-identical to the loops.
+"""
+
+import json
+import math
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6371000
+
+# Relative slack on tree radii so floating point never drops a true candidate
+CANDIDATE_SLACK = 1e-6
+
+# Vectorized distances within this relative margin of a decision are settled with the reference distance_fn
+DECISION_MARGIN = 1e-9
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Distance between two points in meters (scalar reference for haversine_m_array)"""
+    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    return 2 * math.asin(math.sqrt(a)) * EARTH_RADIUS_M
+
+def haversine_m_array(lat1, lon1, lat2, lon2):
+    """Distance in meters between arrays of points, elementwise"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(values, dtype=float)) for values in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(a)) * EARTH_RADIUS_M
+
+def _unit_vectors(lats, lons):
+    """Convert degree coordinates to points on the unit sphere"""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def _chord(distance_m):
+    """Chord length on the unit sphere for a great-circle distance in meters"""
+    return 2 * np.sin(np.minimum(np.asarray(distance_m, dtype=float) / EARTH_RADIUS_M, math.pi) / 2)
+
+class CommunityCenterIndex:
+    """KD-tree over community centers answering nearest and within-radius queries in bulk"""
+
+    def __init__(self, names, lats, lons, distance_fn=haversine_m):
+        self.names = np.asarray(names, dtype=object)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        # Scalar reference distance_fn(request_lat, request_lon, center_lat, center_lon) -> meters, a haversine
+        # on the same sphere; reported distances come from it. None keeps everything vectorized
+        self.distance_fn = distance_fn
+
+        # Centers without usable coordinates can never match, as in the scalar loops
+        valid = np.isfinite(self.lats) & np.isfinite(self.lons)
+        self._tree_ids = np.flatnonzero(valid)
+        self._tree = cKDTree(_unit_vectors(self.lats[valid], self.lons[valid])) if valid.any() else None
+
+    @classmethod
+    def from_centers(cls, centers, distance_fn=haversine_m):
+        """Build from the [{'name', 'lat', 'lon'}] lists returned by load_community_centers"""
+        return cls([c['name'] for c in centers], [c['lat'] for c in centers], [c['lon'] for c in centers], distance_fn)
+
+    @classmethod
+    def from_geojson(cls, path='public/houston-texas-community-centers-latlon.geojson', name_property='Name',
+                     distance_fn=haversine_m):
+        """Build from a point GeoJSON of community centers"""
+        with open(path, 'r') as f:
+            geojson = json.load(f)
+        centers = []
+        for feature in geojson['features']:
+            coords = feature['geometry']['coordinates']
+            centers.append({
+                'name': feature['properties'].get(name_property, 'Unknown'),
+                'lon': coords[0],
+                'lat': coords[1]
+            })
+        return cls.from_centers(centers, distance_fn)
+
+    def __len__(self):
+        return len(self.names)
+
+    def names_for(self, indices):
+        """Center names for an array of indices; -1 maps to None"""
+        indices = np.asarray(indices)
+        names = np.full(indices.shape, None, dtype=object)
+        found = indices >= 0
+        names[found] = self.names[indices[found]]
+        return names
+
+    def _query_points(self, lats, lons):
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        valid = np.isfinite(lats) & np.isfinite(lons)
+        return lats, lons, valid, _unit_vectors(lats[valid], lons[valid])
+
+    def _candidate_pairs(self, points, radii):
+        """(query row, center index) pairs whose chord distance may fall within each radius, by row then file order"""
+        chords = _chord(radii) * (1 + CANDIDATE_SLACK) + 1e-12
+        hits = self._tree.query_ball_point(points, chords)
+        lengths = np.array([len(row_hits) for row_hits in hits], dtype=int)
+        rows = np.repeat(np.arange(len(points)), lengths)
+        centers = self._tree_ids[np.concatenate(hits).astype(int)] if lengths.sum() else np.empty(0, dtype=int)
+        order = np.lexsort((centers, rows))
+        return rows[order], centers[order]
+
+    def _pair_distances(self, lats, lons, rows, centers):
+        """Vectorized distance of every (request, center) pair"""
+        return haversine_m_array(lats[rows], lons[rows], self.lats[centers], self.lons[centers])
+
+    def _reference(self, lats, lons, rows, centers, approximate):
+        """Distances from the reference distance_fn for the given pairs (the vectorized ones without it)"""
+        if self.distance_fn is None:
+            return approximate
+        return np.array([self.distance_fn(lats[row], lons[row], self.lats[center], self.lons[center])
+                         for row, center in zip(rows, centers)], dtype=float).reshape(len(rows))
+
+    def _within(self, lats, lons, rows, centers, radius_m):
+        """Which pairs are within radius_m, and their distances (reference values where it was consulted)"""
+        distances = self._pair_distances(lats, lons, rows, centers)
+        if self.distance_fn is not None:
+            close = np.abs(distances - radius_m) <= DECISION_MARGIN * radius_m
+            distances[close] = self._reference(lats, lons, rows[close], centers[close], distances[close])
+        return distances <= radius_m, distances
+
+    def _valid_pairs(self, lats, lons, radius_m):
+        lats, lons, valid, points = self._query_points(lats, lons)
+        if self._tree is None or not valid.any():
+            return lats, lons, np.empty(0, dtype=int), np.empty(0, dtype=int)
+        rows, centers = self._candidate_pairs(points, np.full(len(points), radius_m))
+        return lats, lons, np.flatnonzero(valid)[rows], centers
+
+    def within_radius(self, lats, lons, radius_m):
+        """For each request, the centers within radius_m (file order) and their distances"""
+        lats, lons, rows, centers = self._valid_pairs(lats, lons, radius_m)
+        keep, distances = self._within(lats, lons, rows, centers, radius_m)
+        rows, centers, distances = rows[keep], centers[keep], distances[keep]
+        distances = self._reference(lats, lons, rows, centers, distances)
+        bounds = np.searchsorted(rows, np.arange(len(lats) + 1))
+        return [(centers[start:end], distances[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def first_within(self, lats, lons, radius_m):
+        """First center in file order within radius_m of each request (-1 and NaN when none)"""
+        lats, lons, rows, centers = self._valid_pairs(lats, lons, radius_m)
+        indices = np.full(len(lats), -1, dtype=int)
+        distances = np.full(len(lats), np.nan)
+        keep, pair_distances = self._within(lats, lons, rows, centers, radius_m)
+        rows, centers, pair_distances = rows[keep], centers[keep], pair_distances[keep]
+        # Pairs are in file order within each row, so the first kept pair of a row wins
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        rows, centers = rows[first], centers[first]
+        indices[rows] = centers
+        distances[rows] = self._reference(lats, lons, rows, centers, pair_distances[first])
+        return indices, distances
+
+    def nearest(self, lats, lons, k=1):
+        """k nearest centers per request as (indices, distances) arrays of shape (n, k)
+
+        Ties are broken by file order, like a strict '<' scan over the centers.
+        Missing coordinates and unfilled slots are -1 / NaN.
+        """
+        lats, lons, valid, points = self._query_points(lats, lons)
+        indices = np.full((len(lats), k), -1, dtype=int)
+        distances = np.full((len(lats), k), np.nan)
+        if self._tree is None or not valid.any():
+            return indices, distances
+
+        # The k-th nearest chord bounds the candidate set; rank the candidates by haversine
+        chord_k, _ = self._tree.query(points, k=min(k, len(self._tree_ids)))
+        chord_k = np.asarray(chord_k).reshape(len(points), -1)[:, -1]
+        radii = 2 * np.arcsin(np.minimum(chord_k / 2, 1.0)) * EARTH_RADIUS_M
+        rows, centers = self._candidate_pairs(points, radii)
+        rows = np.flatnonzero(valid)[rows]
+        pair_distances = self._pair_distances(lats, lons, rows, centers)
+
+        if self.distance_fn is not None:
+            # Rows where two candidates are too close to order reliably are ranked with the reference
+            order = np.lexsort((centers, pair_distances, rows))
+            sorted_rows, sorted_distances = rows[order], pair_distances[order]
+            near_tie = (sorted_rows[1:] == sorted_rows[:-1]) & (
+                sorted_distances[1:] - sorted_distances[:-1] <= DECISION_MARGIN * np.maximum(sorted_distances[1:], 1.0))
+            unsure = np.isin(rows, sorted_rows[1:][near_tie])
+            pair_distances[unsure] = self._reference(lats, lons, rows[unsure], centers[unsure], pair_distances[unsure])
+
+        order = np.lexsort((centers, pair_distances, rows))
+        rows, centers, pair_distances = rows[order], centers[order], pair_distances[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        top = rank < k
+        rows, centers, rank, pair_distances = rows[top], centers[top], rank[top], pair_distances[top]
+        indices[rows, rank] = centers
+        distances[rows, rank] = self._reference(lats, lons, rows, centers, pair_distances)
+        return indices, distances
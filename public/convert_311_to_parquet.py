@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Convert a raw pipe-delimited Houston 311 extract into a typed, date-partitioned
+Parquet dataset (year=YYYY/month=M/...).
+
+The conversion is a one-time step per extract. The 311 processors look for the
+dataset next to the extract (see parquet_dataset_path) and, when it exists, read
+only the columns and months a run needs instead of re-parsing the text file.
+"""
+
+import argparse
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# The header row of the extract has line breaks, so the column names are fixed here
+COLUMN_NAMES = [
+    '365 Case Number', 'Case Number', 'Incident Address', 'Latitude', 'Longitude',
+    'Status', 'Created Date Local', 'Closed Date', 'Title', 'Incident Case Type',
+    'SLA Time', 'Resolve By Time', 'Service Area', 'Council District', 'Key Map',
+    'Department', 'Division', 'AVA Case Type', 'State Code', 'State Code Name',
+    'SLA Start Time', 'X', 'Y', 'Incident Street', 'Incident City', 'Incident State',
+    'Zip Code', 'TaxID', 'Created Date UTC', 'Customer SuperNeighborhood',
+    'Management District', 'Garbage Route', 'Garbage Day', 'SWM Quadrant',
+    'Recycling Route', 'Recycling Day', 'Recycling Quadrant', 'Recycling Areas',
+    'Heavy Trash Day', 'Heavy Trash Quadrant', 'Queue', 'ETJ', 'SLA Name',
+    'Channel', 'Extract Date', 'Latest Case Notes', 'Sample Case Confilcts Notes',
+    'Description', 'Resolution Notes'
+]
+
+# Metadata lines before the first data row of the extract
+HEADER_ROWS = 6
+
+DATE_COLUMN = 'Created Date Local'
+DATETIME_COLUMNS = ['Created Date Local', 'Closed Date', 'Created Date UTC', 'Extract Date']
+NUMERIC_COLUMNS = ['Latitude', 'Longitude', 'X', 'Y']
+PARTITION_COLUMNS = ['year', 'month']
+
+# Position of every row in the extract, so reads can return rows in file order across partitions
+SOURCE_ROW_COLUMN = 'source_row'
+
+# Stored as text but inferred as numbers by pd.read_csv, which the text-file path uses
+INFERRED_COLUMNS = ['365 Case Number', 'Case Number']
+
+SCHEMA = pa.schema(
+    [
+        pa.field(
+            name,
+            pa.timestamp('ns') if name in DATETIME_COLUMNS
+            else pa.float64() if name in NUMERIC_COLUMNS
+            else pa.string()
+        )
+        for name in COLUMN_NAMES
+    ] + [pa.field(SOURCE_ROW_COLUMN, pa.int64()), pa.field('year', pa.int16()), pa.field('month', pa.int16())]
+)
+
+def parquet_dataset_path(input_file):
+    """Location of the Parquet dataset converted from a raw extract"""
+    return os.path.splitext(input_file)[0] + '.parquet'
+
+def _type_chunk(chunk, first_row=0):
+    """Apply the dataset schema to a raw chunk of strings"""
+    chunk[SOURCE_ROW_COLUMN] = np.arange(first_row, first_row + len(chunk), dtype=np.int64)
+    for column in DATETIME_COLUMNS:
+        chunk[column] = pd.to_datetime(chunk[column], errors='coerce')
+    for column in NUMERIC_COLUMNS:
+        chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+    chunk['year'] = chunk[DATE_COLUMN].dt.year.astype('Int16')
+    chunk['month'] = chunk[DATE_COLUMN].dt.month.astype('Int16')
+    return pa.Table.from_pandas(chunk, schema=SCHEMA, preserve_index=False)
+
+def convert_311_to_parquet(input_file, dataset_dir=None, chunk_size=250000):
+    """Convert a pipe-delimited 311 extract to a Parquet dataset partitioned by year and month"""
+    dataset_dir = dataset_dir or parquet_dataset_path(input_file)
+    print(f"Converting {input_file} -> {dataset_dir}")
+
+    # Start from an empty dataset so reruns don't duplicate rows
+    if os.path.isdir(dataset_dir):
+        shutil.rmtree(dataset_dir)
+
+    total_rows = 0
+    for chunk_num, chunk in enumerate(pd.read_csv(input_file, delimiter='|', chunksize=chunk_size, skiprows=HEADER_ROWS,
+                                                  header=None, names=COLUMN_NAMES, dtype=str, on_bad_lines='skip')):
+        table = _type_chunk(chunk, total_rows)
+        pq.write_to_dataset(
+            table,
+            root_path=dataset_dir,
+            partition_cols=PARTITION_COLUMNS,
+            basename_template=f'chunk-{chunk_num:05d}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        total_rows += len(chunk)
+        print(f"Converted chunk {chunk_num + 1} ({total_rows} rows)")
+
+    print(f"Saved {total_rows} rows to {dataset_dir}")
+    return dataset_dir
+
+def _month_keys(start_date, end_date):
+    """All (year, month) partitions between two dates, inclusive"""
+    keys = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        keys.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return keys
+
+def _date_filter(start_date=None, end_date=None):
+    """Partition pruning plus row-level pushdown on Created Date Local"""
+    expression = None
+    if start_date is not None:
+        expression = ds.field(DATE_COLUMN) >= pa.scalar(start_date, pa.timestamp('ns'))
+    if end_date is not None:
+        upper = ds.field(DATE_COLUMN) <= pa.scalar(end_date, pa.timestamp('ns'))
+        expression = upper if expression is None else expression & upper
+    if start_date is not None and end_date is not None:
+        partitions = None
+        for year, month in _month_keys(start_date, end_date):
+            key = (ds.field('year') == year) & (ds.field('month') == month)
+            partitions = key if partitions is None else partitions | key
+        expression = partitions & expression
+    return expression
+
+def _infer_types(frame):
+    """Give text columns the types pd.read_csv would infer, e.g. all-digit case numbers as integers"""
+    for column in INFERRED_COLUMNS:
+        if column in frame.columns:
+            numbers = pd.to_numeric(frame[column], errors='coerce')
+            if numbers.notna().sum() == frame[column].notna().sum():
+                frame[column] = numbers
+    return frame
+
+def _source_row_range(fragment):
+    """First and last source_row in a file, from its row group statistics (or the column when they're missing)"""
+    fragment.ensure_complete_metadata()
+    bounds = [row_group.statistics.get(SOURCE_ROW_COLUMN) for row_group in fragment.row_groups]
+    if bounds and all(bound and bound.get('min') is not None for bound in bounds):
+        return min(bound['min'] for bound in bounds), max(bound['max'] for bound in bounds)
+    values = fragment.to_table(columns=[SOURCE_ROW_COLUMN]).column(SOURCE_ROW_COLUMN)
+    return pc.min(values).as_py(), pc.max(values).as_py()
+
+def _overlapping_fragments(fragments):
+    """Group files whose source_row ranges overlap, in source_row order
+
+    A conversion chunk is spread over one file per month partition, so each group is normally one chunk;
+    renamed or compacted files just make larger groups.
+    """
+    ranges = sorted(((*_source_row_range(fragment), fragment.path) for fragment in fragments
+                     if fragment.count_rows()), key=lambda item: item[:2])
+    groups = []
+    last_row = None
+    for first, last, path in ranges:
+        if last_row is None or first > last_row:
+            groups.append([])
+            last_row = last
+        groups[-1].append(path)
+        last_row = max(last_row, last)
+    return groups
+
+def iter_311_parquet(dataset_dir, columns=None, start_date=None, end_date=None, batch_size=10000):
+    """
+    Yield DataFrame chunks from a converted dataset, reading only the requested columns and date range.
+    Rows come in extract order with the column types of read_311_extract, so both paths give the same outputs.
+    """
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive')
+    columns = list(columns or COLUMN_NAMES)
+    expression = _date_filter(start_date, end_date)
+    if SOURCE_ROW_COLUMN not in dataset.schema.names:
+        # Converted before rows were numbered: partition order
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+            if batch.num_rows:
+                yield _infer_types(batch.to_pandas())
+        return
+
+    # Every conversion chunk is spread over the month partitions; read one chunk's files at a time
+    # and put its rows back in extract order
+    partitioning = ds.partitioning(pa.schema([dataset.schema.field(name) for name in PARTITION_COLUMNS]),
+                                   flavor='hive')
+    for paths in _overlapping_fragments(dataset.get_fragments(filter=expression)):
+        chunk_dataset = ds.dataset(paths, schema=dataset.schema, format='parquet',
+                                   partitioning=partitioning, partition_base_dir=dataset_dir)
+        table = chunk_dataset.to_table(columns=columns + [SOURCE_ROW_COLUMN], filter=expression)
+        table = table.sort_by(SOURCE_ROW_COLUMN).drop_columns([SOURCE_ROW_COLUMN])
+        for batch in table.to_batches(max_chunksize=batch_size):
+            if batch.num_rows:
+                yield _infer_types(batch.to_pandas())
+
+def iter_311_parquet_by_date(dataset_dir, columns=None, start_date=None, end_date=None, batch_size=10000):
+    """
+    Yield DataFrame chunks from a converted dataset in Created Date Local order (rows without a date last).
+    One month partition is read and sorted at a time, so memory is bounded by a month rather than the extract;
+    rows created at the same time keep their extract order.
+    """
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive')
+    columns = list(columns or COLUMN_NAMES)
+    expression = _date_filter(start_date, end_date)
+    partitions = {}
+    for fragment in dataset.get_fragments(filter=expression):
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        partitions.setdefault((keys.get('year'), keys.get('month')), fragment.partition_expression)
+    sort_columns = [DATE_COLUMN] + ([SOURCE_ROW_COLUMN] if SOURCE_ROW_COLUMN in dataset.schema.names else [])
+    read_columns = columns + [name for name in sort_columns if name not in columns]
+    for key in sorted(partitions, key=lambda key: (key[0] is None, key)):
+        partition = partitions[key] if expression is None else partitions[key] & expression
+        table = dataset.to_table(columns=read_columns, filter=partition)
+        table = table.sort_by([(name, 'ascending') for name in sort_columns]).select(columns)
+        for batch in table.to_batches(max_chunksize=batch_size):
+            if batch.num_rows:
+                yield _infer_types(batch.to_pandas())
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a pipe-delimited 311 extract to a partitioned Parquet dataset')
+    parser.add_argument('input_file', help='Path to the raw 311 extract (e.g. public/311.txt)')
+    parser.add_argument('--output', help='Dataset directory (defaults to the extract path with a .parquet suffix)')
+    parser.add_argument('--chunk-size', type=int, default=250000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_file):
+        print(f"Error: File {args.input_file} not found.")
+        return
+
+    start = datetime.now()
+    convert_311_to_parquet(args.input_file, args.output, args.chunk_size)
+    print(f"Conversion took {(datetime.now() - start).total_seconds():.1f}s")
+
+if __name__ == '__main__':
+    main()
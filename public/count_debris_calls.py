@@ -1,42 +1,32 @@
 import csv
 import json
 import math
+import os
+
+from category_rules import DEBRIS_KEYWORDS, MAINTENANCE_KEYWORDS, DEBRIS_EXCLUDE_KEYWORDS as EXCLUDE_KEYWORDS
+from dedup_311_store import LAT_COLUMN, LON_COLUMN, build_store
 
-DEBRIS_KEYWORDS = [
-    'debris', 'tree down', 'tree fallen', 'tree debris', 'tree limb', 'tree branch', 'branches', 'limbs',
-    'fallen tree', 'fallen branch', 'fallen limb', 'brush', 'yard waste', 'storm debris', 'natural debris', 'uprooted',
-    'obstruction', 'blockage', 'street blocked', 'road blocked', 'pile'
-]
-# Exclusion keywords for building/infrastructure debris
-EXCLUDE_KEYWORDS = [
-    'fence', 'sign', 'building', 'roof', 'wall', 'construction', 'material', 'garage', 'porch', 'balcony',
-    'attic', 'ceiling', 'floor', 'property', 'house', 'home', 'apartment', 'structure', 'barricade', 'barricaded', 'closed for construction', 'city barricade'
-]
-MAINTENANCE_KEYWORDS = [
-    'missed garbage', 'missed recycling', 'missed heavy trash', 'container replacement',
-    'routine service', 'garbage pickup', 'recycling pickup', 'trash pickup',
-    'waste collection', 'cart replacement', 'bin replacement', 'heavy trash'
-]
-BUILDING_DAMAGE_KEYWORDS = [
-    'building damage', 'roof damage', 'collapsed', 'wall down', 'ceiling collapse',
-    'window broken', 'door broken', 'fire damage', 'major damage', 'structural',
-    'foundation', 'crack in wall', 'crack in ceiling', 'crack in foundation',
-    'partial collapse', 'total collapse', 'chimney damage', 'garage damage',
-    'balcony damage', 'porch damage', 'interior damage', 'exterior damage',
-    'floor damage', 'attic damage', 'water damage to building', 'damaged house',
-    'damaged home', 'damaged apartment', 'damaged structure', 'damaged property'
-]
 START_DATE = '2024-07-08'
 END_DATE = '2024-07-30'
 
+BERYL_FILTER_FILE = 'public/311_july_Beryl_Filter.geojson'
+
+# Latest version of every Beryl filter call, kept next to this script across runs (see dedup_311_store)
+DEDUP_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'beryl_filter_cases.sqlite')
+
 def contains_keyword(text, keywords):
     text = text.lower() if text else ''
     return any(k in text for k in keywords)
 
 def main():
-    with open('public/311_july_Beryl_Filter.geojson', 'r') as f:
-        data = json.load(f)
+    # A request listed more than once is counted once, in its latest version
+    store = build_store(DEDUP_STORE, [BERYL_FILTER_FILE])
+    try:
+        calls = list(store.iter_records())
+    finally:
+        store.close()
     filtered = []
+    filtered_calls = []
     # Load power outage request_ids to exclude from debris
     power_outage_ids = set()
     try:
@@ -74,8 +64,7 @@ def main():
     except Exception as e:
         print(f"Could not read infrastructure CSV for tree-related exclusions: {e}")
 
-    for feat in data['features']:
-        props = feat.get('properties', {})
+    for props in calls:
         title = str(props.get('title', '')).lower()
         desc = str(props.get('description', '')).lower()
         date = str(props.get('created_date', ''))[:10]
@@ -109,6 +98,7 @@ def main():
             'nearby_center': props.get('nearby_center', ''),
             'distance_meters': dist
         })
+        filtered_calls.append(props)
     print(f"Debris calls (within 1 mile, {START_DATE} to {END_DATE}): {len(filtered)}")
     # Print a sample for context review
     for i, row in enumerate(filtered[:10]):
@@ -130,37 +120,36 @@ def main():
     out_geojson = f"public/debris_calls_{START_DATE}_to_{END_DATE}.geojson"
     geojson_features = []
     seen_ids = set()
-    for row in filtered:
+    for row, props in zip(filtered, filtered_calls):
         rid = str(row['request_id'])
         if rid in seen_ids:
             continue
-        for feat in data['features']:
-            props = feat.get('properties', {})
-            lat = feat.get('geometry', {}).get('coordinates', [None, None])[1]
-            lon = feat.get('geometry', {}).get('coordinates', [None, None])[0]
-            # Clean NaN in coordinates
-            if lat is not None and (isinstance(lat, float) and math.isnan(lat)):
-                lat = None
-            if lon is not None and (isinstance(lon, float) and math.isnan(lon)):
-                lon = None
-            # Clean NaN in properties
-            clean_props = {}
-            for k, v in props.items():
-                if isinstance(v, float) and math.isnan(v):
-                    clean_props[k] = None
-                else:
-                    clean_props[k] = v
-            if str(props.get('request_id', '')) == rid and lat is not None and lon is not None:
-                geojson_features.append({
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat]
-                    },
-                    "properties": clean_props
-                })
-                seen_ids.add(rid)
-                break
+        lat = props.get(LAT_COLUMN)
+        lon = props.get(LON_COLUMN)
+        # Clean NaN in coordinates
+        if lat is not None and (isinstance(lat, float) and math.isnan(lat)):
+            lat = None
+        if lon is not None and (isinstance(lon, float) and math.isnan(lon)):
+            lon = None
+        # Clean NaN in properties
+        clean_props = {}
+        for k, v in props.items():
+            if k in (LON_COLUMN, LAT_COLUMN):
+                continue
+            if isinstance(v, float) and math.isnan(v):
+                clean_props[k] = None
+            else:
+                clean_props[k] = v
+        if lat is not None and lon is not None:
+            geojson_features.append({
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [lon, lat]
+                },
+                "properties": clean_props
+            })
+            seen_ids.add(rid)
     geojson = {
         "type": "FeatureCollection",
         "features": geojson_features
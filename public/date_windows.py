@@ -0,0 +1,50 @@
+"""
+Date windows for bucketing 311 requests.
+
+A window is a (label, start, end) tuple with an inclusive end. Dates are parsed
+once per chunk and window_membership assigns each row every window it falls in,
+so filtering and scoring only has to run once per row.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+def month_window(label, year, month):
+    """Window covering a whole calendar month"""
+    start = datetime(year, month, 1)
+    if month == 12:
+        end = datetime(year + 1, 1, 1) - pd.Timedelta(seconds=1)
+    else:
+        end = datetime(year, month + 1, 1) - pd.Timedelta(seconds=1)
+    return (label, start, end)
+
+# June, July, August and all three months (JJA) of 2024
+DEFAULT_WINDOWS = [
+    month_window('June', 2024, 6),
+    month_window('July', 2024, 7),
+    month_window('August', 2024, 8),
+    ('JJA', datetime(2024, 6, 1), datetime(2024, 9, 1) - pd.Timedelta(seconds=1)),
+]
+
+def windows_from_config(entries):
+    """Build windows from dicts like {'label': 'Beryl', 'start': '2024-07-08', 'end': '2024-07-30 23:59:59'}"""
+    return [(entry['label'], pd.Timestamp(entry['start']).to_pydatetime(), pd.Timestamp(entry['end']).to_pydatetime())
+            for entry in entries]
+
+def windows_span(windows):
+    """Earliest start and latest end across all windows"""
+    return min(start for _, start, _ in windows), max(end for _, _, end in windows)
+
+def parse_dates(values):
+    """Parse a date column once; unparseable values become NaT"""
+    return pd.to_datetime(values, errors='coerce')
+
+def window_membership(dates, windows):
+    """Boolean matrix (rows x windows) marking every window each date belongs to"""
+    # NaT is the smallest int64, so unparseable dates fall outside every window
+    values = pd.DatetimeIndex(dates).as_unit('ns').asi8
+    starts = np.array([pd.Timestamp(start).as_unit('ns').value for _, start, _ in windows])
+    ends = np.array([pd.Timestamp(end).as_unit('ns').value for _, _, end in windows])
+    return (values[:, None] >= starts[None, :]) & (values[:, None] <= ends[None, :])
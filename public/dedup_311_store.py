@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Deduplicated view over overlapping 311 snapshots.
+
+Daily and monthly pulls overlap, so the same case can appear in several
+extracts. CaseDedupStore merges snapshots chunk by chunk into a SQLite table
+keyed by case ('365 Case Number', falling back to 'Case Number' and then to the
+'request_id' of the pipeline's own outputs) and keeps only
+the latest version of each case by Extract Date. Versions with the same (or no)
+Extract Date resolve to the one merged last. Rows without any case number cannot
+be matched across snapshots; they pass through under a key of their own
+('#<snapshot>:<row>') and are counted when merged. Only one chunk is in memory at
+a time, so millions of rows across many snapshots merge in a streaming fashion;
+the primary key index does the per-row lookup.
+
+The store remembers which snapshots it holds (path, size, modification time and
+extra columns), so it is kept across runs: build_store merges only snapshots it
+has not seen and starts over when a merged one changed, was dropped from the
+list or moved in it.
+
+Downstream counts read the deduplicated view with iter_frames / read_frame /
+iter_records, and the 311 processors take a store (.sqlite) in place of an
+extract (see iter_store_chunks).
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from convert_311_to_parquet import DATETIME_COLUMNS
+from incremental_state import CASE_COLUMN, EXTRACT_COLUMN, as_text, extract_text
+from load_311_extract import parse_extract_dates, read_311_extract
+
+FALLBACK_CASE_COLUMN = 'Case Number'
+
+# Case number column of the pipeline's outputs (the 365 Case Number)
+OUTPUT_CASE_COLUMN = 'request_id'
+
+# Case key columns, in order of preference
+CASE_KEY_COLUMNS = [CASE_COLUMN, FALLBACK_CASE_COLUMN, OUTPUT_CASE_COLUMN]
+
+# Stores are SQLite files; the 311 processors read a path with this suffix as a store
+STORE_SUFFIX = '.sqlite'
+
+# Point geometry of GeoJSON snapshots is stored in these columns
+LON_COLUMN = 'geometry_lon'
+LAT_COLUMN = 'geometry_lat'
+
+def case_keys(chunk):
+    """Case key per row from the first CASE_KEY_COLUMNS value that is present ('' when none is)"""
+    keys = None
+    for column in CASE_KEY_COLUMNS:
+        if column in chunk.columns:
+            values = as_text(chunk[column])
+            keys = values if keys is None else np.where(keys != '', keys, values)
+    if keys is None:
+        raise ValueError(f"Snapshot has none of the case number columns {CASE_KEY_COLUMNS}")
+    return keys
+
+def _records(chunk):
+    """One JSON record per row, with dates written as 'YYYY-MM-DD HH:MM:SS'"""
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        if pd.api.types.is_datetime64_any_dtype(chunk[column]):
+            chunk[column] = chunk[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    # Missing values become null; floats keep full precision
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    return [json.dumps(record, default=str) for record in chunk.to_dict('records')]
+
+class CaseDedupStore:
+    """Latest version of every 311 case across merged snapshots"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cases ('
+            'case_key TEXT PRIMARY KEY, extract_date TEXT NOT NULL, record TEXT NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            'position INTEGER PRIMARY KEY, path TEXT NOT NULL, signature TEXT NOT NULL, extra_columns TEXT NOT NULL)'
+        )
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM cases').fetchone()[0]
+
+    def merge_frame(self, chunk, source='', first_row=0):
+        """
+        Merge one chunk of a snapshot. Rows without a case number are kept under the key
+        '#<source>:<row>', row counting from first_row. Returns (rows merged, rows passed through).
+        """
+        keys = case_keys(chunk)
+        keyless = keys == ''
+        if keyless.any():
+            keys = keys.copy()
+            keys[keyless] = [f'#{source}:{row}' for row in first_row + np.flatnonzero(keyless)]
+        extract_dates = extract_text(chunk[EXTRACT_COLUMN]) if EXTRACT_COLUMN in chunk.columns else [''] * len(chunk)
+        self.conn.executemany(
+            'INSERT INTO cases (case_key, extract_date, record) VALUES (?, ?, ?) '
+            'ON CONFLICT(case_key) DO UPDATE SET extract_date = excluded.extract_date, record = excluded.record '
+            'WHERE excluded.extract_date >= cases.extract_date',
+            zip(keys, extract_dates, _records(chunk))
+        )
+        return len(chunk), int(keyless.sum())
+
+    def merge_file(self, path, extra_columns=None, chunk_size=100000, header_in_file=False):
+        """
+        Merge a snapshot file chunk by chunk, record it in the snapshot list and commit. Raw pipe-delimited
+        extracts (.txt), CSVs with a header and GeoJSON point files are supported; extra_columns adds
+        constant columns (e.g. a month).
+        """
+        if path.endswith(('.geojson', '.json')):
+            chunks = _geojson_chunks(path, chunk_size)
+        elif path.endswith('.csv'):
+            chunks = pd.read_csv(path, chunksize=chunk_size, low_memory=False, on_bad_lines='skip')
+        else:
+            chunks = read_311_extract(path, chunk_size=chunk_size, header_in_file=header_in_file)
+
+        merged = passed_through = 0
+        for chunk in chunks:
+            if extra_columns:
+                chunk = chunk.assign(**extra_columns)
+            chunk_merged, chunk_passed_through = self.merge_frame(chunk, os.path.abspath(path), merged)
+            merged += chunk_merged
+            passed_through += chunk_passed_through
+        self.conn.execute('INSERT INTO snapshots (path, signature, extra_columns) VALUES (?, ?, ?)',
+                          snapshot_record(path, extra_columns))
+        self.conn.commit()
+        print(f"Merged {merged} rows from {path} ({len(self)} unique cases)")
+        if passed_through:
+            print(f"  {passed_through} rows without a case number passed through without deduplication")
+        return merged
+
+    def snapshots(self):
+        """(path, signature, extra_columns) of the merged snapshots, in merge order"""
+        return [tuple(row) for row in self.conn.execute(
+            'SELECT path, signature, extra_columns FROM snapshots ORDER BY position')]
+
+    def columns(self):
+        """Every column seen across the merged snapshots, in first-seen order"""
+        columns = {}
+        for record, in self.conn.execute('SELECT record FROM cases ORDER BY rowid'):
+            columns.update(dict.fromkeys(json.loads(record)))
+        return list(columns)
+
+    def iter_records(self, batch_size=100000):
+        """Yield the deduplicated cases as dicts of their stored values, in the order cases were first seen"""
+        cursor = self.conn.execute('SELECT record FROM cases ORDER BY rowid')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for record, in rows:
+                yield json.loads(record)
+
+    def iter_frames(self, batch_size=100000, columns=None):
+        """Yield the deduplicated cases as DataFrames, in the order cases were first seen"""
+        cursor = self.conn.execute('SELECT record FROM cases ORDER BY rowid')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records([json.loads(record) for record, in rows], columns=columns)
+
+    def read_frame(self):
+        """All deduplicated cases in one DataFrame (no rows, but the stored columns, when there are none)"""
+        frames = list(self.iter_frames())
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns())
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def _geojson_chunks(path, chunk_size):
+    """Properties of a GeoJSON point file as DataFrames, with the coordinates in LON_COLUMN/LAT_COLUMN"""
+    with open(path, 'r') as f:
+        features = json.load(f)['features']
+    for start in range(0, len(features), chunk_size):
+        batch = features[start:start + chunk_size]
+        # Object columns keep the JSON values as they are (no 123 -> 123.0 in columns with gaps)
+        chunk = pd.DataFrame([feature.get('properties') or {} for feature in batch], dtype=object)
+        coordinates = [(feature.get('geometry') or {}).get('coordinates') or [None, None] for feature in batch]
+        chunk[LON_COLUMN] = [c[0] for c in coordinates]
+        chunk[LAT_COLUMN] = [c[1] for c in coordinates]
+        yield chunk
+
+def snapshot_record(path, extra_columns=None):
+    """(path, signature, extra_columns) identifying a snapshot file as it is now"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), f'{stat.st_size}:{stat.st_mtime_ns}',
+            json.dumps(extra_columns or {}, sort_keys=True, default=str))
+
+def build_store(path, snapshots, rebuild=False, **options):
+    """
+    Bring the store at path up to date with snapshot files merged in order; snapshots is a list of paths
+    or (path, extra_columns). Snapshots an earlier run already merged are skipped while they are unchanged
+    and still lead the list in the same order; otherwise (or with rebuild=True) the store starts from empty,
+    so cases of a snapshot that was changed or dropped from the list don't linger.
+    """
+    snapshots = [snapshot if isinstance(snapshot, tuple) else (snapshot, None) for snapshot in snapshots]
+    records = [snapshot_record(snapshot_path, extra_columns) for snapshot_path, extra_columns in snapshots]
+    if not rebuild and os.path.exists(path):
+        store = CaseDedupStore(path)
+        merged = store.snapshots()
+        store.close()
+        if merged != records[:len(merged)]:
+            print(f"Snapshots changed, dropped or reordered since {path} was built, rebuilding it")
+            rebuild = True
+    if rebuild and os.path.exists(path):
+        os.remove(path)
+
+    store = CaseDedupStore(path)
+    merged = set(store.snapshots())
+    if merged:
+        print(f"{path}: {len(merged)} snapshots already merged ({len(store)} unique cases)")
+    for (snapshot_path, extra_columns), record in zip(snapshots, records):
+        if record not in merged:
+            store.merge_file(snapshot_path, extra_columns, **options)
+    return store
+
+def iter_store_chunks(path, columns=None, chunk_size=10000):
+    """
+    Deduplicated cases of an existing store as extract-like chunks for the 311 processors: the requested
+    columns (missing ones as NaN) with the extract's date columns parsed
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Deduplicated case store {path} not found")
+    store = CaseDedupStore(path)
+    try:
+        for chunk in store.iter_frames(chunk_size, columns=columns):
+            for column in DATETIME_COLUMNS:
+                if column in chunk.columns:
+                    chunk[column] = parse_extract_dates(chunk[column])
+            yield chunk
+    finally:
+        store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge overlapping 311 snapshots, keeping the latest version of each case')
+    parser.add_argument('store', help='SQLite file holding the deduplicated cases')
+    parser.add_argument('snapshots', nargs='+',
+                        help='Snapshot files, oldest first (.txt extract, .csv or .geojson); merged ones are skipped')
+    parser.add_argument('--header-in-file', action='store_true', help='Raw extracts have a header on line 6')
+    parser.add_argument('--rebuild', action='store_true', help='Start from an empty store even if it is up to date')
+    parser.add_argument('--export', help='Write the deduplicated cases to this CSV')
+    args = parser.parse_args()
+
+    store = build_store(args.store, args.snapshots, rebuild=args.rebuild, header_in_file=args.header_in_file)
+    try:
+        if args.export:
+            rows = 0
+            columns = store.columns()
+            with open(args.export, 'w', newline='') as f:
+                for chunk_num, frame in enumerate(store.iter_frames(columns=columns)):
+                    frame.to_csv(f, index=False, header=chunk_num == 0)
+                    rows += len(frame)
+            print(f"Saved {rows} deduplicated cases to {args.export}")
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Pre-dissolve the floodplain layer into tiled zone-class polygons.
+
+houston-texas-flood-100-500.geojson holds thousands of (sometimes overlapping or
+invalid) polygons. This one-time step classifies them by FLD_ZONE into the
+100-year floodplain (every FEMA Special Flood Hazard Area zone: A, AE, AH, AO,
+AR, A99, V and VE, as in precomputeFloodplainDistances.js and the map layer) and
+the 500-year floodplain (0.2 PCT ANNUAL CHANCE FLOOD HAZARD, also read from
+ZONE_SUBTY when FLD_ZONE is X), repairs invalid geometries, and dissolves each
+class on a square grid in an equal-area CRS. Zone values that are neither, nor
+known to lie outside both floodplains, are reported rather than dropped silently. The 500-year class excludes the 100-year floodplain, so the two
+classes never overlap and their areas can be added.
+
+The result is written to a GeoPackage, whose built-in R-tree spatial index lets
+consumers read only the tiles around an area (load_flood_zones(bbox=...)).
+"""
+
+import argparse
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from areal_weights import EQUAL_AREA_CRS
+
+# FEMA Special Flood Hazard Area zones (1% annual chance)
+SFHA_ZONES = ['A', 'AE', 'AH', 'AO', 'AR', 'A99', 'V', 'VE']
+
+FLOOD_ZONE_CLASSES = {
+    '100_year': SFHA_ZONES,
+    '500_year': ['0.2 PCT ANNUAL CHANCE FLOOD HAZARD'],
+}
+
+# Zones outside both floodplains (FLD_ZONE X without a 0.2 PCT subtype, undetermined, water, unmapped)
+NON_FLOODPLAIN_ZONES = ['X', 'D', 'OPEN WATER', 'AREA NOT INCLUDED', 'AREA OF MINIMAL FLOOD HAZARD']
+
+FLOOD_ZONES_FILE = 'houston-texas-flood-zones.gpkg'
+FLOOD_ZONES_LAYER = 'flood_zones'
+
+# Tile edge length in meters
+TILE_SIZE_M = 5000
+
+def _zone_text(value):
+    return str(value).strip().upper() if isinstance(value, str) else ''
+
+def zone_classes(flood_zones, zone_subtypes=None):
+    """
+    Zone class per FLD_ZONE value (None for zones outside both floodplains). A zone without a class of its
+    own takes the class of its ZONE_SUBTY (X + 0.2 PCT ANNUAL CHANCE FLOOD HAZARD is 500-year). Values that
+    are neither a floodplain zone nor in NON_FLOODPLAIN_ZONES are reported with their counts.
+    """
+    lookup = {zone: zone_class for zone_class, zones in FLOOD_ZONE_CLASSES.items() for zone in zones}
+    zones = [_zone_text(zone) for zone in flood_zones]
+    subtypes = [_zone_text(subtype) for subtype in zone_subtypes] if zone_subtypes is not None else [''] * len(zones)
+    classes = np.array([lookup.get(zone, lookup.get(subtype)) for zone, subtype in zip(zones, subtypes)],
+                       dtype=object)
+
+    unmapped = {}
+    for zone, zone_class in zip(zones, classes):
+        if zone_class is None and zone not in NON_FLOODPLAIN_ZONES:
+            unmapped[zone or '<missing>'] = unmapped.get(zone or '<missing>', 0) + 1
+    if unmapped:
+        print(f"Warning: FLD_ZONE values outside the 100- and 500-year classes, left out: {unmapped}")
+    return classes
+
+def layer_zone_classes(layer):
+    """Zone class of every feature of a raw flood layer (FLD_ZONE, plus ZONE_SUBTY when it has one)"""
+    return zone_classes(layer['FLD_ZONE'], layer['ZONE_SUBTY'] if 'ZONE_SUBTY' in layer.columns else None)
+
+def repair_polygons(geometries):
+    """Make geometries valid and split them into single polygons; returns (polygons, source row positions)"""
+    repaired = shapely.make_valid(np.asarray(geometries))
+    # make_valid can return collections mixing polygons with lines and points; keep the polygons
+    parts, rows = shapely.get_parts(repaired, return_index=True)
+    parts, nested_rows = shapely.get_parts(parts, return_index=True)
+    rows = rows[nested_rows]
+    polygons = shapely.get_type_id(parts) == 3
+    return parts[polygons], rows[polygons]
+
+def tile_grid(bounds, tile_size):
+    """Square tiles covering bounds; returns (column, row, tile polygon) arrays"""
+    minx, miny, maxx, maxy = bounds
+    x0 = np.floor(minx / tile_size) * tile_size
+    y0 = np.floor(miny / tile_size) * tile_size
+    columns = max(int(np.ceil((maxx - x0) / tile_size)), 1)
+    rows = max(int(np.ceil((maxy - y0) / tile_size)), 1)
+    tile_x, tile_y = np.meshgrid(np.arange(columns), np.arange(rows), indexing='ij')
+    tile_x, tile_y = tile_x.ravel(), tile_y.ravel()
+    tiles = shapely.box(x0 + tile_x * tile_size, y0 + tile_y * tile_size,
+                        x0 + (tile_x + 1) * tile_size, y0 + (tile_y + 1) * tile_size)
+    # Tile indices are global grid positions so tiles from different runs line up
+    return tile_x + int(x0 / tile_size), tile_y + int(y0 / tile_size), tiles
+
+def dissolve_by_tile(polygons, tiles):
+    """Union of the polygons inside every tile (None for tiles with nothing in them)"""
+    tile_ids, polygon_ids = shapely.STRtree(polygons).query(tiles, predicate='intersects')
+    order = np.argsort(tile_ids, kind='stable')
+    tile_ids, polygon_ids = tile_ids[order], polygon_ids[order]
+    dissolved = np.full(len(tiles), None, dtype=object)
+    if len(tile_ids) == 0:
+        return dissolved
+    splits = np.flatnonzero(np.diff(tile_ids)) + 1
+    for tile_hits, polygon_hits in zip(np.split(tile_ids, splits), np.split(polygon_ids, splits)):
+        tile = tiles[tile_hits[0]]
+        merged = shapely.intersection(shapely.union_all(polygons[polygon_hits]), tile)
+        if not merged.is_empty:
+            dissolved[tile_hits[0]] = merged
+    return dissolved
+
+def dissolve_floodplains(input_path='houston-texas-flood-100-500.geojson', output_path=FLOOD_ZONES_FILE,
+                         tile_size=TILE_SIZE_M):
+    """Dissolve the floodplain layer by zone class on a tile grid and save it as a GeoPackage"""
+    print(f"Loading {input_path}...")
+    flood_plains = gpd.read_file(input_path)
+    print(f"Loaded {len(flood_plains)} flood plain features")
+
+    classes = layer_zone_classes(flood_plains)
+    in_floodplain = np.array([zone_class is not None for zone_class in classes], dtype=bool)
+    flood_plains = flood_plains[in_floodplain].to_crs(EQUAL_AREA_CRS)
+    classes = classes[in_floodplain]
+
+    polygons, rows = repair_polygons(flood_plains.geometry)
+    polygon_classes = classes[rows]
+    print(f"Repaired into {len(polygons)} polygons")
+
+    tile_x, tile_y, tiles = tile_grid(shapely.total_bounds(polygons), tile_size)
+    records = {'zone_class': [], 'tile_x': [], 'tile_y': [], 'geometry': []}
+    covered_100_year = None
+    for zone_class in FLOOD_ZONE_CLASSES:
+        dissolved = dissolve_by_tile(polygons[polygon_classes == zone_class], tiles)
+        if zone_class == '100_year':
+            covered_100_year = dissolved
+        else:
+            # Leave out what the 100-year floodplain already covers
+            overlap = shapely.is_geometry(covered_100_year) & shapely.is_geometry(dissolved)
+            dissolved[overlap] = shapely.difference(dissolved[overlap], covered_100_year[overlap])
+        keep = shapely.is_geometry(dissolved) & ~shapely.is_empty(dissolved)
+        records['zone_class'].extend([zone_class] * int(keep.sum()))
+        records['tile_x'].extend(tile_x[keep].tolist())
+        records['tile_y'].extend(tile_y[keep].tolist())
+        records['geometry'].extend(dissolved[keep].tolist())
+        print(f"  {zone_class}: {int(keep.sum())} tiles")
+
+    zones = gpd.GeoDataFrame(records, geometry='geometry', crs=EQUAL_AREA_CRS)
+    zones['area_m2'] = zones.geometry.area
+    zones.to_file(output_path, driver='GPKG', layer=FLOOD_ZONES_LAYER)
+    print(f"Saved {len(zones)} tiles to {output_path}")
+    return zones
+
+def load_flood_zones(path=FLOOD_ZONES_FILE, zone_class=None, bbox=None):
+    """
+    Read dissolved flood zone tiles, optionally for one zone class and only the tiles
+    intersecting bbox (minx, miny, maxx, maxy in the file's equal-area CRS)
+    """
+    where = f"zone_class = '{zone_class}'" if zone_class else None
+    return gpd.read_file(path, layer=FLOOD_ZONES_LAYER, bbox=bbox, where=where)
+
+def main():
+    parser = argparse.ArgumentParser(description='Dissolve floodplains by zone class into a tiled GeoPackage')
+    parser.add_argument('--input', default='houston-texas-flood-100-500.geojson')
+    parser.add_argument('--output', default=FLOOD_ZONES_FILE)
+    parser.add_argument('--tile-size', type=float, default=TILE_SIZE_M, help='Tile edge in meters (default: 5000)')
+    args = parser.parse_args()
+
+    dissolve_floodplains(args.input, args.output, args.tile_size)
+
+if __name__ == '__main__':
+    main()
@@ -1,154 +1,153 @@
 import geopandas as gpd
 import pandas as pd
 import json
-from shapely.geometry import Point
+import os
+import re
+import shutil
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dedup_311_store import LAT_COLUMN, LON_COLUMN, build_store
+from geojson_writer import FeatureCollectionWriter
 
-def extract_neighborhood_311_data():
+# Deduplicated June/July/August cases, kept next to this script across runs
+DEDUP_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neighborhood_311_cases.sqlite')
+
+# Every call labelled with its Super Neighborhood, partitioned by neighborhood
+PARTITIONED_DATASET = 'neighborhood_311_calls.parquet'
+
+def neighborhood_filename(neighborhood_name):
+    """e.g. neighborhood_50_311_calls.geojson; characters unsafe in file names become '_'"""
+    return f"{re.sub(r'[^a-z0-9]+', '_', neighborhood_name.lower()).strip('_')}_311_calls.geojson"
+
+def text_column(df, column, default):
+    """Column as strings the way str(row.get(column, default)) renders them"""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[column].astype(object).map(str)
+
+def created_date_column(df):
+    """Created Date Local as 'YYYY-MM-DD HH:MM:SS' text, '' when missing"""
+    if 'Created Date Local' not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    dates = df['Created Date Local']
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+    return dates.astype(object).where(dates.notna(), '').map(str)
+
+def call_properties(calls):
+    """Feature properties of every labelled call as columns, in GeoJSON order"""
+    return pd.DataFrame({
+        'incident_type': text_column(calls, 'Incident Case Type', 'Unknown'),
+        'category': text_column(calls, 'Category', 'Unknown'),
+        'subcategory': text_column(calls, 'Subcategory', 'Unknown'),
+        'created_date': created_date_column(calls),
+        'month': text_column(calls, 'month', ''),
+        'priority': text_column(calls, 'Status', ''),
+        'description': text_column(calls, 'Description', ''),
+        'case_number': text_column(calls, 'Case Number', ''),
+        'address': text_column(calls, 'Incident Address', ''),
+        'hurricane_related': text_column(calls, 'Hurricane_Related', 'No')
+    }, index=calls.index)
+
+def read_neighborhood_calls(neighborhood_name, dataset_dir=PARTITIONED_DATASET):
+    """Calls of one neighborhood from the partitioned dataset, without any spatial work"""
+    return pq.read_table(dataset_dir, filters=[('neighborhood', '=', neighborhood_name)]).to_pandas()
+
+def breakdown(values):
+    return values.value_counts().to_dict()
+
+def extract_neighborhood_311_data(output_dir='.'):
     """
-    Extract 311 call data for the most vulnerable (Neighborhood_50) and 
-    least vulnerable (Neighborhood_3) super neighborhoods.
+    Label the June-August 311 calls with their Super Neighborhood in one spatial join and write
+    every neighborhood's calls to <output_dir>/<neighborhood>_311_calls.geojson and to a Parquet
+    dataset partitioned by neighborhood, plus neighborhood_311_analysis.json for all neighborhoods.
     """
     
     # Load vulnerability index data (contains the correct neighborhood geometries)
     print("Loading vulnerability index data...")
     vulnerability_data = gpd.read_file('super-neighborhoods-vulnerability-index.geojson')
     
-    # Load 311 call data for all three months
+    # Load 311 call data for all three months into the deduplicated case store;
+    # a case present in several datasets is counted once, in its latest version
     print("Loading 311 call data...")
-    june_data = gpd.read_file('June_Comprehensive_Category_Dataset.geojson')
-    july_data = gpd.read_file('July_Comprehensive_Category_Dataset.geojson')
-    august_data = gpd.read_file('August_Comprehensive_Category_Dataset.geojson')
-    
-    # Add month column to each dataset
-    june_data['month'] = 'June'
-    july_data['month'] = 'July'
-    august_data['month'] = 'August'
-    
-    # Combine all data
-    all_311_data = pd.concat([june_data, july_data, august_data], ignore_index=True)
+    store = build_store(DEDUP_STORE, [
+        ('June_Comprehensive_Category_Dataset.geojson', {'month': 'June'}),
+        ('July_Comprehensive_Category_Dataset.geojson', {'month': 'July'}),
+        ('August_Comprehensive_Category_Dataset.geojson', {'month': 'August'})
+    ])
+    try:
+        all_311_data = store.read_frame()
+    finally:
+        store.close()
+    if all_311_data.empty:
+        print("No 311 calls found in the category datasets, nothing to extract")
+        return
     
-    # Convert to GeoDataFrame if not already
-    if not isinstance(all_311_data, gpd.GeoDataFrame):
-        all_311_data = gpd.GeoDataFrame(all_311_data, geometry='geometry')
-    
-    # Set CRS if not set
-    if all_311_data.crs is None:
-        all_311_data.set_crs('EPSG:4326', inplace=True)
+    # Rebuild point geometries from the stored coordinates
+    all_311_data = gpd.GeoDataFrame(
+        all_311_data.drop(columns=[LON_COLUMN, LAT_COLUMN]),
+        geometry=gpd.points_from_xy(all_311_data[LON_COLUMN], all_311_data[LAT_COLUMN]),
+        crs='EPSG:4326'
+    )
     
     # Ensure vulnerability data has same CRS
     if vulnerability_data.crs != all_311_data.crs:
         vulnerability_data = vulnerability_data.to_crs(all_311_data.crs)
     
-    # Get the target neighborhoods
-    target_neighborhoods = ['Neighborhood_50', 'Neighborhood_3']
+    # One spatial join labels every call with the neighborhood(s) containing it
+    print(f"Labelling {len(all_311_data)} calls with {len(vulnerability_data)} Super Neighborhoods...")
+    neighborhood_names = vulnerability_data['neighborhood_name'].to_numpy()
+    joined = gpd.sjoin(all_311_data, gpd.GeoDataFrame(geometry=vulnerability_data.geometry.reset_index(drop=True)),
+                       how='inner', predicate='within')
+    joined = joined.sort_index(kind='stable')
+    labels = neighborhood_names[joined['index_right'].to_numpy()]
+    properties = call_properties(joined)
+    lons = joined.geometry.x.to_numpy()
+    lats = joined.geometry.y.to_numpy()
     
-    # Extract data for each target neighborhood
-    neighborhood_data = {}
+    # Partitioned dataset: any neighborhood can be read back with a partition filter
+    table = properties.assign(lon=lons, lat=lats, neighborhood=labels).reset_index(drop=True)
+    dataset_dir = os.path.join(output_dir, PARTITIONED_DATASET)
+    if os.path.isdir(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    pq.write_to_dataset(pa.Table.from_pandas(table, preserve_index=False), root_path=dataset_dir,
+                        partition_cols=['neighborhood'])
+    print(f"Saved {len(table)} labelled calls to {dataset_dir}")
     
-    for neighborhood_name in target_neighborhoods:
-        print(f"Processing {neighborhood_name}...")
-        
-        # Get the neighborhood boundary from vulnerability data
-        neighborhood_boundary = vulnerability_data[vulnerability_data['neighborhood_name'] == neighborhood_name]
-        
-        if neighborhood_boundary.empty:
-            print(f"Warning: {neighborhood_name} not found in vulnerability data")
-            continue
-        
-        # Spatial join to find 311 calls within this neighborhood
-        calls_in_neighborhood = gpd.sjoin(all_311_data, neighborhood_boundary, how='inner', predicate='within')
-        
-        # Convert to GeoJSON format
-        neighborhood_geojson = {
-            'type': 'FeatureCollection',
-            'features': []
-        }
-        
-        for idx, row in calls_in_neighborhood.iterrows():
-            # Convert timestamp to string if it's a timestamp
-            created_date = row.get('Created Date Local', '')
-            if pd.isna(created_date):
-                created_date = ''
-            elif hasattr(created_date, 'strftime'):
-                created_date = created_date.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                created_date = str(created_date)
-            
-            feature = {
-                'type': 'Feature',
-                'geometry': {
-                    'type': 'Point',
-                    'coordinates': [row.geometry.x, row.geometry.y]
-                },
-                'properties': {
-                    'incident_type': str(row.get('Incident Case Type', 'Unknown')),
-                    'category': str(row.get('Category', 'Unknown')),
-                    'subcategory': str(row.get('Subcategory', 'Unknown')),
-                    'created_date': created_date,
-                    'month': str(row.get('month', '')),
-                    'priority': str(row.get('Status', '')),
-                    'description': str(row.get('Description', '')),
-                    'case_number': str(row.get('Case Number', '')),
-                    'address': str(row.get('Incident Address', '')),
-                    'hurricane_related': str(row.get('Hurricane_Related', 'No'))
-                }
-            }
-            neighborhood_geojson['features'].append(feature)
-        
-        neighborhood_data[neighborhood_name] = neighborhood_geojson
-        
-        # Print summary statistics
-        print(f"  Total calls: {len(calls_in_neighborhood)}")
-        print(f"  June calls: {len(calls_in_neighborhood[calls_in_neighborhood['month'] == 'June'])}")
-        print(f"  July calls: {len(calls_in_neighborhood[calls_in_neighborhood['month'] == 'July'])}")
-        print(f"  August calls: {len(calls_in_neighborhood[calls_in_neighborhood['month'] == 'August'])}")
-        
-        # Category breakdown
-        category_counts = calls_in_neighborhood['Category'].value_counts()
-        print(f"  Category breakdown:")
-        for category, count in category_counts.items():
-            print(f"    {category}: {count}")
-    
-    # Save the extracted data
-    for neighborhood_name, geojson_data in neighborhood_data.items():
-        filename = f'{neighborhood_name.lower()}_311_calls.geojson'
-        with open(filename, 'w') as f:
-            json.dump(geojson_data, f, indent=2)
-        print(f"Saved {filename}")
-    
-    # Create a combined analysis file
+    # Per-neighborhood GeoJSON and the combined analysis, straight from the labelled calls
+    positions = pd.Series(np.arange(len(labels))).groupby(labels).indices
     analysis_data = {}
-    for neighborhood_name, geojson_data in neighborhood_data.items():
-        df = pd.DataFrame([f['properties'] for f in geojson_data['features']])
+    for neighborhood_name in neighborhood_names:
+        rows = positions.get(neighborhood_name, np.empty(0, dtype=int))
+        calls = properties.iloc[rows]
         
-        # Monthly breakdown
-        monthly_counts = df['month'].value_counts().to_dict()
-        
-        # Category breakdown
-        category_counts = df['category'].value_counts().to_dict()
-        
-        # Subcategory breakdown (for pie charts)
-        subcategory_counts = df['subcategory'].value_counts().to_dict()
+        filename = os.path.join(output_dir, neighborhood_filename(neighborhood_name))
+        with FeatureCollectionWriter(filename) as writer:
+            writer.write_features(lons[rows].tolist(), lats[rows].tolist(),
+                                  {name: calls[name].tolist() for name in calls.columns})
         
         analysis_data[neighborhood_name] = {
-            'total_calls': len(df),
-            'monthly_breakdown': monthly_counts,
-            'category_breakdown': category_counts,
-            'subcategory_breakdown': subcategory_counts
+            'total_calls': len(calls),
+            'monthly_breakdown': breakdown(calls['month']),
+            'category_breakdown': breakdown(calls['category']),
+            'subcategory_breakdown': breakdown(calls['subcategory'])
         }
+    print(f"Saved {len(analysis_data)} neighborhood GeoJSON files")
     
     # Save analysis
-    with open('neighborhood_311_analysis.json', 'w') as f:
+    analysis_path = os.path.join(output_dir, 'neighborhood_311_analysis.json')
+    with open(analysis_path, 'w') as f:
         json.dump(analysis_data, f, indent=2)
     
-    print("\nAnalysis saved to neighborhood_311_analysis.json")
+    print(f"\nAnalysis saved to {analysis_path}")
     print("\nSummary:")
     for neighborhood_name, data in analysis_data.items():
-        print(f"\n{neighborhood_name}:")
-        print(f"  Total calls: {data['total_calls']}")
-        print(f"  Monthly breakdown: {data['monthly_breakdown']}")
-        print(f"  Top categories: {dict(list(data['category_breakdown'].items())[:5])}")
+        monthly = data['monthly_breakdown']
+        print(f"  {neighborhood_name}: {data['total_calls']} calls "
+              f"(June {monthly.get('June', 0)}, July {monthly.get('July', 0)}, August {monthly.get('August', 0)})")
+    
+    return analysis_data
 
 if __name__ == "__main__":
-    extract_neighborhood_311_data() 
\ No newline at end of file
+    extract_neighborhood_311_data()
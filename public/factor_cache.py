@@ -0,0 +1,61 @@
+"""
+Content-addressed cache for per-neighborhood factor arrays.
+
+Each factor of the vulnerability index is stored as its own .npz artifact keyed
+by the SHA-256 of the files it was computed from plus any parameters (e.g. the
+flood method). A run hashes the inputs, loads every factor whose key is already
+cached and only recomputes the rest, so a new month of 311 calls re-runs the call
+join and nothing else. Hashing reads the files but never parses them.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from areal_weights import file_hash
+
+FACTOR_CACHE_DIR = 'vulnerability_factor_cache'
+
+def inputs_key(input_paths, params=None):
+    """SHA-256 over the contents of the input files (in order) and the parameters"""
+    parts = [file_hash(path) for path in input_paths]
+    parts.append(json.dumps(params or {}, sort_keys=True))
+    return hashlib.sha256(':'.join(parts).encode()).hexdigest()
+
+class FactorCache:
+    """Factor arrays cached on disk by the content hash of their inputs"""
+
+    def __init__(self, cache_dir=FACTOR_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.reused = []
+        self.recomputed = []
+
+    def path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key}.npz")
+
+    def get_or_compute(self, name, input_paths, compute, params=None):
+        """
+        Arrays of a factor as {array name: ndarray}. compute() is only called when no artifact
+        exists for the current inputs, and must return a dict of equally long sequences.
+        """
+        path = self.path(name, inputs_key(input_paths, params))
+        if os.path.exists(path):
+            self.reused.append(name)
+            with np.load(path) as data:
+                return {array: data[array] for array in data.files}
+
+        print(f"Computing {name} factor...")
+        arrays = {array: np.asarray(values) for array, values in compute().items()}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write under a temporary name so an interrupted run never leaves a truncated artifact
+        temp_path = path + '.tmp.npz'
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+        self.recomputed.append(name)
+        return arrays
+
+    def report(self):
+        print(f"Factors reused: {', '.join(self.reused) or 'none'}; "
+              f"recomputed: {', '.join(self.recomputed) or 'none'}")
@@ -0,0 +1,28 @@
+"""
+Identifiers of the polygon layers shared by the vulnerability and enrichment scripts.
+
+Each layer's ID comes from the first of a few candidate columns, since the
+source files name them differently; rows of a layer without any of them get
+<prefix>_<row> instead.
+"""
+
+import numpy as np
+
+# Identifier columns tried in order for each layer
+BLOCK_GROUP_ID_COLUMNS = ['GEOID10', 'GEOID', 'GEOID_10']
+NEIGHBORHOOD_ID_COLUMNS = ['SUPER_NEIGHBORHOOD']
+ZIP_ID_COLUMNS = ['Zip_Code', 'ZIP_CODE', 'ZIP', 'ZCTA5CE10']
+
+# Digits of a block group GEOID that identify its tract (state + county + tract)
+TRACT_GEOID_LENGTH = 11
+
+def first_column(frame, candidates):
+    """First candidate column the frame has (None when it has none)"""
+    return next((column for column in candidates if column in frame.columns), None)
+
+def layer_ids(frame, candidates, prefix):
+    """Identifier per row from the first candidate column, or prefix_<row> when there is none"""
+    column = first_column(frame, candidates)
+    if column is None:
+        return np.array([f'{prefix}_{row}' for row in range(len(frame))], dtype=object)
+    return frame[column].astype(str).to_numpy(dtype=object)
@@ -0,0 +1,159 @@
+"""
+Streaming writers for point outputs (CSV + GeoJSON).
+
+Features are emitted incrementally from column arrays instead of building the
+whole FeatureCollection (and a DataFrame.iterrows copy of it) in memory, so memory
+during export stays flat no matter how many rows are written.
+
+GeoJSON modes:
+  pretty  - same bytes as json.dump(collection, f, indent=2)
+  compact - no indentation or spaces
+  ndjson  - newline-delimited GeoJSON, one compact Feature per line
+"""
+
+import json
+import os
+
+GEOJSON_MODES = ['pretty', 'compact', 'ndjson']
+
+# Rows converted to Python objects at a time
+WRITE_BATCH = 10000
+
+def geojson_path(prefix, mode='pretty'):
+    """Output path for a GeoJSON mode (.geojsonl for newline-delimited)"""
+    return f"{prefix}.geojsonl" if mode == 'ndjson' else f"{prefix}.geojson"
+
+def _python_values(series):
+    """Column values as plain Python objects, as DataFrame.iterrows would yield them"""
+    return series.to_numpy(dtype=object).tolist()
+
+class FeatureCollectionWriter:
+    """Write Point features to a GeoJSON FeatureCollection (or NDJSON) one batch at a time"""
+
+    def __init__(self, path, mode='pretty', default=None):
+        if mode not in GEOJSON_MODES:
+            raise ValueError(f"Unknown GeoJSON mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.default = default
+        self.count = 0
+        self._file = open(path, 'w')
+        if mode == 'pretty':
+            self._file.write('{\n  "type": "FeatureCollection",\n  "features": [')
+        elif mode == 'compact':
+            self._file.write('{"type":"FeatureCollection","features":[')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _encode(self, feature):
+        if self.mode == 'pretty':
+            # A feature sits two levels deep in the collection
+            text = json.dumps(feature, indent=2, default=self.default)
+            return '\n' + '\n'.join('    ' + line for line in text.split('\n'))
+        return json.dumps(feature, separators=(',', ':'), default=self.default)
+
+    def write_features(self, lons, lats, properties):
+        """Write one feature per position; properties maps names to equally long sequences"""
+        names = list(properties)
+        separator = '\n' if self.mode == 'ndjson' else ','
+        parts = []
+        for lon, lat, *values in zip(lons, lats, *(properties[name] for name in names)):
+            feature = {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [lon, lat]
+                },
+                "properties": dict(zip(names, values))
+            }
+            encoded = self._encode(feature)
+            if self.mode == 'ndjson':
+                parts.append(encoded + separator)
+            else:
+                parts.append((separator if self.count else '') + encoded)
+            self.count += 1
+        self._file.write(''.join(parts))
+
+    def write_frame(self, df, lon_column='lon', lat_column='lat', property_columns=None, converters=None):
+        """
+        Write a DataFrame of points in batches. Properties default to every column except the
+        coordinates; converters maps a column to a per-value function (e.g. str for dates).
+        """
+        if property_columns is None:
+            property_columns = [c for c in df.columns if c not in [lon_column, lat_column]]
+        converters = converters or {}
+        for start in range(0, len(df), WRITE_BATCH):
+            batch = df.iloc[start:start + WRITE_BATCH]
+            properties = {}
+            for column in property_columns:
+                values = batch[column]
+                if column in converters:
+                    values = values.map(converters[column])
+                properties[column] = _python_values(values)
+            self.write_features(_python_values(batch[lon_column]), _python_values(batch[lat_column]), properties)
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.mode == 'pretty':
+            self._file.write('\n  ]\n}' if self.count else ']\n}')
+        elif self.mode == 'compact':
+            self._file.write(']}')
+        self._file.close()
+
+class CsvWriter:
+    """Append DataFrames to one CSV, writing the header once"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._header_written = False
+        self._file = open(path, 'w', newline='')
+
+    def write_frame(self, df):
+        df.to_csv(self._file, index=False, header=not self._header_written)
+        self._header_written = True
+        self.count += len(df)
+
+    def close(self):
+        self._file.close()
+
+class PointDatasetWriter:
+    """
+    Stream matching rows to a CSV and a GeoJSON side by side.
+    Both are written to temporary files and moved into place on close, so a failed
+    run never leaves half-written outputs behind.
+    """
+
+    def __init__(self, csv_path, geojson_path, mode='pretty', default=None, lon_column='lon', lat_column='lat'):
+        self.csv_path = csv_path
+        self.geojson_path = geojson_path
+        self.lon_column = lon_column
+        self.lat_column = lat_column
+        self._csv = CsvWriter(csv_path + '.tmp')
+        self._geojson = FeatureCollectionWriter(geojson_path + '.tmp', mode=mode, default=default)
+
+    @property
+    def count(self):
+        return self._csv.count
+
+    def write_frame(self, df):
+        self._csv.write_frame(df)
+        self._geojson.write_frame(df, lon_column=self.lon_column, lat_column=self.lat_column)
+
+    def close(self):
+        self._csv.close()
+        self._geojson.close()
+        os.replace(self._csv.path, self.csv_path)
+        os.replace(self._geojson.path, self.geojson_path)
+
+    def discard(self):
+        self._csv.close()
+        self._geojson.close()
+        for path in [self._csv.path, self._geojson.path]:
+            if os.path.exists(path):
+                os.remove(path)
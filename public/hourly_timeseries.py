@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Hourly 311 call volume per community center and per category around Beryl.
+
+Calls are binned on Created Date Local into an (entities x hours) count matrix
+with a single bincount over entity code x hour offset. From that matrix every
+view is a vectorized pass over the hour axis:
+
+  cumulative       running total since the start of the series
+  rolling_<n>h     trailing n-hour sum
+  lag_<n>h_change  count minus the count n hours earlier (168 = same hour last week)
+  baseline_excess  count minus the mean for the same hour of the week in a
+                   baseline period (June by default, before the storm)
+
+The CLI writes each view as a raw little-endian array (<group>.<view>.bin) next
+to a <group>.json manifest with the entity names, the first hour, the landfall
+hour and the dtype and shape of every array, so the animation can load them
+straight into typed arrays (e.g. new Uint16Array(buffer)).
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from analytics_cube import UNKNOWN, created_times, load_calls
+
+# Beryl made landfall near Matagorda around 4 a.m. local time
+LANDFALL = pd.Timestamp('2024-07-08 04:00')
+
+# Series and baseline periods, each [start, end)
+DEFAULT_SPAN = ('2024-06-01', '2024-09-01')
+DEFAULT_BASELINE = ('2024-06-01', '2024-07-01')
+
+HOUR_NS = 3600 * 10**9
+HOURS_PER_WEEK = 168
+
+OUTPUT_DIR = 'hourly_timeseries'
+
+# Entity column of every series group
+GROUP_COLUMNS = {
+    'center': 'nearest_center',
+    'category': 'Category',
+}
+
+def hour_offsets(times, start):
+    """Whole hours from start to every timestamp (-1 for NaT)"""
+    times = pd.DatetimeIndex(times).as_unit('ns')
+    offsets = (times.asi8 - pd.Timestamp(start).as_unit('ns').value) // HOUR_NS
+    return np.where(times.isna(), -1, offsets)
+
+def _count_dtype(maximum):
+    return np.uint8 if maximum <= 0xFF else np.uint16 if maximum <= 0xFFFF else np.uint32
+
+class HourlySeries:
+    """Calls per entity per hour, counts[entity, hour], starting at a whole hour"""
+
+    def __init__(self, counts, entities, start):
+        self.counts = np.asarray(counts)
+        self.entities = np.asarray(entities, dtype=object)
+        self.start = pd.Timestamp(start).floor('h')
+
+    @classmethod
+    def from_calls(cls, times, entities, start, end):
+        """Bin call timestamps in [start, end) per entity; missing entities are counted as UNKNOWN"""
+        start, end = pd.Timestamp(start).floor('h'), pd.Timestamp(end)
+        hours = int(-(-(end - start).value // HOUR_NS))
+        labels = pd.Series(entities, dtype=object)
+        labels = labels.where(labels.notna() & (labels.astype(str) != ''), UNKNOWN).astype(str)
+        names, codes = np.unique(labels.to_numpy(dtype=str), return_inverse=True)
+        offsets = hour_offsets(times, start)
+        inside = (offsets >= 0) & (offsets < hours)
+        counts = np.bincount(codes[inside] * hours + offsets[inside], minlength=len(names) * hours)
+        return cls(counts.reshape(len(names), hours), names, start)
+
+    @property
+    def hours(self):
+        return pd.date_range(self.start, periods=self.counts.shape[1], freq='h')
+
+    def hour_index(self, time):
+        """Column of the hour containing time (may fall outside the series)"""
+        return int(hour_offsets([pd.Timestamp(time)], self.start)[0])
+
+    def _columns(self, start, end):
+        """Columns of the hours in [start, end), clipped to the series"""
+        first = max(self.hour_index(start), 0)
+        last = min(self.hour_index(pd.Timestamp(end) - pd.Timedelta(1)) + 1, self.counts.shape[1])
+        return slice(first, max(first, last))
+
+    def cumulative(self):
+        return np.cumsum(self.counts, axis=1)
+
+    def rolling(self, window_hours):
+        """Trailing sum over the last window_hours hours (fewer at the start of the series)"""
+        if window_hours < 1:
+            raise ValueError(f"Rolling window must be at least 1 hour, got {window_hours}")
+        totals = self.cumulative()
+        rolling = totals.copy()
+        rolling[:, window_hours:] -= totals[:, :-window_hours]
+        return rolling
+
+    def lagged(self, lag_hours):
+        """Counts shifted later by lag_hours, zero where the lagged hour precedes the series"""
+        if lag_hours < 1:
+            raise ValueError(f"Lag must be at least 1 hour, got {lag_hours}")
+        lagged = np.zeros_like(self.counts)
+        if lag_hours >= self.counts.shape[1]:
+            return lagged
+        lagged[:, lag_hours:] = self.counts[:, :self.counts.shape[1] - lag_hours]
+        return lagged
+
+    def lag_change(self, lag_hours):
+        return self.counts.astype(np.int64) - self.lagged(lag_hours)
+
+    def hour_of_week(self):
+        """Hour of the week (0 = Monday 00:00) of every column"""
+        hours = self.hours
+        return hours.dayofweek.to_numpy() * 24 + hours.hour.to_numpy()
+
+    def baseline_profile(self, start, end):
+        """Mean calls per entity for each hour of the week over [start, end), shape (entities, 168)"""
+        columns = self._columns(start, end)
+        week_hours = self.hour_of_week()[columns]
+        entities = len(self.entities)
+        keys = np.arange(entities)[:, None] * HOURS_PER_WEEK + week_hours[None, :]
+        sums = np.bincount(keys.ravel(), weights=self.counts[:, columns].ravel(),
+                           minlength=entities * HOURS_PER_WEEK).reshape(entities, HOURS_PER_WEEK)
+        occurrences = np.bincount(week_hours, minlength=HOURS_PER_WEEK)
+        return np.divide(sums, occurrences, out=np.zeros_like(sums), where=occurrences > 0)
+
+    def baseline_excess(self, start, end):
+        """Counts minus the baseline mean of the same hour of the week"""
+        return self.counts - self.baseline_profile(start, end)[:, self.hour_of_week()]
+
+    def frame(self, values=None):
+        """A view (the counts by default) as a DataFrame with one column per entity"""
+        values = self.counts if values is None else values
+        return pd.DataFrame(values.T, index=self.hours, columns=self.entities)
+
+def animation_arrays(series, rolling_hours, lag_hours, baseline):
+    """Every view of a series as compactly typed arrays"""
+    cumulative = series.cumulative()
+    return {
+        'counts': series.counts.astype(_count_dtype(series.counts.max(initial=0))),
+        'cumulative': cumulative.astype(_count_dtype(cumulative.max(initial=0))),
+        f'rolling_{rolling_hours}h': series.rolling(rolling_hours).astype(np.uint32),
+        f'lag_{lag_hours}h_change': series.lag_change(lag_hours).astype(np.int32),
+        'baseline_excess': series.baseline_excess(*baseline).astype(np.float32),
+    }
+
+def write_animation_arrays(series, output_dir, group, rolling_hours=24, lag_hours=HOURS_PER_WEEK,
+                           baseline=DEFAULT_BASELINE):
+    """Write <group>.<view>.bin arrays and the <group>.json manifest describing them"""
+    os.makedirs(output_dir, exist_ok=True)
+    arrays = {}
+    for view, values in animation_arrays(series, rolling_hours, lag_hours, baseline).items():
+        filename = f'{group}.{view}.bin'
+        values.astype(values.dtype.newbyteorder('<')).tofile(os.path.join(output_dir, filename))
+        arrays[view] = {'file': filename, 'dtype': values.dtype.name, 'shape': list(values.shape)}
+    manifest = {
+        'start': series.start.isoformat(),
+        'step_hours': 1,
+        'hours': series.counts.shape[1],
+        'landfall_hour': series.hour_index(LANDFALL),
+        'baseline': list(baseline),
+        'entities': series.entities.tolist(),
+        'arrays': arrays,
+    }
+    with open(os.path.join(output_dir, f'{group}.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def storm_summary(series, baseline, hours_after=72):
+    """Calls in the hours after landfall against the baseline expectation, per entity"""
+    landfall = series.hour_index(LANDFALL)
+    window = slice(max(landfall, 0), max(landfall + hours_after, 0))
+    expected = series.baseline_profile(*baseline)[:, series.hour_of_week()][:, window].sum(axis=1)
+    counts, hours = series.counts[:, window], series.hours[window]
+    calls = counts.sum(axis=1)
+    summary = pd.DataFrame({
+        'calls': calls,
+        'expected': expected.round(1),
+        'ratio': np.divide(calls, expected, out=np.full(len(calls), np.nan), where=expected > 0).round(2),
+        'peak_hour': hours[counts.argmax(axis=1)] if len(hours) else pd.NaT,
+    }, index=pd.Index(series.entities, name=f'first {hours_after}h after landfall'))
+    return summary.sort_values('calls', ascending=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Hourly 311 call series per community center and category')
+    parser.add_argument('--span', nargs=2, metavar=('START', 'END'), default=list(DEFAULT_SPAN),
+                        help='Series period [START, END)')
+    parser.add_argument('--baseline', nargs=2, metavar=('START', 'END'), default=list(DEFAULT_BASELINE),
+                        help='Baseline period [START, END) for the hour-of-week profile')
+    parser.add_argument('--rolling-hours', type=int, default=24)
+    parser.add_argument('--lag-hours', type=int, default=HOURS_PER_WEEK)
+    parser.add_argument('--groups', nargs='+', choices=list(GROUP_COLUMNS), default=list(GROUP_COLUMNS))
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+    if args.rolling_hours < 1 or args.lag_hours < 1:
+        parser.error('--rolling-hours and --lag-hours must be at least 1')
+
+    calls = load_calls()
+    times = created_times(calls)
+    print(f"{times.notna().sum()} of {len(calls)} calls have a Created Date Local")
+    for group in args.groups:
+        column = GROUP_COLUMNS[group]
+        series = HourlySeries.from_calls(times, calls[column] if column in calls.columns else [None] * len(calls),
+                                         *args.span)
+        manifest = write_animation_arrays(series, args.output_dir, group, args.rolling_hours, args.lag_hours,
+                                          tuple(args.baseline))
+        print(f"\nSaved {len(series.entities)} {group} series x {manifest['hours']} hours to "
+              f"{os.path.join(args.output_dir, group + '.json')}")
+        print(storm_summary(series, tuple(args.baseline)).head(15).to_string())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+State store for incremental 311 ingestion.
+
+Each pipeline keeps a small SQLite table of the cases it has already processed,
+keyed by '365 Case Number' with the Extract Date and Status last seen and a hash
+of every column the pipeline reads (Title, Description, Latitude, Longitude,
+Status, ...). A row is reprocessed when its case is new or when that hash changed,
+e.g. a corrected location or an edited description; stale rows from older
+extracts are ignored. Cases recorded before the hash was stored are reprocessed
+once to record it.
+Updates are staged in a transaction and committed only after the outputs have
+been written, so a failed run leaves the previous state intact.
+"""
+
+import hashlib
+import os
+import sqlite3
+
+import pandas as pd
+
+CASE_COLUMN = '365 Case Number'
+EXTRACT_COLUMN = 'Extract Date'
+STATUS_COLUMN = 'Status'
+
+# Stay well below SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+def as_text(values):
+    """Values as text ('' when missing); integral floats lose their '.0' so case numbers compare cleanly"""
+    series = pd.Series(values)
+    if pd.api.types.is_float_dtype(series):
+        series = series.astype('Int64')
+    series = series.astype(object)
+    return series.where(series.notna(), '').astype(str).to_numpy()
+
+def extract_text(values):
+    """Extract Date as sortable 'YYYY-MM-DD HH:MM:SS' text ('' when missing)"""
+    parsed = pd.to_datetime(pd.Series(values), errors='coerce')
+    return parsed.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('').to_numpy()
+
+def _hash_text(values):
+    """Values as text for hashing; whole-number floats are written like integers, so text and Parquet reads agree"""
+    series = pd.Series(values)
+    if pd.api.types.is_float_dtype(series):
+        present = series.dropna()
+        if (present == present.round()).all():
+            return as_text(series)
+    series = series.astype(object)
+    return series.where(series.notna(), '').astype(str).to_numpy()
+
+def row_hashes(chunk, columns):
+    """SHA-1 of the given columns of every row"""
+    texts = [_hash_text(chunk[column]) for column in columns]
+    return [hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest() for values in zip(*texts)]
+
+class CaseStateStore:
+    """Processed case numbers with the Extract Date, Status and hash of the columns they were processed with"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cases ('
+            'case_number TEXT PRIMARY KEY, extract_date TEXT NOT NULL, status TEXT NOT NULL, row_hash TEXT)'
+        )
+        # Stores written before row hashes were kept
+        if 'row_hash' not in [row[1] for row in self.conn.execute('PRAGMA table_info(cases)')]:
+            self.conn.execute('ALTER TABLE cases ADD COLUMN row_hash TEXT')
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM cases').fetchone()[0]
+
+    def _lookup(self, case_numbers):
+        known = {}
+        unique = list(dict.fromkeys(case_numbers))
+        for start in range(0, len(unique), LOOKUP_BATCH):
+            batch = unique[start:start + LOOKUP_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            for case_number, extract_date, row_hash in self.conn.execute(
+                    f'SELECT case_number, extract_date, row_hash FROM cases WHERE case_number IN ({placeholders})', batch):
+                known[case_number] = (extract_date, row_hash)
+        return known
+
+    def stage_chunk(self, chunk):
+        """
+        Return the rows of chunk that are new or changed and stage their state.
+        Every column of chunk except the Extract Date is hashed, so a change to any
+        column the pipeline read counts. Nothing is written to disk until commit().
+        """
+        case_numbers = as_text(chunk[CASE_COLUMN])
+        extract_dates = extract_text(chunk[EXTRACT_COLUMN])
+        statuses = as_text(chunk[STATUS_COLUMN])
+        hashes = row_hashes(chunk, [column for column in chunk.columns if column != EXTRACT_COLUMN])
+
+        known = self._lookup(case_numbers)
+        changed = []
+        for case_number, extract_date, row_hash in zip(case_numbers, extract_dates, hashes):
+            previous = known.get(case_number)
+            changed.append(previous is None or (extract_date >= previous[0] and row_hash != previous[1]))
+
+        rows = [row for row, is_changed in zip(zip(case_numbers, extract_dates, statuses, hashes), changed)
+                if is_changed]
+        self.conn.executemany(
+            'INSERT INTO cases (case_number, extract_date, status, row_hash) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(case_number) DO UPDATE SET extract_date = excluded.extract_date, status = excluded.status, '
+            'row_hash = excluded.row_hash',
+            rows
+        )
+        return chunk[changed]
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+def incremental_chunks(chunks, store, changed_ids):
+    """Yield only new or changed rows of each chunk, collecting their case numbers into changed_ids"""
+    for chunk in chunks:
+        changed = store.stage_chunk(chunk)
+        changed_ids.update(as_text(changed[CASE_COLUMN]))
+        if not changed.empty:
+            yield changed
+
+def existing_rows_to_keep(csv_path, changed_ids, key='request_id'):
+    """Rows of an existing output CSV whose case did not change (None when there is no output yet)"""
+    if not os.path.exists(csv_path):
+        return None
+    existing = pd.read_csv(csv_path, float_precision='round_trip')
+    return existing[~pd.Series(as_text(existing[key]), index=existing.index).isin(changed_ids)]
+
+def merge_with_existing(csv_path, new_rows, changed_ids, key='request_id'):
+    """
+    Replace the rows of an existing output CSV whose case changed with freshly matched rows.
+    Cases that changed but no longer match simply drop out.
+    """
+    kept = existing_rows_to_keep(csv_path, changed_ids, key)
+    if kept is None:
+        return new_rows
+    if new_rows is None or new_rows.empty:
+        return kept
+    return pd.concat([kept, new_rows], ignore_index=True)
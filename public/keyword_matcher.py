@@ -0,0 +1,56 @@
+"""
+Multi-pattern keyword matching over whole text columns.
+
+Each category of keywords is compiled once into a single alternation regex of
+escaped literals, so a regex search is exactly equivalent to the original
+`any(keyword in text for keyword in keywords)` substring checks. Matching a
+column returns one bitmask per row with a bit set for every category that hit.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+def normalize_text(values):
+    """Lowercase a column the way the scalar filters did: str(value).lower()"""
+    return pd.Series(values).map(str).str.lower()
+
+class KeywordMatcher:
+    """Compiled keyword categories applied to whole columns at once"""
+
+    def __init__(self, categories):
+        # categories: {name: [keyword, ...]} in bit order
+        self.bits = {}
+        self.patterns = {}
+        for bit, (name, keywords) in enumerate(categories.items()):
+            self.bits[name] = np.uint64(1 << bit)
+            self.patterns[name] = re.compile('|'.join(re.escape(k) for k in sorted(set(keywords))))
+
+    def mask(self, *names):
+        """Combined bit value for one or more categories"""
+        value = np.uint64(0)
+        for name in names:
+            value |= self.bits[name]
+        return value
+
+    def match(self, texts):
+        """Bitmask per row of already-normalized text"""
+        texts = pd.Series(texts)
+        result = np.zeros(len(texts), dtype=np.uint64)
+        for name, pattern in self.patterns.items():
+            hits = texts.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+            result[hits] |= self.bits[name]
+        return result
+
+    def match_any(self, *columns):
+        """Bitmask per row across several text columns (a hit in any column counts)"""
+        result = None
+        for column in columns:
+            bits = self.match(normalize_text(column))
+            result = bits if result is None else result | bits
+        return result
+
+def has_any(bitmask, mask):
+    """Rows where any bit of mask is set"""
+    return (bitmask & mask) != 0
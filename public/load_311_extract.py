@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Typed, column-selective reader for raw pipe-delimited 311 extracts.
+
+Each stage passes the columns it needs and only those are parsed, so the large
+free-text columns (Latest Case Notes, Resolution Notes, Sample Case Confilcts
+Notes) are never materialized unless asked for. Low-cardinality fields are
+stored as categoricals and the date columns are parsed with an explicit format
+instead of per-value format inference.
+
+Categories are chosen per chunk, so concatenating chunks may fall back to object
+columns; cast explicitly when a stage needs one dtype across chunks.
+"""
+
+import argparse
+
+import pandas as pd
+
+from convert_311_to_parquet import COLUMN_NAMES, DATETIME_COLUMNS, HEADER_ROWS
+
+CATEGORICAL_COLUMNS = ['Status', 'Department', 'Incident Case Type', 'Council District', 'Zip Code']
+
+# Format of every timestamp in the extract, e.g. 2024-07-08 09:15:00
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def parse_extract_dates(values):
+    """Parse with DATE_FORMAT; values in any other format fall back to inference, the rest become NaT"""
+    parsed = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        parsed[failed] = pd.to_datetime(values[failed], format='mixed', errors='coerce')
+    return parsed
+
+def chunk_memory_mb(chunk):
+    """Deep memory usage of a chunk in megabytes"""
+    return chunk.memory_usage(deep=True).sum() / 1024 ** 2
+
+def _type_chunk(chunk):
+    for column in DATETIME_COLUMNS:
+        if column in chunk.columns:
+            chunk[column] = parse_extract_dates(chunk[column])
+    return chunk
+
+def read_311_extract(input_file, columns=None, chunk_size=10000, delimiter='|', header_in_file=False,
+                     report_memory=False):
+    """
+    Yield typed DataFrame chunks holding only the requested columns (all columns when None).
+
+    By default the extract's six metadata lines are skipped and the fixed COLUMN_NAMES are used;
+    with header_in_file=True the column names are read from the line after the first five.
+    Requested columns that the file doesn't have are left out rather than raising.
+    """
+    wanted = set(columns or COLUMN_NAMES)
+    dtype = {column: 'category' for column in CATEGORICAL_COLUMNS if column in wanted}
+    if header_in_file:
+        options = dict(skiprows=HEADER_ROWS - 1)
+    else:
+        options = dict(skiprows=HEADER_ROWS, header=None, names=COLUMN_NAMES)
+
+    reader = pd.read_csv(input_file, delimiter=delimiter, chunksize=chunk_size, usecols=lambda c: c in wanted,
+                         dtype=dtype, low_memory=False, on_bad_lines='skip', **options)
+    for chunk_num, chunk in enumerate(reader):
+        chunk = _type_chunk(chunk)
+        if report_memory:
+            print(f"Chunk {chunk_num + 1}: {len(chunk)} rows, {len(chunk.columns)} columns, "
+                  f"{chunk_memory_mb(chunk):.1f} MB")
+        yield chunk
+
+def compare_memory(input_file, columns, chunk_size=10000, chunks=5):
+    """Print per-chunk memory of an untyped all-column read next to the typed read of columns"""
+    untyped = pd.read_csv(input_file, delimiter='|', chunksize=chunk_size, low_memory=False, skiprows=HEADER_ROWS,
+                          header=None, names=COLUMN_NAMES, on_bad_lines='skip')
+    typed = read_311_extract(input_file, columns, chunk_size)
+    print(f"{'chunk':>5}  {'all columns':>12}  {'typed':>8}  {'ratio':>6}")
+    for chunk_num, (full, lean) in enumerate(zip(untyped, typed)):
+        if chunk_num >= chunks:
+            break
+        full_mb = chunk_memory_mb(full)
+        lean_mb = chunk_memory_mb(lean)
+        print(f"{chunk_num + 1:>5}  {full_mb:>9.1f} MB  {lean_mb:>5.1f} MB  {full_mb / lean_mb:>5.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-chunk memory of the typed 311 reader with a full read')
+    parser.add_argument('input_file', help='Path to the raw 311 extract (e.g. public/311.txt)')
+    parser.add_argument('--columns', nargs='+',
+                        default=['365 Case Number', 'Title', 'Description', 'Created Date Local', 'Status',
+                                 'Latitude', 'Longitude'])
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--chunks', type=int, default=5, help='Number of chunks to compare (default: 5)')
+    args = parser.parse_args()
+
+    compare_memory(args.input_file, args.columns, args.chunk_size, args.chunks)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Vulnerability index at several resolutions from one block-group pass.
+
+Every factor is computed once for the 2010 census block groups
+(houston-census-blocks.geojson, from convert_shapefiles_to_geojson) and kept in
+additive form: areas, counts and sums, plus income x area so means can be
+rebuilt. Coarser geographies are rollups of those arrays:
+
+  tract               block groups grouped by the first 11 digits of their GEOID
+  super_neighborhood  block groups apportioned by equal-area overlap share
+  zip                 the same, for the ZIP code polygons
+
+Apportioned counts are rounded to whole calls, centers and churches. Each level
+is scored with the baseline composite of vulnerability_scenarios and written to
+vulnerability-index-<level>.geojson, so the map can switch resolution without
+another geometric run. Block-group factors and overlap matrices are cached (see
+factor_cache and areal_weights).
+"""
+
+import argparse
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+
+from areal_weights import EQUAL_AREA_CRS, ArealWeights
+from calculate_vulnerability_index import (CALLS_FILE, CENTERS_FILE, CHURCHES_FILE, FACTOR_CACHE, INCOME_FILE,
+                                           NEIGHBORHOODS_FILE, WEIGHTS_CACHE, flood_source_path, join_pairs, load_calls,
+                                           positive_totals)
+from factor_cache import FactorCache
+from geography_ids import (BLOCK_GROUP_ID_COLUMNS, NEIGHBORHOOD_ID_COLUMNS, TRACT_GEOID_LENGTH, ZIP_ID_COLUMNS,
+                           first_column, layer_ids)
+from polygon_export import export_polygons
+from spatial_enrichment import data_path
+from vulnerability_scenarios import FACTOR_NAMES, factor_scores, scenario_parameters
+
+# In the data directory (public/) like the inputs of calculate_vulnerability_index
+BLOCK_GROUPS_FILE = data_path('houston-census-blocks.geojson')
+ZIP_CODES_FILE = data_path('data_bundles/houston_small_files/COH_ZIPCODES.geojson')
+
+LEVELS = ['block_group', 'tract', 'super_neighborhood', 'zip']
+
+COUNT_COLUMNS = ['call_count', 'center_count', 'church_count']
+
+def output_path(level):
+    return data_path(f'vulnerability-index-{level}.geojson')
+
+def block_group_factors(block_groups, flood_source, cache):
+    """Additive factors of every block group, each cached on the content hash of its inputs"""
+    count = len(block_groups)
+
+    def compute_area():
+        return {'area_m2': shapely.area(np.asarray(block_groups.geometry.to_crs(EQUAL_AREA_CRS)))}
+
+    def compute_calls():
+        calls = load_calls()
+        if calls.empty:
+            return {'call_count': np.zeros(count, dtype=np.int64)}
+        _, groups = join_pairs(calls.to_crs(block_groups.crs), block_groups, 'within')
+        return {'call_count': np.bincount(groups, minlength=count)}
+
+    def compute_income():
+        tracts = gpd.read_file(INCOME_FILE).to_crs(block_groups.crs)
+        weights = ArealWeights.load_or_compute(BLOCK_GROUPS_FILE, INCOME_FILE, block_groups, tracts,
+                                               cache_dir=WEIGHTS_CACHE)
+        if 'median_income_2022' in tracts.columns:
+            incomes = tracts['median_income_2022'].to_numpy(dtype=float)
+        else:
+            incomes = np.zeros(len(tracts))
+        return {'income_area': weights.matrix @ incomes, 'income_covered_area': weights.covered_area()}
+
+    def compute_flood():
+        return {'flood_area_m2': ArealWeights.load_or_compute(BLOCK_GROUPS_FILE, flood_source, block_groups,
+                                                              cache_dir=WEIGHTS_CACHE)
+                .covered_area()}
+
+    def compute_points(path, column, count_name, total_name):
+        def compute():
+            points = gpd.read_file(path).to_crs(block_groups.crs)
+            point_ids, groups = join_pairs(points, block_groups, 'within')
+            return {count_name: np.bincount(groups, minlength=count),
+                    total_name: np.asarray(positive_totals(points, column, point_ids, groups, count), dtype=float)}
+        return compute
+
+    factors = {}
+    for name, inputs, compute in [
+        ('block_group_area', [BLOCK_GROUPS_FILE], compute_area),
+        ('block_group_calls', [BLOCK_GROUPS_FILE, CALLS_FILE], compute_calls),
+        ('block_group_income', [BLOCK_GROUPS_FILE, INCOME_FILE], compute_income),
+        ('block_group_flood', [BLOCK_GROUPS_FILE, flood_source], compute_flood),
+        ('block_group_centers', [BLOCK_GROUPS_FILE, CENTERS_FILE],
+         compute_points(CENTERS_FILE, 'Square_Foo', 'center_count', 'total_square_footage')),
+        ('block_group_churches', [BLOCK_GROUPS_FILE, CHURCHES_FILE],
+         compute_points(CHURCHES_FILE, 'area_sq_ft', 'church_count', 'total_church_area')),
+    ]:
+        factors.update(cache.get_or_compute(name, inputs, compute))
+    return pd.DataFrame(factors)
+
+def membership_matrix(coarse_ids, fine_count):
+    """(coarse x fine) 0/1 matrix assigning every fine unit to one coarse unit, and the coarse ids"""
+    ids, groups = np.unique(coarse_ids, return_inverse=True)
+    return sparse.csr_matrix((np.ones(fine_count), (groups, np.arange(fine_count))), shape=(len(ids), fine_count)), ids
+
+def share_matrix(coarse_path, coarse, fine, fine_areas):
+    """(coarse x fine) share of every fine unit's area inside each coarse unit, from cached areal weights"""
+    weights = ArealWeights.load_or_compute(coarse_path, BLOCK_GROUPS_FILE, coarse, fine, cache_dir=WEIGHTS_CACHE)
+    inverse_areas = np.divide(1.0, fine_areas, out=np.zeros(len(fine_areas)), where=fine_areas > 0)
+    return weights.matrix @ sparse.diags(inverse_areas)
+
+def rollup(fine_factors, matrix):
+    """Coarse additive factors as matrix @ fine factors; apportioned counts are rounded"""
+    coarse = pd.DataFrame({column: matrix @ fine_factors[column].to_numpy(dtype=float)
+                           for column in fine_factors.columns})
+    for column in COUNT_COLUMNS:
+        coarse[column] = np.rint(coarse[column]).astype(int)
+    return coarse
+
+def score_table(ids, additive):
+    """Factor table in the FACTORS_FILE layout, scored with the baseline composite"""
+    factors = pd.DataFrame({
+        'neighborhood_name': ids,
+        'call_count': additive['call_count'].astype(int),
+        'avg_median_income': np.divide(additive['income_area'], additive['income_covered_area'],
+                                       out=np.zeros(len(additive)), where=additive['income_covered_area'] > 0),
+        'flood_percentage': np.divide(additive['flood_area_m2'] * 100, additive['area_m2'],
+                                      out=np.zeros(len(additive)), where=additive['area_m2'] > 0),
+        'has_community_center': additive['center_count'] > 0,
+        'total_square_footage': additive['total_square_footage'],
+        'church_count': additive['church_count'].astype(int),
+        'total_church_area': additive['total_church_area'],
+    })
+    parameters = scenario_parameters(1)
+    scores = factor_scores(factors, parameters)[:, 0, :]
+    for name, values in zip(FACTOR_NAMES, scores):
+        factors[name] = values
+    factors['vulnerability_index'] = parameters['weights'][0] @ scores
+    return factors
+
+def save_level(level, table, geometry):
+    """Write one resolution as GeoJSON in EPSG:4326, with simplified levels of detail"""
+    path = output_path(level)
+    properties = table.rename(columns={'neighborhood_name': 'id'}).to_dict('records')
+    print(f"Saving {path} ({len(table)} features, mean index {table['vulnerability_index'].mean():.3f})")
+    export_polygons(path, geometry, properties)
+
+def multi_resolution_vulnerability(levels=LEVELS):
+    """Compute block-group factors once and write the index for every requested level"""
+    block_groups = gpd.read_file(BLOCK_GROUPS_FILE).to_crs('EPSG:4326')
+    print(f"Loaded {len(block_groups)} block groups")
+    block_group_ids = layer_ids(block_groups, BLOCK_GROUP_ID_COLUMNS, 'block_group')
+
+    cache = FactorCache(FACTOR_CACHE)
+    fine = block_group_factors(block_groups, flood_source_path(), cache)
+    cache.report()
+
+    if 'block_group' in levels:
+        save_level('block_group', score_table(block_group_ids, fine), block_groups.geometry)
+
+    if 'tract' in levels:
+        if first_column(block_groups, BLOCK_GROUP_ID_COLUMNS) is None:
+            print("Block groups have no GEOID column, skipping tracts")
+        else:
+            tract_geoids = np.array([geoid[:TRACT_GEOID_LENGTH] for geoid in block_group_ids], dtype=object)
+            matrix, tract_ids = membership_matrix(tract_geoids, len(block_groups))
+            tract_geometry = block_groups.geometry.groupby(tract_geoids).agg(shapely.union_all)
+            save_level('tract', score_table(tract_ids, rollup(fine, matrix)),
+                       gpd.GeoSeries(tract_geometry.loc[tract_ids].to_numpy(), crs=block_groups.crs))
+
+    for level, path, id_columns in [('super_neighborhood', NEIGHBORHOODS_FILE, NEIGHBORHOOD_ID_COLUMNS),
+                                    ('zip', ZIP_CODES_FILE, ZIP_ID_COLUMNS)]:
+        if level not in levels:
+            continue
+        if not os.path.exists(path):
+            print(f"{path} not found, skipping {level}")
+            continue
+        coarse = gpd.read_file(path).to_crs('EPSG:4326')
+        matrix = share_matrix(path, coarse, block_groups, fine['area_m2'].to_numpy())
+        ids = layer_ids(coarse, id_columns, 'Neighborhood' if level == 'super_neighborhood' else level)
+        save_level(level, score_table(ids, rollup(fine, matrix)), coarse.geometry)
+
+def main():
+    parser = argparse.ArgumentParser(description='Vulnerability index for block groups, tracts, super neighborhoods and ZIPs')
+    parser.add_argument('--levels', nargs='+', choices=LEVELS, default=LEVELS)
+    args = parser.parse_args()
+
+    multi_resolution_vulnerability(args.levels)
+
+if __name__ == '__main__':
+    main()
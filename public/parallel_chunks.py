@@ -0,0 +1,43 @@
+"""
+Run per-chunk 311 work on a process pool while keeping results in chunk order.
+
+The parent process keeps reading chunks and hands them to worker processes.
+Shared read-only state (community center index, date windows, ...) is sent to
+each worker once through the pool initializer instead of with every chunk, and
+results are yielded strictly in submission order so merged output matches a
+serial run exactly.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Per-process context installed by the pool initializer
+_context = ()
+
+def _set_context(context):
+    global _context
+    _context = context
+
+def _run(worker, chunk):
+    return worker(chunk, *_context)
+
+def map_chunks(worker, chunks, workers=1, context=()):
+    """Yield worker(chunk, *context) for every chunk, in chunk order
+
+    worker must be a module-level function so it can be sent to the pool.
+    With workers <= 1 everything runs in the current process.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield worker(chunk, *context)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_set_context, initargs=(context,)) as executor:
+        # Bound the chunks in flight so the reader can't run ahead of the workers
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_run, worker, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
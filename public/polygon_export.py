@@ -0,0 +1,125 @@
+"""
+Polygon GeoJSON export with simplified levels of detail.
+
+Features keep their full Polygon / MultiPolygon structure, holes included. Next
+to the full-fidelity file, every LOD is written as its own compact GeoJSON:
+the polygons are simplified together as a coverage in the equal-area CRS (so
+neighbors keep sharing the same simplified border, with no gaps or slivers) and
+coordinates are quantized to a fixed number of decimals. A small manifest maps
+zoom ranges to files; the map loads the file of the current zoom from it.
+
+Missing property values (NaN) are written as null. json.dump would otherwise
+write a bare NaN, which is not valid JSON and makes the browser's JSON parser
+reject the whole file.
+
+Layers that are not a clean coverage (overlapping polygons) fall back to
+simplifying each polygon on its own with topology preserved.
+"""
+
+import json
+import math
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from areal_weights import EQUAL_AREA_CRS
+
+# (name, min zoom, max zoom, simplification tolerance in meters, coordinate decimals)
+DEFAULT_LODS = [
+    ('z0-9', 0, 9, 150, 4),
+    ('z10-12', 10, 12, 30, 5),
+]
+
+# Zooms above the last LOD use the full-fidelity file
+MAX_ZOOM = 22
+
+def _round_coords(coords, decimals):
+    if decimals is None:
+        return [list(point) for point in coords]
+    return [[round(value, decimals) for value in point] for point in coords]
+
+def _polygon_rings(polygon, decimals):
+    return [_round_coords(polygon.exterior.coords, decimals)] + \
+           [_round_coords(ring.coords, decimals) for ring in polygon.interiors]
+
+def geometry_to_geojson(geometry, decimals=None):
+    """GeoJSON geometry dict of a Polygon or MultiPolygon, holes included, coordinates rounded to decimals"""
+    if geometry is None or geometry.is_empty:
+        return None
+    if geometry.geom_type == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': _polygon_rings(geometry, decimals)}
+    polygons = [part for part in getattr(geometry, 'geoms', []) if part.geom_type == 'Polygon']
+    if geometry.geom_type == 'MultiPolygon' or polygons:
+        return {'type': 'MultiPolygon', 'coordinates': [_polygon_rings(part, decimals) for part in polygons]}
+    raise ValueError(f"Unsupported geometry type: {geometry.geom_type}")
+
+def _json_value(value):
+    """Plain Python value for JSON (NumPy scalars unwrapped, NaN as null)"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def write_feature_collection(path, geometries, properties, decimals=None, compact=False):
+    """Write polygons and their property dicts as a FeatureCollection"""
+    features = []
+    for geometry, feature_properties in zip(geometries, properties):
+        features.append({
+            'type': 'Feature',
+            'geometry': geometry_to_geojson(geometry, decimals),
+            'properties': {name: _json_value(value) for name, value in feature_properties.items()}
+        })
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        if compact:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f, separators=(',', ':'))
+        else:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f)
+    os.replace(temp_path, path)
+
+def simplify_polygons(geometries, tolerance):
+    """Simplify polygons (in a metric CRS) as a coverage when they form one, else one by one"""
+    geometries = np.asarray(geometries, dtype=object)
+    if shapely.coverage_is_valid(geometries):
+        simplified = shapely.coverage_simplify(geometries, tolerance)
+    else:
+        simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    # Keep the original where simplification would drop a polygon entirely
+    dropped = shapely.is_empty(simplified) | ~shapely.is_valid(simplified)
+    simplified[dropped] = shapely.make_valid(simplified[dropped])
+    simplified[shapely.is_empty(simplified)] = geometries[shapely.is_empty(simplified)]
+    return simplified
+
+def lod_path(path, lod_name):
+    """File of one LOD next to the full-fidelity file, e.g. index.z0-9.geojson"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.{lod_name}{extension}"
+
+def export_polygons(path, geoseries, properties, lods=DEFAULT_LODS):
+    """
+    Write the full-fidelity FeatureCollection to path, one simplified and quantized file per LOD,
+    and <path without extension>.lods.json listing the file for every zoom range.
+    geoseries is a GeoSeries with a CRS; properties is a list of dicts, one per feature.
+    """
+    geoseries = geoseries.to_crs('EPSG:4326')
+    write_feature_collection(path, np.asarray(geoseries), properties)
+    manifest = []
+    projected = np.asarray(geoseries.to_crs(EQUAL_AREA_CRS))
+    full_size = os.path.getsize(path)
+    for name, min_zoom, max_zoom, tolerance, decimals in lods:
+        simplified = gpd.GeoSeries(simplify_polygons(projected, tolerance), crs=EQUAL_AREA_CRS)
+        level_path = lod_path(path, name)
+        write_feature_collection(level_path, np.asarray(simplified.to_crs('EPSG:4326')), properties, decimals,
+                                 compact=True)
+        size = os.path.getsize(level_path)
+        print(f"  {level_path}: zoom {min_zoom}-{max_zoom}, {size / 1024:,.0f} KB "
+              f"({size / full_size:.0%} of full)")
+        manifest.append({'file': os.path.basename(level_path), 'min_zoom': min_zoom, 'max_zoom': max_zoom})
+    last_zoom = max((lod[2] for lod in lods), default=-1)
+    manifest.append({'file': os.path.basename(path), 'min_zoom': last_zoom + 1, 'max_zoom': MAX_ZOOM})
+    with open(os.path.splitext(path)[0] + '.lods.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
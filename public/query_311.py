@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Embedded SQL over the 311 outputs, with DuckDB.
+
+Ad-hoc questions become one SQL statement instead of another copy of a
+count_debris_calls-style script. DuckDB runs in process and scans the CSV and
+Parquet files (and registered DataFrames) column by column, so queries are
+vectorized and nothing is loaded into a database first. Views:
+
+  calls          classified calls (classify_311_categories outputs, one row per call
+                 with category, nearby_center, distance_meters and, with --enrich,
+                 super_neighborhood, block_group, tract, zip_code and flood_zone).
+                 Runs over overlapping date ranges are deduplicated on request_id
+                 (the newest file wins), --range restricts them to one run, and
+                 CSVs with another schema (count_debris_calls) are left out
+  raw_calls      the converted Parquet dataset of the raw extract (convert_311_to_parquet)
+  centers        community centers: name, lon, lat and their other properties
+  neighborhoods  Super Neighborhoods: properties, centroid lon/lat and the polygon as WKT (geometry)
+  vulnerability  super-neighborhood vulnerability index and factors
+  vulnerability_<level>  the multi_resolution_vulnerability outputs that exist
+
+Views whose files are missing are skipped. Sources are found in the data
+directory (public/) whichever directory it runs from, e.g.
+
+  python public/query_311.py "SELECT status, count(*) AS calls FROM calls
+      WHERE category = 'storm_debris' AND distance_meters <= 1609.34
+      AND created_date >= '2024-07-08' AND created_date < '2024-07-15'
+      GROUP BY status ORDER BY calls DESC"
+
+Results print as a table, or are written to CSV or GeoJSON (points from lon/lat
+columns, polygons from a WKT geometry column).
+"""
+
+import argparse
+import csv
+import glob
+import os
+
+import duckdb
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from convert_311_to_parquet import parquet_dataset_path
+from geojson_writer import GEOJSON_MODES, FeatureCollectionWriter
+from multi_resolution_vulnerability import LEVELS, output_path
+from polygon_export import write_feature_collection
+from spatial_enrichment import DATA_DIR, DEFAULT_CENTERS, DEFAULT_LAYERS, data_path
+
+# Sources relative to the data directory
+CALLS_GLOB = '*_calls_*.csv'
+# Columns every classify_311_categories output has
+CALLS_COLUMNS = ['request_id', 'created_date', 'distance_meters', 'nearby_center', 'category']
+RAW_EXTRACT = '311.txt'
+VULNERABILITY_FILE = 'super-neighborhoods-vulnerability-index.geojson'
+
+def _sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _csv_columns(path):
+    with open(path, 'r', newline='') as f:
+        return next(csv.reader(f), [])
+
+def calls_files(pattern, date_range=None):
+    """
+    Classified call CSVs matching pattern, oldest first; with date_range (start, end) only the run
+    over exactly that range. Files without the classify_311_categories columns are skipped.
+    """
+    files = []
+    for path in sorted(glob.glob(pattern), key=os.path.getmtime):
+        if date_range and not path.endswith(f'_calls_{date_range[0]}_to_{date_range[1]}.csv'):
+            continue
+        missing = [column for column in CALLS_COLUMNS if column not in _csv_columns(path)]
+        if missing:
+            print(f"Skipping {path}: not a classified calls file (no {', '.join(missing)})")
+            continue
+        files.append(path)
+    return files
+
+def layer_frame(path, geometry='wkt'):
+    """
+    Properties of a GeoJSON layer as a DataFrame. geometry='points' adds lon/lat,
+    'wkt' adds the centroid lon/lat and the geometry as WKT, None drops it.
+    """
+    layer = gpd.read_file(path).to_crs('EPSG:4326')
+    frame = pd.DataFrame(layer.drop(columns=layer.geometry.name))
+    geometries = np.asarray(layer.geometry)
+    if geometry == 'points':
+        frame['lon'], frame['lat'] = shapely.get_x(geometries), shapely.get_y(geometries)
+    elif geometry == 'wkt':
+        centroids = shapely.centroid(geometries)
+        frame['lon'], frame['lat'] = shapely.get_x(centroids), shapely.get_y(centroids)
+        frame['geometry'] = shapely.to_wkt(geometries)
+    return frame
+
+class Query311:
+    """DuckDB connection with the 311 views registered"""
+
+    def __init__(self, data_dir=DATA_DIR, database=':memory:'):
+        self.data_dir = data_dir
+        self.conn = duckdb.connect(database)
+        self.views = {}
+
+    def path(self, relative):
+        return data_path(relative, self.data_dir)
+
+    def register_files(self, name, relation_sql, description):
+        """Register a view over a DuckDB table function (read_csv, read_parquet, ...)"""
+        self.conn.execute(f'CREATE OR REPLACE VIEW "{name}" AS SELECT * FROM {relation_sql}')
+        self.views[name] = description
+
+    def register_frame(self, name, frame, description):
+        """Register a DataFrame as a view; DuckDB scans its columns in place"""
+        self.conn.register(name, frame)
+        self.views[name] = description
+
+    def register_defaults(self, calls_glob=CALLS_GLOB, raw_extract=RAW_EXTRACT, date_range=None):
+        """Register every default view whose source exists; date_range limits calls to one classify run"""
+        files = calls_files(self.path(calls_glob), date_range)
+        if files:
+            file_list = '[' + ', '.join(_sql_string(path) for path in files) + ']'
+            # One row per request_id: overlapping runs repeat calls, and the newest file has the latest rules.
+            # Calls without a case number can't be matched across runs, so every one of them is kept
+            self.register_files('calls', f"read_csv({file_list}, union_by_name = true, filename = true) "
+                                         f"QUALIFY request_id IS NULL OR row_number() OVER (PARTITION BY request_id "
+                                         f"ORDER BY list_position({file_list}, filename) DESC) = 1",
+                                f"{len(files)} classified call files")
+
+        dataset_dir = parquet_dataset_path(self.path(raw_extract))
+        if os.path.isdir(dataset_dir):
+            self.register_files('raw_calls', f"read_parquet({_sql_string(os.path.join(dataset_dir, '**', '*.parquet'))}, "
+                                             f"hive_partitioning = true)", dataset_dir)
+
+        for name, path, geometry in [('centers', DEFAULT_CENTERS, 'points'),
+                                     ('neighborhoods', DEFAULT_LAYERS['super_neighborhood'], 'wkt'),
+                                     ('vulnerability', VULNERABILITY_FILE, None)]:
+            if os.path.exists(self.path(path)):
+                self.register_frame(name, layer_frame(self.path(path), geometry), path)
+
+        for level in LEVELS:
+            path = output_path(level)
+            if os.path.exists(self.path(path)):
+                self.register_frame(f'vulnerability_{level}', layer_frame(self.path(path), None), path)
+        return self
+
+    def query(self, sql, parameters=None):
+        """Result of a SQL statement as a DataFrame"""
+        return self.conn.execute(sql, parameters).df()
+
+    def describe(self):
+        """Columns of every registered view"""
+        return {name: self.query(f'DESCRIBE "{name}"')[['column_name', 'column_type']]
+                for name in self.views}
+
+    def close(self):
+        self.conn.close()
+
+def _json_frame(frame):
+    """Copy with NaN/NaT as None and timestamps as text, ready for json"""
+    frame = frame.copy()
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return frame.astype(object).where(frame.notna(), None)
+
+def write_geojson(frame, path, mode='pretty', lon_column='lon', lat_column='lat', geometry_column='geometry'):
+    """
+    Write a query result as GeoJSON: polygons (or any shape) from a WKT geometry column when
+    there is one, otherwise points from the lon/lat columns
+    """
+    if geometry_column in frame.columns:
+        if mode == 'ndjson':
+            raise ValueError("GeoJSON from a WKT geometry column can be written 'pretty' or 'compact', not 'ndjson'")
+        properties = _json_frame(frame.drop(columns=[geometry_column])).to_dict('records')
+        write_feature_collection(path, shapely.from_wkt(frame[geometry_column].to_numpy()), properties,
+                                 compact=mode != 'pretty')
+        return len(frame)
+    if lon_column not in frame.columns or lat_column not in frame.columns:
+        raise ValueError(f"Result needs a '{geometry_column}' column or '{lon_column}'/'{lat_column}' columns")
+    with FeatureCollectionWriter(path, mode, default=str) as writer:
+        writer.write_frame(_json_frame(frame), lon_column, lat_column)
+    return writer.count
+
+def main():
+    parser = argparse.ArgumentParser(description='Run SQL over the 311 calls, centers, neighborhoods and vulnerability')
+    parser.add_argument('sql', nargs='?', help='SQL statement, or @file.sql (omit to list the views)')
+    parser.add_argument('--csv', help='Write the result to this CSV')
+    parser.add_argument('--geojson', help='Write the result to this GeoJSON')
+    parser.add_argument('--geojson-format', choices=GEOJSON_MODES, default='pretty')
+    parser.add_argument('--calls', default=CALLS_GLOB, help=f'Classified call CSVs (default: {CALLS_GLOB})')
+    parser.add_argument('--range', nargs=2, metavar=('START', 'END'),
+                        help='Only the calls of the classify run over START to END (YYYY-MM-DD)')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Directory the sources are read from (default: public/)')
+    args = parser.parse_args()
+
+    layer = Query311(args.data_dir).register_defaults(args.calls, date_range=args.range)
+    try:
+        if not args.sql:
+            for name, columns in layer.describe().items():
+                print(f"{name} ({layer.views[name]}):")
+                print('  ' + ', '.join(f"{row.column_name} {row.column_type}" for row in columns.itertuples()))
+            return
+
+        sql = args.sql
+        if sql.startswith('@'):
+            with open(sql[1:], 'r') as f:
+                sql = f.read()
+        result = layer.query(sql)
+        if args.csv:
+            result.to_csv(args.csv, index=False)
+            print(f"Saved {len(result)} rows to {args.csv}")
+        if args.geojson:
+            try:
+                count = write_geojson(result, args.geojson, args.geojson_format)
+            except ValueError as e:
+                parser.error(str(e))
+            print(f"Saved {count} features to {args.geojson}")
+        if not args.csv and not args.geojson:
+            print(result.to_string(index=False))
+    finally:
+        layer.close()
+
+if __name__ == '__main__':
+    main()
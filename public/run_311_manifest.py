@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Run the 311 window processor over many extracts without prompting.
+
+A manifest (JSON) lists the extracts to process:
+
+    {
+      "defaults": {
+        "windows": [{"label": "June", "start": "2024-06-01", "end": "2024-06-30 23:59:59"}],
+        "geojson_format": "compact"
+      },
+      "jobs": [
+        {"input": "public/extracts/311_2023.txt", "output_prefix": "public/2023/311"},
+        {"input": "public/311.txt", "output_prefix": "public/311",
+         "windows": [{"label": "Beryl", "start": "2024-07-08", "end": "2024-07-30 23:59:59"}]}
+      ]
+    }
+
+Job keys: input (required), output_prefix, windows, header_in_file, incremental,
+state, chunk_size, geojson_format; anything missing comes from "defaults" and
+then from process_311_file's own defaults (June/July/August/JJA 2024). Without an
+output_prefix a job writes to public/<input file name>, e.g. public/311_2023 for
+public/extracts/311_2023.txt; two jobs with the same prefix are rejected, since
+they would overwrite each other's outputs and state.
+
+A job that fails is recorded as failed with its error and the others go on.
+
+Extracts run concurrently on a bounded process pool. The community center index
+is built once and handed to every worker process. A summary with rows read,
+matches per window and throughput for every file is printed and saved as JSON.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from date_windows import DEFAULT_WINDOWS, windows_from_config
+
+processor = importlib.import_module('311_data_processor')
+
+# Directory of the default output prefixes
+OUTPUT_DIR = 'public'
+
+# Per-process center index installed by the pool initializer
+_center_index = None
+
+def _set_center_index(center_index):
+    global _center_index
+    _center_index = center_index
+
+def default_output_prefix(input_file):
+    """Output prefix for a job without one: public/<input file name without extension>"""
+    return os.path.join(OUTPUT_DIR, os.path.splitext(os.path.basename(input_file))[0])
+
+def load_manifest(path):
+    """Read a manifest and return its jobs with the defaults applied"""
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    defaults = manifest.get('defaults', {})
+    jobs = []
+    prefixes = {}
+    for entry in manifest['jobs']:
+        job = dict(defaults, **entry)
+        if 'input' not in job:
+            raise ValueError(f"Manifest job without an input file: {entry}")
+        job.setdefault('output_prefix', default_output_prefix(job['input']))
+        if job['output_prefix'] in prefixes:
+            raise ValueError(f"Manifest jobs {prefixes[job['output_prefix']]} and {job['input']} both write to "
+                             f"{job['output_prefix']}; give them different output_prefix values")
+        prefixes[job['output_prefix']] = job['input']
+        jobs.append(job)
+    return jobs
+
+def failed_summary(job, error, seconds=0):
+    """Summary row of a job that raised or returned no result"""
+    return {'input': job['input'], 'output_prefix': job['output_prefix'], 'status': 'failed', 'error': error,
+            'rows': 0, 'matches': {}, 'seconds': round(seconds, 2), 'rows_per_second': 0}
+
+def run_job(job):
+    """Process one manifest job; returns its summary row (status 'failed' with the error when it fails)"""
+    output_prefix = job['output_prefix']
+    started = time.time()
+    try:
+        windows = windows_from_config(job['windows']) if 'windows' in job else DEFAULT_WINDOWS
+        result = processor.process_311_file(
+            job['input'],
+            chunk_size=job.get('chunk_size', 10000),
+            windows=windows,
+            incremental=job.get('incremental', False),
+            state_path=job.get('state', f"{output_prefix}_state.sqlite"),
+            geojson_mode=job.get('geojson_format', 'pretty'),
+            output_prefix=output_prefix,
+            center_index=_center_index,
+            header_in_file=job.get('header_in_file', True)
+        )
+    except Exception as e:
+        print(f"Error processing {job['input']}: {e}")
+        return failed_summary(job, f"{type(e).__name__}: {e}", time.time() - started)
+    seconds = time.time() - started
+    if result is None:
+        # process_311_file reports its own errors and returns None
+        return failed_summary(job, 'processing failed, see the log', seconds)
+    return {'input': job['input'], 'output_prefix': output_prefix, 'status': 'ok', 'error': None,
+            'rows': result['rows'], 'matches': result['matches'], 'seconds': round(seconds, 2),
+            'rows_per_second': round(result['rows'] / seconds) if seconds else 0}
+
+def run_manifest(jobs, max_jobs=2):
+    """Run jobs on up to max_jobs processes; returns their summaries in manifest order"""
+    center_index = processor.build_center_index()
+    if center_index is None:
+        return []
+
+    if max_jobs <= 1:
+        _set_center_index(center_index)
+        return [run_job(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=max_jobs, initializer=_set_center_index,
+                             initargs=(center_index,)) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        summaries = []
+        for job, future in zip(jobs, futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                # The worker process itself failed (run_job records the job's own errors)
+                print(f"Error processing {job['input']}: {e}")
+                summaries.append(failed_summary(job, f"{type(e).__name__}: {e}"))
+        return summaries
+
+def print_summary(summaries, seconds):
+    print("\nManifest summary:")
+    print(f"{'input':<40} {'status':<7} {'rows':>10} {'matches':>9} {'rows/s':>9}")
+    for summary in summaries:
+        print(f"{summary['input']:<40} {summary['status']:<7} {summary['rows']:>10} "
+              f"{sum(summary['matches'].values()):>9} {summary['rows_per_second']:>9}")
+    total_rows = sum(summary['rows'] for summary in summaries)
+    print(f"Total: {len(summaries)} files, {total_rows} rows in {seconds:.1f}s "
+          f"({total_rows / seconds if seconds else 0:.0f} rows/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Process many 311 extracts listed in a manifest')
+    parser.add_argument('manifest', help='Manifest JSON listing inputs, date windows and output prefixes')
+    parser.add_argument('--jobs', type=int, default=2, help='Extracts processed at the same time (default: 2)')
+    parser.add_argument('--summary', default='public/311_manifest_summary.json', help='Where to save the run summary')
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    print(f"Running {len(jobs)} jobs from {args.manifest} ({args.jobs} at a time)")
+
+    started = time.time()
+    summaries = run_manifest(jobs, args.jobs)
+    seconds = time.time() - started
+    print_summary(summaries, seconds)
+
+    with open(args.summary, 'w') as f:
+        json.dump({'manifest': args.manifest, 'seconds': round(seconds, 2), 'jobs': summaries}, f, indent=2)
+    print(f"Saved summary to {args.summary}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Spatial attributes attached to every 311 call at ingest.
+
+SpatialEnricher loads the polygon layers once, prepares their geometries and
+indexes each in an STRtree, then labels whole coordinate arrays with bulk
+point-in-polygon queries:
+
+  super_neighborhood         Super Neighborhood name
+  block_group, tract         2010 block group GEOID and its 11-digit tract prefix
+  zip_code                   ZIP code
+  flood_zone                 FLD_ZONE of the flood plain the call is in (100-year zones win)
+  nearest_center,            nearest community center and the distance to it,
+  nearest_center_distance_m  from CommunityCenterIndex
+
+Once calls carry these columns, later analyses are column filters and group-bys
+instead of another spatial pass. Missing layers are skipped (their columns are
+None); calls outside every polygon of a layer get None as well. Without a center
+index the two center columns are left out.
+"""
+
+import argparse
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from community_center_index import CommunityCenterIndex
+from dissolve_floodplains import FLOOD_ZONE_CLASSES, layer_zone_classes
+from geography_ids import BLOCK_GROUP_ID_COLUMNS, NEIGHBORHOOD_ID_COLUMNS, TRACT_GEOID_LENGTH, ZIP_ID_COLUMNS, layer_ids
+
+ENRICHMENT_COLUMNS = ['super_neighborhood', 'block_group', 'tract', 'zip_code', 'flood_zone', 'nearest_center',
+                      'nearest_center_distance_m']
+
+# Layer files, relative to the data directory (public/) like the inputs of the vulnerability scripts,
+# so they resolve the same whichever directory a script runs from
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LAYERS = {
+    'super_neighborhood': 'houston-super-neighborhoods.geojson',
+    'block_group': 'houston-census-blocks.geojson',
+    'zip_code': 'data_bundles/houston_small_files/COH_ZIPCODES.geojson',
+    'flood_zone': 'houston-texas-flood-100-500.geojson',
+}
+DEFAULT_CENTERS = 'houston-texas-community-centers-latlon.geojson'
+
+def data_path(path, data_dir=DATA_DIR):
+    """A data file path relative to data_dir (absolute paths are kept)"""
+    return os.path.join(data_dir, path)
+
+def _flood_priority(layer):
+    """Sort key putting 100-year zones before 500-year zones before anything else"""
+    ranks = {zone_class: rank for rank, zone_class in enumerate(FLOOD_ZONE_CLASSES)}
+    return np.array([ranks.get(zone_class, len(ranks)) for zone_class in layer_zone_classes(layer)])
+
+def read_layer(name, path):
+    """(geometries, labels) of a polygon layer in EPSG:4326, ordered so the preferred polygon comes first"""
+    layer = gpd.read_file(path).to_crs('EPSG:4326')
+    if name == 'super_neighborhood':
+        labels = layer_ids(layer, NEIGHBORHOOD_ID_COLUMNS, 'Neighborhood')
+    elif name == 'block_group':
+        labels = layer_ids(layer, BLOCK_GROUP_ID_COLUMNS, 'block_group')
+    elif name == 'zip_code':
+        labels = layer_ids(layer, ZIP_ID_COLUMNS, 'zip')
+    else:
+        labels = layer['FLD_ZONE'].astype(str).to_numpy(dtype=object)
+        order = np.argsort(_flood_priority(layer), kind='stable')
+        return np.asarray(layer.geometry)[order], labels[order]
+    return np.asarray(layer.geometry), labels
+
+class SpatialEnricher:
+    """Point-in-polygon labels from several layers plus the nearest community center, for arrays of calls"""
+
+    def __init__(self, layers, center_index=None):
+        # layers: {column: (geometries, labels)}; the first matching polygon labels a point
+        self.layers = layers
+        self.center_index = center_index
+        self._trees = {}
+
+    @classmethod
+    def from_files(cls, layer_paths=None, centers_path=DEFAULT_CENTERS, data_dir=DATA_DIR):
+        """
+        Load every layer that exists; layer_paths overrides DEFAULT_LAYERS per column. Paths are relative
+        to data_dir (public/ by default).
+        """
+        layer_paths = {**DEFAULT_LAYERS, **(layer_paths or {})}
+        layers = {}
+        for name, path in layer_paths.items():
+            path = data_path(path, data_dir) if path else path
+            if path and os.path.exists(path):
+                layers[name] = read_layer(name, path)
+                print(f"Loaded {len(layers[name][0])} {name} polygons from {path}")
+            else:
+                print(f"{path} not found, {name} will be empty")
+        center_index = None
+        centers_path = data_path(centers_path, data_dir) if centers_path else centers_path
+        if centers_path and os.path.exists(centers_path):
+            center_index = CommunityCenterIndex.from_geojson(centers_path)
+        return cls(layers, center_index)
+
+    def __getstate__(self):
+        # Trees are rebuilt lazily in worker processes
+        return {**self.__dict__, '_trees': {}}
+
+    def _tree(self, name):
+        if name not in self._trees:
+            geometries = self.layers[name][0]
+            shapely.prepare(geometries)
+            self._trees[name] = shapely.STRtree(geometries)
+        return self._trees[name]
+
+    def label(self, name, points):
+        """Label of the first polygon of a layer containing each point (None outside the layer)"""
+        labels = np.full(len(points), None, dtype=object)
+        if name not in self.layers or not len(points):
+            return labels
+        point_ids, polygon_ids = self._tree(name).query(points, predicate='within')
+        # Lowest polygon position per point, i.e. the preferred polygon
+        order = np.lexsort((polygon_ids, point_ids))
+        point_ids, polygon_ids = point_ids[order], polygon_ids[order]
+        first = np.ones(len(point_ids), dtype=bool)
+        first[1:] = point_ids[1:] != point_ids[:-1]
+        labels[point_ids[first]] = self.layers[name][1][polygon_ids[first]]
+        return labels
+
+    def enrich_coordinates(self, lats, lons):
+        """Enrichment columns for coordinate arrays (no center columns without a center index)"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        points = shapely.points(lons, lats)
+        columns = {name: self.label(name, points) for name in ['super_neighborhood', 'block_group', 'zip_code',
+                                                               'flood_zone']}
+        columns['tract'] = np.array([geoid[:TRACT_GEOID_LENGTH] if geoid else None
+                                     for geoid in columns['block_group']], dtype=object)
+        if self.center_index is not None:
+            center_ids, distances = self.center_index.nearest(lats, lons)
+            columns['nearest_center'] = self.center_index.names_for(center_ids[:, 0])
+            columns['nearest_center_distance_m'] = distances[:, 0]
+        return {name: columns[name] for name in ENRICHMENT_COLUMNS if name in columns}
+
+    def enrich(self, frame, lat_column='Latitude', lon_column='Longitude'):
+        """Copy of a DataFrame of calls with the enrichment columns added"""
+        lats = pd.to_numeric(frame[lat_column], errors='coerce').to_numpy(dtype=float)
+        lons = pd.to_numeric(frame[lon_column], errors='coerce').to_numpy(dtype=float)
+        return frame.assign(**self.enrich_coordinates(lats, lons))
+
+def main():
+    parser = argparse.ArgumentParser(description='Add spatial attribute columns to a CSV of 311 calls')
+    parser.add_argument('input_csv', help='CSV with latitude/longitude columns (e.g. a classify_311_categories output)')
+    parser.add_argument('output_csv')
+    parser.add_argument('--lat-column', default='lat')
+    parser.add_argument('--lon-column', default='lon')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    enricher = SpatialEnricher.from_files()
+    rows = 0
+    with open(args.output_csv, 'w', newline='') as f:
+        for chunk_num, chunk in enumerate(pd.read_csv(args.input_csv, chunksize=args.chunk_size, low_memory=False)):
+            enricher.enrich(chunk, args.lat_column, args.lon_column).to_csv(f, index=False, header=chunk_num == 0)
+            rows += len(chunk)
+    print(f"Saved {rows} enriched calls to {args.output_csv}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Online surge detection for 311 calls.
+
+SurgeDetector is fed calls one at a time (time, super neighborhood, category)
+and keeps an exponentially weighted mean and variance of calls per time bucket
+for every neighborhood x category, every neighborhood and every category. Each
+call updates three baselines in O(1): when a bucket closes its count is folded
+into the baseline, and any run of empty buckets in between is folded in with a
+closed form instead of one step per bucket. An alert is emitted the first time a
+bucket's running count reaches min_calls and its z-score against the baseline
+reaches the threshold, so surges are reported while the bucket is still open.
+
+State is one small record per key and the keys are bounded by the number of
+neighborhoods and categories, so memory does not grow with the stream.
+
+Two ways to feed it (run from the repository root, like classify_311_categories):
+
+  replay  a raw 311 extract (its converted Parquet dataset when there is one) or a
+          deduplicated case store (see dedup_311_store), labelled chunk by
+          chunk and pushed through in Created Date Local order as fast as
+          possible (or at --speedup x real time), e.g. the Beryl extract. The
+          Parquet dataset is read in date order a month at a time; other
+          sources pass through a reorder buffer of --reorder-hours
+  follow  a JSON-lines feed (one call per line, extract column names), tailed
+          like tail -f and labelled a batch of new lines at a time
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from category_rules import classify_categories
+from convert_311_to_parquet import iter_311_parquet_by_date, parquet_dataset_path
+from dedup_311_store import STORE_SUFFIX, iter_store_chunks
+from load_311_extract import parse_extract_dates, read_311_extract
+from spatial_enrichment import DEFAULT_LAYERS, SpatialEnricher, data_path, read_layer
+
+SURGE_COLUMNS = ['365 Case Number', 'Title', 'Description', 'Created Date Local', 'Latitude', 'Longitude']
+
+# Label of the all-neighborhoods / all-categories baselines, and of calls outside every neighborhood
+ALL = 'All'
+UNKNOWN = 'Unknown'
+
+# Variance never drops below this many calls^2 (a Poisson count has variance >= its mean)
+MIN_VARIANCE = 1.0
+
+class EwmaBaseline:
+    """Exponentially weighted mean and variance of the calls per bucket of one key, plus the open bucket"""
+
+    def __init__(self, bucket):
+        self.first_bucket = bucket
+        self.bucket = bucket
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        self.alerted_bucket = None
+
+    def advance(self, bucket, alpha):
+        """Close the open bucket and every empty bucket before bucket, then open bucket"""
+        difference = self.count - self.mean
+        increment = alpha * difference
+        self.mean += increment
+        self.variance = (1 - alpha) * (self.variance + difference * increment)
+        # k empty buckets: mean * d^k and d^k * (variance + mean^2 * (1 - d^k)), with d = 1 - alpha
+        decay = (1 - alpha) ** (bucket - self.bucket - 1)
+        self.variance = decay * (self.variance + self.mean ** 2 * (1 - decay))
+        self.mean *= decay
+        self.bucket = bucket
+        self.count = 0
+
+    def zscore(self):
+        return (self.count - self.mean) / math.sqrt(max(self.variance, self.mean, MIN_VARIANCE))
+
+class SurgeDetector:
+    """Streaming per-neighborhood and per-category surge alerts with O(1) work per call"""
+
+    def __init__(self, bucket_minutes=60, half_life_hours=72, threshold=4.0, min_calls=5, warmup_hours=72):
+        self.bucket_ns = int(bucket_minutes * 60 * 10**9)
+        # Weight of the newest bucket so a bucket's weight halves after half_life_hours
+        self.alpha = 1 - 0.5 ** (bucket_minutes / (half_life_hours * 60))
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.warmup_buckets = int(warmup_hours * 60 / bucket_minutes)
+        self.baselines = {}
+        self.calls = 0
+        self.late = 0
+
+    def observe(self, timestamp, neighborhood, category):
+        """Count one call; returns the alerts it triggers (usually none)"""
+        return self.observe_bucket(pd.Timestamp(timestamp).value // self.bucket_ns, neighborhood, category)
+
+    def observe_bucket(self, bucket, neighborhood, category):
+        """observe() for a call already mapped to its bucket (timestamp in ns // bucket_ns)"""
+        self.calls += 1
+        neighborhood, category = neighborhood or UNKNOWN, category or UNKNOWN
+        alerts = []
+        late = False
+        for key in ((neighborhood, category), (neighborhood, ALL), (ALL, category)):
+            baseline = self.baselines.get(key)
+            if baseline is None:
+                baseline = self.baselines[key] = EwmaBaseline(bucket)
+            elif bucket < baseline.bucket:
+                # Calls older than the open bucket are too late to count for this key
+                late = True
+                continue
+            elif bucket > baseline.bucket:
+                baseline.advance(bucket, self.alpha)
+            baseline.count += 1
+            if baseline.alerted_bucket != bucket and self._is_surge(baseline):
+                baseline.alerted_bucket = bucket
+                alerts.append(self._alert(key, baseline))
+        # Counted once per call, however many of its baselines had moved on
+        self.late += late
+        return alerts
+
+    def _is_surge(self, baseline):
+        return (baseline.count >= self.min_calls
+                and baseline.bucket - baseline.first_bucket >= self.warmup_buckets
+                and baseline.zscore() >= self.threshold)
+
+    def _alert(self, key, baseline):
+        return {
+            'bucket_start': pd.Timestamp(baseline.bucket * self.bucket_ns).isoformat(),
+            'neighborhood': key[0],
+            'category': key[1],
+            'calls': baseline.count,
+            'expected': round(baseline.mean, 2),
+            'zscore': round(baseline.zscore(), 2),
+        }
+
+    def summary(self):
+        return (f"{self.calls} calls, {len(self.baselines)} baselines, {self.late} late calls, "
+                f"bucket {self.bucket_ns // (60 * 10**9)} min, alpha {self.alpha:.4f}")
+
+def neighborhood_enricher(path=DEFAULT_LAYERS['super_neighborhood']):
+    """SpatialEnricher with only the Super Neighborhood layer"""
+    return SpatialEnricher({'super_neighborhood': read_layer('super_neighborhood', data_path(path))})
+
+def label_calls(chunk, enricher):
+    """(timestamps, neighborhoods, categories) of a chunk of calls in extract columns"""
+    times = parse_extract_dates(chunk['Created Date Local'])
+    categories = classify_categories(chunk['Title'], chunk['Description'], chunk['365 Case Number'])
+    points = shapely.points(pd.to_numeric(chunk['Longitude'], errors='coerce').to_numpy(dtype=float),
+                            pd.to_numeric(chunk['Latitude'], errors='coerce').to_numpy(dtype=float))
+    return times, enricher.label('super_neighborhood', points), categories
+
+def ordered_calls(chunks, window):
+    """
+    (bucket, neighborhood, category) of every call in bucket order, from chunks of (buckets, neighborhoods,
+    categories) arrays that are in order to within window buckets. Calls are held until the newest bucket
+    seen is more than window buckets past theirs, so only about window buckets of calls are kept; a call
+    arriving after its bucket was released is passed on out of order (and counted late by the detector).
+    """
+    held = (np.empty(0, dtype=np.int64), np.empty(0, dtype=object), np.empty(0, dtype=object))
+    newest = None
+    for chunk in chunks:
+        if not len(chunk[0]):
+            continue
+        newest = chunk[0].max() if newest is None else max(newest, chunk[0].max())
+        buckets, neighborhoods, categories = (np.concatenate([old, new]) for old, new in zip(held, chunk))
+        # Stable, so calls of one bucket keep their arrival order
+        order = np.argsort(buckets, kind='stable')
+        buckets, neighborhoods, categories = buckets[order], neighborhoods[order], categories[order]
+        release = np.searchsorted(buckets, newest - window)
+        yield from zip(buckets[:release].tolist(), neighborhoods[:release], categories[:release])
+        held = buckets[release:], neighborhoods[release:], categories[release:]
+    yield from zip(held[0].tolist(), held[1], held[2])
+
+def replay(input_file, detector, enricher, start_date=None, end_date=None, speedup=None, chunk_size=100000,
+           reorder_hours=24):
+    """
+    Yield the alerts of a historical extract replayed in Created Date Local order, chunk by chunk.
+    A converted Parquet dataset is read in date order a month partition at a time; an extract or case
+    store is put in order by a reorder buffer of reorder_hours, and calls further out of order than that
+    reach the detector late.
+    """
+    dataset_dir = parquet_dataset_path(input_file)
+    if input_file.endswith(STORE_SUFFIX):
+        chunks = iter_store_chunks(input_file, SURGE_COLUMNS, chunk_size)
+    elif os.path.isdir(dataset_dir):
+        chunks = iter_311_parquet_by_date(dataset_dir, columns=SURGE_COLUMNS, start_date=start_date,
+                                          end_date=end_date, batch_size=chunk_size)
+    else:
+        chunks = read_311_extract(input_file, SURGE_COLUMNS, chunk_size)
+
+    def labelled_chunks():
+        """Bucket and the two labels of every call in the date range"""
+        for chunk in chunks:
+            times, neighborhoods, categories = label_calls(chunk, enricher)
+            keep = times.notna().to_numpy()
+            if start_date is not None:
+                keep &= (times >= start_date).to_numpy()
+            if end_date is not None:
+                keep &= (times <= end_date).to_numpy()
+            yield (pd.DatetimeIndex(times[keep]).as_unit('ns').asi8 // detector.bucket_ns,
+                   neighborhoods[keep], categories[keep])
+
+    print(f"Replaying {input_file}...")
+    window = int(reorder_hours * 3600 * 10**9 // detector.bucket_ns)
+    started = time.monotonic()
+    first_bucket = None
+    for bucket, neighborhood, category in ordered_calls(labelled_chunks(), window):
+        if speedup:
+            if first_bucket is None:
+                first_bucket = bucket
+            # Wait until this call is due at speedup x real time
+            due = (bucket - first_bucket) * detector.bucket_ns / 1e9 / speedup
+            delay = due - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        yield from detector.observe_bucket(bucket, neighborhood, category)
+    if detector.late:
+        print(f"{detector.late} calls were more than {reorder_hours:g} h out of date order and arrived late; "
+              f"replay the converted Parquet dataset (convert_311_to_parquet.py) or raise --reorder-hours")
+
+def follow(feed_path, poll_seconds=1.0, batch_size=10000):
+    """
+    Yield lists of the calls appended to a JSON-lines file, waiting for new lines like tail -f.
+    Every complete line already written goes into one batch (up to batch_size); malformed lines are
+    reported and skipped.
+    """
+    with open(feed_path, 'r') as f:
+        pending = ''
+        batch = []
+        while True:
+            line = f.readline()
+            if not line:
+                if batch:
+                    yield batch
+                    batch = []
+                time.sleep(poll_seconds)
+                continue
+            pending += line
+            if not pending.endswith('\n'):
+                # Partial line still being written
+                continue
+            record, pending = pending.strip(), ''
+            if not record:
+                continue
+            try:
+                call = json.loads(record)
+            except json.JSONDecodeError as error:
+                print(f"Skipping malformed feed line ({error}): {record[:200]}")
+                continue
+            if not isinstance(call, dict):
+                print(f"Skipping feed line that is not a JSON object: {record[:200]}")
+                continue
+            batch.append(call)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+def follow_feed(feed_path, detector, enricher, poll_seconds=1.0):
+    """Yield the alerts of calls appended to a live feed, labelling each batch of new lines at once"""
+    for records in follow(feed_path, poll_seconds):
+        calls = pd.DataFrame([{column: record.get(column) for column in SURGE_COLUMNS} for record in records],
+                             columns=SURGE_COLUMNS)
+        times, neighborhoods, categories = label_calls(calls, enricher)
+        for timestamp, neighborhood, category in zip(times, neighborhoods, categories):
+            if pd.isna(timestamp):
+                continue
+            yield from detector.observe(timestamp, neighborhood, category)
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect 311 call surges per neighborhood and category')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--replay', metavar='EXTRACT', help='Replay a raw 311 extract (e.g. public/311.txt) or a deduplicated case store (.sqlite)')
+    source.add_argument('--follow', metavar='FEED', help='Tail a JSON-lines feed of calls')
+    parser.add_argument('--start', help='First day to replay (YYYY-MM-DD)')
+    parser.add_argument('--end', help='Last day to replay, inclusive (YYYY-MM-DD)')
+    parser.add_argument('--speedup', type=float, help='Replay at this multiple of real time instead of at full speed')
+    parser.add_argument('--reorder-hours', type=float, default=24,
+                        help='How far out of date order an extract may be; calls further out arrive late (default: 24)')
+    parser.add_argument('--bucket-minutes', type=float, default=60)
+    parser.add_argument('--half-life-hours', type=float, default=72)
+    parser.add_argument('--threshold', type=float, default=4.0, help='z-score that raises an alert')
+    parser.add_argument('--min-calls', type=int, default=5, help='Calls a bucket needs before it can alert')
+    parser.add_argument('--warmup-hours', type=float, default=72, help='History a baseline needs before it can alert')
+    parser.add_argument('--alerts', help='Append alerts to this JSON-lines file')
+    args = parser.parse_args()
+
+    detector = SurgeDetector(args.bucket_minutes, args.half_life_hours, args.threshold, args.min_calls,
+                             args.warmup_hours)
+    enricher = neighborhood_enricher()
+    if args.replay:
+        start_date = pd.Timestamp(args.start) if args.start else None
+        end_date = pd.Timestamp(args.end) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1) if args.end else None
+        alerts = replay(args.replay, detector, enricher, start_date, end_date, args.speedup,
+                        reorder_hours=args.reorder_hours)
+    else:
+        alerts = follow_feed(args.follow, detector, enricher)
+
+    alert_file = open(args.alerts, 'a') if args.alerts else None
+    count = 0
+    try:
+        for alert in alerts:
+            count += 1
+            print(f"{alert['bucket_start']}  {alert['neighborhood']} / {alert['category']}: {alert['calls']} calls "
+                  f"(expected {alert['expected']}, z {alert['zscore']})")
+            if alert_file:
+                alert_file.write(json.dumps(alert) + '\n')
+                alert_file.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if alert_file:
+            alert_file.close()
+    print(f"\n{count} alerts; {detector.summary()}")
+
+if __name__ == '__main__':
+    main()
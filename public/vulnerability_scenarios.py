@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Weight and normalization scenarios for the vulnerability index.
+
+calculate_vulnerability_index saves the raw factors of every Super Neighborhood
+(FACTORS_FILE) next to its GeoJSON. This module re-scores that table under any
+number of scenarios without touching geometry: every parameter of the composite
+(factor weights, call/income/flood normalization, and the community center and
+church step thresholds) is an array with one value per scenario, and scores,
+indices and ranks are computed as (scenarios x neighborhoods) NumPy arrays in
+batches. BASELINE reproduces the hard-coded index.
+
+Monte Carlo runs draw weights from a Dirichlet distribution (so they sum to 1)
+and normalization constants uniformly from ranges, and report each
+neighborhood's rank distribution and how stable its rank is against the baseline.
+The same report is available for explicit weight vectors (--weights) or for
+every weight vector on a grid over the simplex (--grid), with the other
+parameters at their baseline values.
+"""
+
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+FACTORS_FILE = 'super-neighborhoods-vulnerability-factors.csv'
+
+FACTOR_NAMES = ['call_score', 'income_score', 'flood_score', 'community_center_score', 'church_score']
+
+# The constants of calculate_vulnerability_index
+BASELINE = {
+    'weights': [0.2, 0.2, 0.2, 0.2, 0.2],
+    'max_calls': 5000,
+    'min_income': 20000,
+    'max_income': 150000,
+    'max_flood': 100,
+    # Community center square footage steps and their scores (no center scores 1.0)
+    'small_center_sqft': 5000,
+    'large_center_sqft': 15000,
+    'center_scores': [0.7, 0.3, 0.0],
+    # Church count and area steps and their scores (no church scores 1.0)
+    'few_churches': 2,
+    'some_churches': 5,
+    'small_church_area': 50000,
+    'large_church_area': 200000,
+    'church_scores': [0.7, 0.3, 0.0],
+}
+
+# Scenarios scored per batch
+SCENARIO_BATCH = 10000
+
+def load_factors(path=FACTORS_FILE):
+    """Raw per-neighborhood factor table written by calculate_vulnerability_index"""
+    return pd.read_csv(path)
+
+def scenario_parameters(count, **overrides):
+    """
+    Parameter arrays for count scenarios: BASELINE values, with any parameter replaced by an
+    array of per-scenario values (weights and step scores as (count, 3 or 5) arrays)
+    """
+    parameters = {}
+    for name, value in BASELINE.items():
+        value = np.asarray(overrides.get(name, value), dtype=float)
+        width = len(BASELINE[name]) if isinstance(BASELINE[name], list) else None
+        shape = (count, width) if width else (count,)
+        parameters[name] = np.broadcast_to(value, shape).copy()
+    return parameters
+
+def sample_scenarios(count, seed=None, concentration=20.0, max_calls=(2500, 10000), min_income=(10000, 40000),
+                     max_flood=(50, 100)):
+    """
+    Monte Carlo scenarios: Dirichlet weights around equal weights (higher concentration keeps them
+    closer to 1/5) and uniform normalization constants within (low, high) ranges
+    """
+    rng = np.random.default_rng(seed)
+    return scenario_parameters(
+        count,
+        weights=rng.dirichlet(np.full(len(FACTOR_NAMES), concentration / len(FACTOR_NAMES)), size=count),
+        max_calls=rng.uniform(*max_calls, size=count),
+        min_income=rng.uniform(*min_income, size=count),
+        max_flood=rng.uniform(*max_flood, size=count),
+    )
+
+def weight_grid(step):
+    """Every weight vector whose weights are multiples of step and sum to 1, shape (vectors, factors)"""
+    parts = int(round(1 / step))
+    if parts < 1 or not np.isclose(parts * step, 1):
+        raise ValueError(f"Grid step must divide 1 into whole parts, got {step}")
+    # Stars and bars: the cut points between factors split the parts into a composition
+    factors = len(FACTOR_NAMES)
+    cuts = np.array(list(itertools.combinations(range(parts + factors - 1), factors - 1)), dtype=np.int64)
+    bounds = np.column_stack([np.full(len(cuts), -1), cuts, np.full(len(cuts), parts + factors - 1)])
+    return (np.diff(bounds, axis=1) - 1) / parts
+
+def weight_scenarios(weights):
+    """Scenarios for explicit weight vectors (one per row), other parameters at their baseline values"""
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    if weights.shape[1] != len(FACTOR_NAMES):
+        raise ValueError(f"Weight vectors need {len(FACTOR_NAMES)} values ({', '.join(FACTOR_NAMES)})")
+    if (weights < 0).any() or (weights.sum(axis=1) <= 0).any():
+        raise ValueError("Weights must be non-negative with a positive sum")
+    return scenario_parameters(len(weights), weights=weights)
+
+def _slice(parameters, start, stop):
+    return {name: values[start:stop] for name, values in parameters.items()}
+
+def _column(values):
+    """Per-scenario values as a column that broadcasts against neighborhoods"""
+    return values[:, None]
+
+def factor_scores(factors, parameters):
+    """Scores of every factor as an array of shape (factors, scenarios, neighborhoods), higher = more vulnerable"""
+    calls = factors['call_count'].to_numpy(dtype=float)
+    incomes = factors['avg_median_income'].to_numpy(dtype=float)
+    flood = factors['flood_percentage'].to_numpy(dtype=float)
+    has_center = factors['has_community_center'].to_numpy(dtype=bool)
+    square_footage = factors['total_square_footage'].to_numpy(dtype=float)
+    church_count = factors['church_count'].to_numpy(dtype=float)
+    church_area = factors['total_church_area'].to_numpy(dtype=float)
+
+    max_calls = _column(parameters['max_calls'])
+    call_score = np.where(max_calls > 0, np.minimum(calls / np.where(max_calls > 0, max_calls, 1), 1.0), 0)
+
+    min_income = _column(parameters['min_income'])
+    income_range = _column(parameters['max_income']) - min_income
+    income_score = np.where(incomes > 0, np.maximum(0, 1 - (incomes - min_income) / income_range), 1)
+
+    max_flood = _column(parameters['max_flood'])
+    flood_score = np.where(max_flood > 0, np.minimum(flood / np.where(max_flood > 0, max_flood, 1), 1.0), 0)
+
+    # Step functions: the first matching step wins, as in the if/elif chains
+    center_scores = parameters['center_scores']
+    center_score = np.where(
+        ~has_center, 1.0,
+        np.where(square_footage < _column(parameters['small_center_sqft']), _column(center_scores[:, 0]),
+                 np.where(square_footage < _column(parameters['large_center_sqft']), _column(center_scores[:, 1]),
+                          _column(center_scores[:, 2]))))
+
+    church_scores = parameters['church_scores']
+    few = (church_count <= _column(parameters['few_churches'])) & \
+          (church_area < _column(parameters['small_church_area']))
+    some = (church_count <= _column(parameters['some_churches'])) & \
+           (church_area < _column(parameters['large_church_area']))
+    church_score = np.where(
+        church_count == 0, 1.0,
+        np.where(few, _column(church_scores[:, 0]),
+                 np.where(some, _column(church_scores[:, 1]), _column(church_scores[:, 2]))))
+
+    return np.stack(np.broadcast_arrays(call_score, income_score, flood_score, center_score, church_score))
+
+def vulnerability_indices(factors, parameters):
+    """Composite index per scenario and neighborhood: the weighted sum of the factor scores"""
+    scores = factor_scores(factors, parameters)
+    return np.einsum('fsn,sf->sn', scores, parameters['weights'])
+
+def rank_matrix(indices):
+    """Rank of every neighborhood per scenario, 1 = most vulnerable (ties keep table order)"""
+    order = np.argsort(-indices, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, indices.shape[1] + 1), axis=1)
+    return ranks
+
+def rank_distribution(factors, parameters, batch_size=SCENARIO_BATCH):
+    """(neighborhoods x ranks) counts of how often each neighborhood lands on each rank"""
+    count = len(parameters['max_calls'])
+    neighborhoods = len(factors)
+    counts = np.zeros((neighborhoods, neighborhoods), dtype=np.int64)
+    for start in range(0, count, batch_size):
+        ranks = rank_matrix(vulnerability_indices(factors, _slice(parameters, start, start + batch_size)))
+        neighborhood_ids = np.broadcast_to(np.arange(neighborhoods), ranks.shape)
+        counts += np.bincount((neighborhood_ids * neighborhoods + ranks - 1).ravel(),
+                              minlength=neighborhoods * neighborhoods).reshape(neighborhoods, neighborhoods)
+    return counts
+
+def rank_summary(factors, counts, tolerance=2, top=10):
+    """
+    Per-neighborhood rank statistics from rank_distribution counts: baseline rank, mean, spread and
+    percentiles, the share of scenarios in the top ranks, and stability (the share of scenarios within
+    tolerance ranks of the baseline)
+    """
+    neighborhoods = len(factors)
+    rank_values = np.arange(1, neighborhoods + 1)
+    scenarios = counts.sum(axis=1)
+    baseline = rank_matrix(vulnerability_indices(factors, scenario_parameters(1)))[0]
+
+    shares = counts / scenarios[:, None]
+    mean_rank = shares @ rank_values
+    std_rank = np.sqrt(np.maximum(shares @ rank_values ** 2 - mean_rank ** 2, 0))
+    cumulative = np.cumsum(shares, axis=1)
+
+    def percentile(q):
+        return (cumulative < q).sum(axis=1) + 1
+
+    distance = np.abs(rank_values[None, :] - baseline[:, None])
+    names = factors['neighborhood_name'] if 'neighborhood_name' in factors.columns else pd.Series(range(neighborhoods))
+    return pd.DataFrame({
+        'neighborhood_name': names.to_numpy(),
+        'baseline_rank': baseline,
+        'mean_rank': mean_rank,
+        'std_rank': std_rank,
+        'p5_rank': percentile(0.05),
+        'median_rank': percentile(0.5),
+        'p95_rank': percentile(0.95),
+        'best_rank': np.argmax(counts > 0, axis=1) + 1,
+        'worst_rank': neighborhoods - np.argmax(counts[:, ::-1] > 0, axis=1),
+        f'top_{top}_share': shares[:, :top].sum(axis=1),
+        'rank_stability': (shares * (distance <= tolerance)).sum(axis=1),
+    }).sort_values('baseline_rank')
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank stability of the vulnerability index under sampled scenarios')
+    parser.add_argument('--factors', default=FACTORS_FILE, help='Factor table written by calculate_vulnerability_index')
+    scenarios = parser.add_mutually_exclusive_group()
+    scenarios.add_argument('--scenarios', type=int, default=10000, help='Monte Carlo scenarios (default: 10000)')
+    scenarios.add_argument('--weights', type=float, nargs=len(FACTOR_NAMES), action='append', metavar='W',
+                           help=f"Explicit weights ({', '.join(FACTOR_NAMES)}); repeat for more scenarios")
+    scenarios.add_argument('--grid', type=float, metavar='STEP',
+                           help='Every weight vector in multiples of STEP summing to 1 (e.g. 0.1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concentration', type=float, default=20.0, help='Dirichlet concentration of the weights')
+    parser.add_argument('--tolerance', type=int, default=2, help='Ranks from the baseline that still count as stable')
+    parser.add_argument('--output', default='vulnerability_rank_stability.csv', help='Per-neighborhood summary CSV')
+    parser.add_argument('--distribution', default='vulnerability_rank_distribution.csv',
+                        help='Neighborhood x rank scenario counts CSV')
+    args = parser.parse_args()
+
+    try:
+        if args.weights:
+            parameters = weight_scenarios(args.weights)
+        elif args.grid:
+            parameters = weight_scenarios(weight_grid(args.grid))
+        else:
+            parameters = sample_scenarios(args.scenarios, args.seed, args.concentration)
+    except ValueError as e:
+        parser.error(str(e))
+    scenario_count = len(parameters['weights'])
+
+    factors = load_factors(args.factors)
+    counts = rank_distribution(factors, parameters)
+    summary = rank_summary(factors, counts, args.tolerance)
+
+    summary.to_csv(args.output, index=False)
+    distribution = pd.DataFrame(counts, columns=[f'rank_{rank}' for rank in range(1, len(factors) + 1)])
+    distribution.insert(0, 'neighborhood_name', summary.sort_index()['neighborhood_name'].to_numpy())
+    distribution.to_csv(args.distribution, index=False)
+    print(f"Scored {scenario_count} scenarios for {len(factors)} neighborhoods")
+    print(f"Saved {args.output} and {args.distribution}")
+    print("\nLeast stable ranks:")
+    for _, row in summary.nsmallest(5, 'rank_stability').iterrows():
+        print(f"  {row['neighborhood_name']}: baseline {row['baseline_rank']}, "
+              f"p5-p95 {row['p5_rank']}-{row['p95_rank']}, stability {row['rank_stability']:.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -39,6 +39,17 @@ import VulnerabilityAnimation from './components/VulnerabilityAnimation';
 // Set mapbox access token
 mapboxgl.accessToken = process.env.REACT_APP_MAPBOX_ACCESS_TOKEN;
 
+// Vulnerability index polygons: full-fidelity file and the level-of-detail manifest written next to it
+const VULNERABILITY_INDEX_URL = '/super-neighborhoods-vulnerability-index.geojson';
+const VULNERABILITY_LODS_URL = '/super-neighborhoods-vulnerability-index.lods.json';
+
+// File of the level of detail covering a zoom ([{ file, min_zoom, max_zoom }] from the .lods.json manifest)
+const lodUrlForZoom = (lods, zoom) => {
+  const level = Math.floor(zoom);
+  const lod = lods.find(entry => level >= entry.min_zoom && level <= entry.max_zoom) || lods[lods.length - 1];
+  return `/${lod.file}`;
+};
+
 const MapComponent = () => {
   const mapContainer = useRef(null);
   const map = useRef(null);
@@ -94,6 +105,8 @@ const MapComponent = () => {
   const [showSuperNeighborhoods, setShowSuperNeighborhoods] = useState(false);
   const [showMedianIncome2022, setShowMedianIncome2022] = useState(false);
   const [showVulnerabilityIndex, setShowVulnerabilityIndex] = useState(false);
+  const vulnerabilityLods = useRef([]);
+  const vulnerabilityLodUrl = useRef(null);
   
   // Animation timer ref
   const animationTimerRef = useRef(null);
@@ -170,7 +183,7 @@ const MapComponent = () => {
         const flood100 = {
           ...fpData,
           features: fpData.features.filter(f =>
-            ['AE', 'A', 'AO', 'VE'].includes(f.properties.FLD_ZONE)
+            ['A', 'AE', 'AH', 'AO', 'AR', 'A99', 'V', 'VE'].includes(f.properties.FLD_ZONE)
           )
         };
         setCommunityCentersData(ccData);
@@ -1882,10 +1895,16 @@ const MapComponent = () => {
 
     if (showVulnerabilityIndex) {
       if (!map.current.getSource(sourceId)) {
-        fetch('/super-neighborhoods-vulnerability-index.geojson')
+        // Simplified polygons at low zooms when the manifest exists, the full-fidelity file otherwise
+        fetch(VULNERABILITY_LODS_URL)
           .then(res => res.json())
-          .then(data => {
-            map.current.addSource(sourceId, { type: 'geojson', data });
+          .catch(() => [])
+          .then(lods => {
+            vulnerabilityLods.current = Array.isArray(lods) ? lods : [];
+            vulnerabilityLodUrl.current = vulnerabilityLods.current.length
+              ? lodUrlForZoom(vulnerabilityLods.current, map.current.getZoom())
+              : VULNERABILITY_INDEX_URL;
+            map.current.addSource(sourceId, { type: 'geojson', data: vulnerabilityLodUrl.current });
             map.current.addLayer({
               id: `${layerId}-fill`,
               type: 'fill',
@@ -1952,6 +1971,28 @@ const MapComponent = () => {
     }
   }, [showVulnerabilityIndex, map]);
 
+  // Swap the vulnerability polygons for the level of detail of the current zoom
+  useEffect(() => {
+    if (!map.current || !showVulnerabilityIndex) return;
+
+    const handleVulnerabilityZoom = () => {
+      const source = map.current.getSource('vulnerability-index');
+      if (!source || !vulnerabilityLods.current.length) return;
+      const url = lodUrlForZoom(vulnerabilityLods.current, map.current.getZoom());
+      if (url !== vulnerabilityLodUrl.current) {
+        vulnerabilityLodUrl.current = url;
+        source.setData(url);
+      }
+    };
+
+    map.current.on('zoomend', handleVulnerabilityZoom);
+    return () => {
+      if (map.current) {
+        map.current.off('zoomend', handleVulnerabilityZoom);
+      }
+    };
+  }, [showVulnerabilityIndex, map]);
+
   // Add click handler for vulnerability index
   useEffect(() => {
     if (!map.current || !showVulnerabilityIndex) return;
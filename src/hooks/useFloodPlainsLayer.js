@@ -22,7 +22,7 @@ export function useFloodPlainsLayer(map, show100, show500) {
         id: layer100Id,
         type: 'fill',
         source: sourceId,
-        filter: ['in', ['get', 'FLD_ZONE'], ['literal', ['AE', 'A', 'AO', 'VE']]],
+        filter: ['in', ['get', 'FLD_ZONE'], ['literal', ['A', 'AE', 'AH', 'AO', 'AR', 'A99', 'V', 'VE']]],
         paint: {
           'fill-color': '#7EC8E3', // light blue
           'fill-opacity': 0.5,
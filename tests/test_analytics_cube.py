@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics_cube import (DIMENSIONS, UNKNOWN, AnalyticsCube, category_report, cube_dimensions, month_report,
+                           neighborhood_analysis)
+
+@pytest.fixture
+def calls():
+    rng = np.random.default_rng(0)
+    count = 5000
+    days = pd.Timestamp('2024-06-01') + pd.to_timedelta(rng.integers(0, 92, count), unit='D')
+    created = pd.Series(days.strftime('%Y-%m-%d %H:%M:%S'), dtype=object)
+    created[rng.random(count) < 0.02] = None
+    return pd.DataFrame({
+        'Created Date Local': created,
+        'month': rng.choice(['June', 'July', 'August'], count),
+        'Category': rng.choice(['Power Outage', 'Storm Debris', 'Flood Drainage', None], count),
+        'Subcategory': rng.choice(['a', 'b', 'c'], count),
+        'super_neighborhood': rng.choice(['SN 1', 'SN 2', 'SN 3', None], count),
+        'zip_code': rng.choice(['77002', '77003'], count),
+        'nearest_center': rng.choice(['Center 1', 'Center 2', 'Center 3'], count),
+        'Status': rng.choice(['Open', 'Closed'], count),
+    })
+
+def labelled(calls):
+    """One row per call with the cube's dimension labels, plus the Created Date month"""
+    frame = pd.DataFrame(cube_dimensions(calls))
+    frame['month'] = frame['day'].where(frame['day'] == UNKNOWN, frame['day'].str[:7])
+    return frame
+
+def expected_counts(frame, by, start=None, end=None, **filters):
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= (frame['day'] != UNKNOWN) & (frame['day'] >= start)
+    if end is not None:
+        mask &= (frame['day'] != UNKNOWN) & (frame['day'] <= end)
+    for name, values in filters.items():
+        mask &= frame[name].isin([values] if isinstance(values, str) else values)
+    return frame[mask].groupby(by).size()
+
+@pytest.mark.parametrize('by, start, end, filters', [
+    ('category', None, None, {}),
+    ('super_neighborhood', '2024-07-01', '2024-07-31', {}),
+    ('subcategory', '2024-06-15', None, {'category': 'Storm Debris'}),
+    (['super_neighborhood', 'dataset_month'], None, None, {}),
+    (['month', 'category'], None, '2024-08-15', {'status': ['Open'], 'zip_code': '77002'}),
+])
+def test_query_matches_pandas_groupby(calls, by, start, end, filters):
+    cube = AnalyticsCube.from_dimensions(cube_dimensions(calls))
+    result = cube.query(by, start, end, **filters)
+    expected = expected_counts(labelled(calls), by, start, end, **filters)
+    pd.testing.assert_series_equal(result.sort_index(), expected.sort_index(), check_names=False,
+                                   check_dtype=False, check_index_type=False)
+    assert cube.total(start=start, end=end, **filters) == expected.sum()
+
+def test_cells_are_distinct_and_count_every_call(calls):
+    cube = AnalyticsCube.from_dimensions(cube_dimensions(calls))
+    keys = pd.DataFrame({name: cube.codes[name] for name in DIMENSIONS})
+    assert not keys.duplicated().any()
+    assert cube.counts.sum() == len(calls)
+
+def test_save_load_round_trip(tmp_path, calls):
+    cube = AnalyticsCube.from_dimensions(cube_dimensions(calls))
+    path = str(tmp_path / 'cube.npz')
+    cube.save(path)
+    loaded = AnalyticsCube.load(path)
+    pd.testing.assert_series_equal(loaded.query(['day', 'status']), cube.query(['day', 'status']))
+
+def test_neighborhood_analysis_uses_the_dataset_month(calls):
+    cube = AnalyticsCube.from_dimensions(cube_dimensions(calls))
+    analysis = neighborhood_analysis(cube)
+    frame = labelled(calls)
+    frame = frame[frame['super_neighborhood'] != UNKNOWN]
+    assert set(analysis) == set(frame['super_neighborhood'])
+    for neighborhood, rows in frame.groupby('super_neighborhood'):
+        assert analysis[neighborhood]['total_calls'] == len(rows)
+        assert analysis[neighborhood]['monthly_breakdown'] == rows['dataset_month'].value_counts().to_dict()
+
+def test_report_headers_follow_the_hand_written_reports(calls):
+    cube = AnalyticsCube.from_dimensions(cube_dimensions(calls))
+    june = month_report(cube, '2024-06').splitlines()
+    assert june[0] == 'JUNE 2024 COMPREHENSIVE ANALYSIS - AUTOMATED CATEGORIZATION RESULTS'
+    assert june[3:5] == ['TIME PERIOD: June 1-30, 2024 (30 days)',
+                         'HURRICANE BERYL: Made landfall July 8, 2024 (not yet occurred)']
+    total = cube.total(start='2024-06-01', end='2024-06-30')
+    assert june[5] == f'TOTAL JUNE CASES: {total:,} cases'
+
+    august = category_report(cube, '2024-08', 'Storm Debris').splitlines()
+    assert august[0] == 'AUGUST 2024 STORM DEBRIS ANALYSIS - AUTOMATED CATEGORIZATION RESULTS'
+    assert august[3:5] == ['TIME PERIOD: August 1-31, 2024 (31 days)',
+                           'HURRICANE BERYL: Made landfall July 8, 2024 (recovery period)']
+    assert august[5].startswith('TOTAL STORM DEBRIS CASES: ') and august[5].endswith('of all August requests)')
+    assert category_report(cube, '2024-07', 'Storm Debris').splitlines()[4] == \
+        'HURRICANE BERYL: Made landfall July 8, 2024'
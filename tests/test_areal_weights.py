@@ -0,0 +1,52 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from areal_weights import EQUAL_AREA_CRS, ArealWeights, intersection_areas
+
+def random_boxes(rng, count, size):
+    corners = rng.uniform(0, 1000, (count, 2))
+    extents = rng.uniform(size / 2, size, (count, 2))
+    return gpd.GeoDataFrame(geometry=shapely.box(corners[:, 0], corners[:, 1], corners[:, 0] + extents[:, 0],
+                                                 corners[:, 1] + extents[:, 1]), crs=EQUAL_AREA_CRS)
+
+@pytest.fixture
+def layers():
+    rng = np.random.default_rng(0)
+    return random_boxes(rng, 12, 400), random_boxes(rng, 40, 150)
+
+def brute_force_areas(targets, sources):
+    """Every target x source intersection area, one pair at a time"""
+    return np.array([[target.intersection(source).area for source in sources.geometry]
+                     for target in targets.geometry])
+
+def test_intersection_areas_match_pairwise_overlay(layers):
+    targets, sources = layers
+    matrix, target_areas = intersection_areas(targets, sources)
+    np.testing.assert_allclose(matrix.toarray(), brute_force_areas(targets, sources), rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(target_areas, targets.area)
+
+def test_weighted_mean_and_coverage_match_brute_force(layers):
+    targets, sources = layers
+    values = np.random.default_rng(1).uniform(0, 100, len(sources))
+    weights = ArealWeights(*intersection_areas(targets, sources))
+    areas = brute_force_areas(targets, sources)
+    covered = areas.sum(axis=1)
+    expected_mean = np.divide(areas @ values, covered, out=np.zeros(len(covered)), where=covered > 0)
+    np.testing.assert_allclose(weights.weighted_mean(values), expected_mean, rtol=1e-9)
+    np.testing.assert_allclose(weights.coverage_percentage(), covered * 100 / targets.area, rtol=1e-9)
+
+def test_cache_round_trip(tmp_path, layers):
+    targets, sources = layers
+    target_path, source_path = tmp_path / 'targets.geojson', tmp_path / 'sources.geojson'
+    targets.to_file(target_path)
+    sources.to_file(source_path)
+    cache_dir = tmp_path / 'cache'
+    computed = ArealWeights.load_or_compute(str(target_path), str(source_path), crs=EQUAL_AREA_CRS,
+                                            cache_dir=str(cache_dir))
+    cached = ArealWeights.load_or_compute(str(target_path), str(source_path), crs=EQUAL_AREA_CRS,
+                                          cache_dir=str(cache_dir))
+    assert len(list(cache_dir.iterdir())) == 1
+    np.testing.assert_array_equal(cached.matrix.toarray(), computed.matrix.toarray())
+    np.testing.assert_array_equal(cached.target_areas, computed.target_areas)
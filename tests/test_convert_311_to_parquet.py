@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from convert_311_to_parquet import (COLUMN_NAMES, HEADER_ROWS, SOURCE_ROW_COLUMN, convert_311_to_parquet, iter_311_parquet,
+                                    iter_311_parquet_by_date)
+
+ROWS = 500
+
+@pytest.fixture
+def extract(tmp_path):
+    """A small pipe-delimited extract whose rows jump between months"""
+    rng = np.random.default_rng(0)
+    created = pd.Timestamp('2024-06-01') + pd.to_timedelta(rng.integers(0, 90 * 24 * 60, ROWS), unit='min')
+    frame = pd.DataFrame('', index=range(ROWS), columns=COLUMN_NAMES)
+    frame['Case Number'] = [str(24000000 + i) for i in range(ROWS)]
+    frame['Created Date Local'] = created.strftime('%Y-%m-%d %H:%M:%S')
+    frame['Title'] = rng.choice(['Tree down', 'Pothole', 'Power outage'], ROWS)
+    path = tmp_path / 'extract.txt'
+    with open(path, 'w') as f:
+        f.write('meta\n' * (HEADER_ROWS - 1) + '|'.join(COLUMN_NAMES) + '\n')
+    frame.to_csv(path, sep='|', header=False, index=False, mode='a')
+    return str(path)
+
+def case_numbers(dataset_dir, **options):
+    chunks = iter_311_parquet(dataset_dir, columns=['Case Number'], batch_size=64, **options)
+    return [number for chunk in chunks for number in chunk['Case Number']]
+
+def test_rows_come_back_in_extract_order(extract):
+    dataset_dir = convert_311_to_parquet(extract, chunk_size=120)
+    assert case_numbers(dataset_dir) == list(range(24000000, 24000000 + ROWS))
+
+def test_date_range_keeps_extract_order(extract):
+    dataset_dir = convert_311_to_parquet(extract, chunk_size=120)
+    start, end = pd.Timestamp('2024-07-01'), pd.Timestamp('2024-07-31 23:59:59')
+    created = pd.read_csv(extract, sep='|', skiprows=HEADER_ROWS, header=None, names=COLUMN_NAMES,
+                          usecols=['Case Number', 'Created Date Local'], parse_dates=['Created Date Local'])
+    expected = created.loc[created['Created Date Local'].between(start, end), 'Case Number'].tolist()
+    assert case_numbers(dataset_dir, start_date=start, end_date=end) == expected
+
+def test_renamed_files_keep_extract_order(extract):
+    dataset_dir = convert_311_to_parquet(extract, chunk_size=120)
+    # Names that sort against the conversion order
+    for directory, _, files in os.walk(dataset_dir):
+        for name in files:
+            os.rename(os.path.join(directory, name), os.path.join(directory, f'part-{999 - int(name.split("-")[1])}.parquet'))
+    assert case_numbers(dataset_dir) == list(range(24000000, 24000000 + ROWS))
+
+def test_compacted_months_keep_extract_order(extract, tmp_path):
+    dataset_dir = convert_311_to_parquet(extract, chunk_size=120)
+    # One file per month partition, rows shuffled within it
+    compacted = tmp_path / 'compacted'
+    table = ds.dataset(dataset_dir, format='parquet', partitioning='hive').to_table()
+    shuffled = table.take(np.random.default_rng(1).permutation(table.num_rows))
+    pq.write_to_dataset(shuffled, root_path=str(compacted), partition_cols=['year', 'month'],
+                        basename_template='compacted-{i}.parquet')
+    assert SOURCE_ROW_COLUMN in ds.dataset(str(compacted), partitioning='hive').schema.names
+    assert case_numbers(str(compacted)) == list(range(24000000, 24000000 + ROWS))
+
+def test_date_order_across_months(extract):
+    dataset_dir = convert_311_to_parquet(extract, chunk_size=120)
+    created = pd.read_csv(extract, sep='|', skiprows=HEADER_ROWS, header=None, names=COLUMN_NAMES,
+                          usecols=['Case Number', 'Created Date Local'], parse_dates=['Created Date Local'])
+    # Rows created in the same minute keep their extract order
+    expected = created.sort_values('Created Date Local', kind='stable')
+    chunks = list(iter_311_parquet_by_date(dataset_dir, columns=['Case Number', 'Created Date Local'], batch_size=64))
+    result = pd.concat(chunks, ignore_index=True)
+    assert result['Case Number'].tolist() == expected['Case Number'].tolist()
+    assert list(result.columns) == ['Case Number', 'Created Date Local']
@@ -0,0 +1,98 @@
+import json
+
+import pandas as pd
+import pytest
+
+from dedup_311_store import LAT_COLUMN, LON_COLUMN, CaseDedupStore, build_store, iter_store_chunks
+
+def snapshot(tmp_path, name, rows):
+    """CSV snapshot of (case number, status, extract date) rows"""
+    path = tmp_path / name
+    pd.DataFrame(rows, columns=['365 Case Number', 'Status', 'Extract Date']).to_csv(path, index=False)
+    return str(path)
+
+def statuses(store):
+    frame = store.read_frame()
+    return dict(zip(frame['365 Case Number'].astype(str), frame['Status']))
+
+@pytest.fixture
+def store(tmp_path):
+    store = CaseDedupStore(str(tmp_path / 'cases.sqlite'))
+    yield store
+    store.close()
+
+def test_newest_extract_wins_in_any_merge_order(tmp_path, store):
+    older = snapshot(tmp_path, 'older.csv', [(1, 'Open', '2024-07-01'), (2, 'Open', '2024-07-01')])
+    newer = snapshot(tmp_path, 'newer.csv', [(1, 'Closed', '2024-07-02'), (3, 'Open', '2024-07-02')])
+    # The newer snapshot first: the older versions of case 1 must not replace it
+    store.merge_file(newer)
+    store.merge_file(older)
+    assert statuses(store) == {'1': 'Closed', '2': 'Open', '3': 'Open'}
+
+def test_same_extract_date_resolves_to_last_merged(tmp_path, store):
+    store.merge_file(snapshot(tmp_path, 'a.csv', [(1, 'Open', '2024-07-01')]))
+    store.merge_file(snapshot(tmp_path, 'b.csv', [(1, 'Closed', '2024-07-01')]))
+    assert statuses(store) == {'1': 'Closed'}
+
+def test_keyless_rows_pass_through(tmp_path, store):
+    rows = [(None, 'Open', '2024-07-01'), (None, 'Open', '2024-07-01'), (1, 'Open', '2024-07-01')]
+    store.merge_file(snapshot(tmp_path, 'a.csv', rows))
+    store.merge_file(snapshot(tmp_path, 'b.csv', rows))
+    # Case 1 once, every row without a case number from both snapshots
+    assert len(store) == 5
+    frame = store.read_frame()
+    assert frame['365 Case Number'].notna().sum() == 1
+
+def test_fallback_case_columns(store):
+    chunk = pd.DataFrame({'365 Case Number': [None, None, 7], 'Case Number': ['A1', None, None],
+                          'request_id': [None, 9, 8], 'Extract Date': ['2024-07-01'] * 3})
+    store.merge_frame(chunk)
+    store.merge_frame(chunk.assign(**{'Extract Date': '2024-07-02'}))
+    assert len(store) == 3
+
+def test_build_store_drops_unlisted_snapshots(tmp_path):
+    first = snapshot(tmp_path, 'first.csv', [(1, 'Open', '2024-07-01')])
+    second = snapshot(tmp_path, 'second.csv', [(2, 'Open', '2024-07-02')])
+    path = str(tmp_path / 'cases.sqlite')
+    build_store(path, [first, second]).close()
+
+    store = build_store(path, [second])
+    assert statuses(store) == {'2': 'Open'}
+    assert [record[0] for record in store.snapshots()] == [second]
+    store.close()
+
+def test_build_store_merges_only_new_snapshots(tmp_path):
+    first = snapshot(tmp_path, 'first.csv', [(1, 'Open', '2024-07-01')])
+    path = str(tmp_path / 'cases.sqlite')
+    build_store(path, [first]).close()
+    # Rows that were merged stay; only the new snapshot is read
+    store = CaseDedupStore(path)
+    store.conn.execute("UPDATE cases SET record = json_set(record, '$.Status', 'Kept')")
+    store.commit()
+    store.close()
+
+    second = snapshot(tmp_path, 'second.csv', [(2, 'Open', '2024-07-02')])
+    store = build_store(path, [first, second])
+    assert statuses(store) == {'1': 'Kept', '2': 'Open'}
+    store.close()
+
+def test_geojson_values_are_kept(tmp_path, store):
+    path = tmp_path / 'calls.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-95.3, 29.7]},
+         'properties': {'request_id': 2400000001, 'title': 'Tree down'}},
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-95.4, 29.8]},
+         'properties': {'title': 'No id'}},
+    ]}))
+    store.merge_file(str(path))
+    records = list(store.iter_records())
+    assert records[0] == {'request_id': 2400000001, 'title': 'Tree down', LON_COLUMN: -95.3, LAT_COLUMN: 29.7}
+    assert records[1]['request_id'] is None
+
+def test_store_chunks_look_like_an_extract(tmp_path):
+    path = str(tmp_path / 'cases.sqlite')
+    build_store(path, [snapshot(tmp_path, 'a.csv', [(1, 'Open', '2024-07-01 10:00:00')])]).close()
+    chunk, = iter_store_chunks(path, ['365 Case Number', 'Status', 'Extract Date', 'Title'])
+    assert list(chunk.columns) == ['365 Case Number', 'Status', 'Extract Date', 'Title']
+    assert chunk['Extract Date'].tolist() == [pd.Timestamp('2024-07-01 10:00:00')]
+    assert chunk['Title'].isna().all()
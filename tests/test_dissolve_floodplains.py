@@ -0,0 +1,34 @@
+import geopandas as gpd
+import shapely
+
+from dissolve_floodplains import SFHA_ZONES, dissolve_floodplains, layer_zone_classes, zone_classes
+
+def test_every_special_flood_hazard_zone_is_100_year():
+    assert list(zone_classes(SFHA_ZONES)) == ['100_year'] * len(SFHA_ZONES)
+    assert list(zone_classes(['ae', ' A99 ', '0.2 PCT ANNUAL CHANCE FLOOD HAZARD'])) == [
+        '100_year', '100_year', '500_year']
+
+def test_500_year_from_the_zone_subtype():
+    classes = zone_classes(['X', 'X', 'AE'], ['0.2 PCT ANNUAL CHANCE FLOOD HAZARD', 'AREA OF MINIMAL FLOOD HAZARD', None])
+    assert list(classes) == ['500_year', None, '100_year']
+
+def test_unknown_zones_are_reported(capsys):
+    classes = zone_classes(['X', 'OPEN WATER', 'AE', 'B', 'B', None])
+    assert list(classes) == [None, None, '100_year', None, None, None]
+    output = capsys.readouterr().out
+    assert "'B': 2" in output and "'<missing>': 1" in output
+    assert "'X'" not in output
+
+def test_no_report_when_every_zone_is_known(capsys):
+    zone_classes(['X', 'AH', 'VE'])
+    assert capsys.readouterr().out == ''
+
+def test_dissolve_keeps_every_100_year_zone(tmp_path):
+    squares = [shapely.box(x, 0, x + 1000, 1000) for x in range(0, 8000, 1000)]
+    layer = gpd.GeoDataFrame({'FLD_ZONE': SFHA_ZONES}, geometry=squares, crs='EPSG:32615')
+    path = tmp_path / 'flood.geojson'
+    layer.to_crs('EPSG:4326').to_file(path, driver='GeoJSON')
+    assert list(layer_zone_classes(layer)) == ['100_year'] * len(SFHA_ZONES)
+    zones = dissolve_floodplains(str(path), str(tmp_path / 'zones.gpkg'), tile_size=100000)
+    assert set(zones['zone_class']) == {'100_year'}
+    assert abs(zones['area_m2'].sum() / (8000 * 1000) - 1) < 0.01
@@ -0,0 +1,114 @@
+import importlib
+
+import pandas as pd
+import pytest
+
+from convert_311_to_parquet import COLUMN_NAMES, HEADER_ROWS
+from incremental_state import CaseStateStore, incremental_chunks, merge_with_existing
+
+beryl = importlib.import_module('311_power_outages_Beryl_refined')
+
+def cases(rows, extract_date='2024-08-01 00:00:00'):
+    """A chunk of (case number, title, status) rows from one extract"""
+    return pd.DataFrame({
+        '365 Case Number': [row[0] for row in rows],
+        'Title': [row[1] for row in rows],
+        'Status': [row[2] for row in rows],
+        'Extract Date': pd.to_datetime([extract_date] * len(rows)),
+    })
+
+@pytest.fixture
+def store(tmp_path):
+    store = CaseStateStore(str(tmp_path / 'state.sqlite'))
+    yield store
+    store.close()
+
+def staged_ids(store, chunk):
+    return store.stage_chunk(chunk)['365 Case Number'].tolist()
+
+def test_new_cases_are_processed_once(store):
+    chunk = cases([(1, 'Power outage', 'Open'), (2, 'Pothole', 'Open')])
+    assert staged_ids(store, chunk) == [1, 2]
+    store.commit()
+    assert staged_ids(store, chunk) == []
+    assert len(store) == 2
+
+def test_changed_rows_are_reprocessed(store):
+    store.stage_chunk(cases([(1, 'Power outage', 'Open'), (2, 'Pothole', 'Open'), (3, 'Tree down', 'Open')]))
+    store.commit()
+    # A new status and an edited title, from the next extract
+    later = cases([(1, 'Power outage', 'Closed'), (2, 'Pothole on Main', 'Open'), (3, 'Tree down', 'Open')],
+                  '2024-08-02 00:00:00')
+    assert staged_ids(store, later) == [1, 2]
+
+def test_rows_from_older_extracts_are_ignored(store):
+    store.stage_chunk(cases([(1, 'Power outage', 'Closed')], '2024-08-02 00:00:00'))
+    store.commit()
+    assert staged_ids(store, cases([(1, 'Power outage', 'Open')], '2024-08-01 00:00:00')) == []
+    assert staged_ids(store, cases([(1, 'No power', 'Closed')], '2024-08-02 00:00:00')) == [1]
+
+def test_rollback_keeps_the_previous_state(store):
+    store.stage_chunk(cases([(1, 'Power outage', 'Open')]))
+    store.rollback()
+    assert len(store) == 0
+
+def test_merge_with_existing_replaces_changed_cases(tmp_path):
+    csv_path = tmp_path / 'out.csv'
+    pd.DataFrame({'request_id': [1, 2, 3], 'title': ['a', 'b', 'c']}).to_csv(csv_path, index=False)
+    new_rows = pd.DataFrame({'request_id': [2, 4], 'title': ['B', 'd']})
+    # 3 changed and no longer matches
+    merged = merge_with_existing(str(csv_path), new_rows, {'2', '3', '4'})
+    assert merged.sort_values('request_id').to_dict('list') == {'request_id': [1, 2, 4], 'title': ['a', 'B', 'd']}
+    assert merge_with_existing(str(tmp_path / 'missing.csv'), new_rows, {'2', '4'}) is new_rows
+
+def test_incremental_chunks_collect_changed_ids(store):
+    chunks = [cases([(1, 'Power outage', 'Open')]), cases([(1, 'Power outage', 'Open')])]
+    changed_ids = set()
+    assert [len(chunk) for chunk in incremental_chunks(chunks, store, changed_ids)] == [1]
+    assert changed_ids == {'1'}
+
+def write_extract(path, rows, extract_date):
+    """Raw pipe-delimited extract of (case number, title, description, created, status, lat, lon) rows"""
+    frame = pd.DataFrame('', index=range(len(rows)), columns=COLUMN_NAMES)
+    for column, values in zip(['365 Case Number', 'Title', 'Description', 'Created Date Local', 'Status',
+                               'Latitude', 'Longitude'], zip(*rows)):
+        frame[column] = values
+    frame['Extract Date'] = extract_date
+    with open(path, 'w') as f:
+        f.write('meta\n' * (HEADER_ROWS - 1) + '|'.join(COLUMN_NAMES) + '\n')
+    frame.to_csv(path, sep='|', header=False, index=False, mode='a')
+
+FIRST_EXTRACT = [
+    ('2400000001', 'Power outage', 'no power', '2024-07-08 10:00:00', 'Open', '29.76', '-95.36'),
+    ('2400000002', 'Pothole', 'deep', '2024-07-09 10:00:00', 'Open', '29.75', '-95.37'),
+    ('2400000003', 'Street light out', 'dark', '2024-07-10 10:00:00', 'Open', '29.74', '-95.38'),
+    ('2400000004', 'Power line down', 'on fence', '2024-07-11 10:00:00', 'Open', '29.73', '-95.39'),
+]
+
+SECOND_EXTRACT = [
+    # Closed
+    ('2400000001', 'Power outage', 'no power', '2024-07-08 10:00:00', 'Closed', '29.76', '-95.36'),
+    # Now matches
+    ('2400000002', 'Pothole', 'hit a pole, no power', '2024-07-09 10:00:00', 'Open', '29.75', '-95.37'),
+    # Unchanged
+    ('2400000003', 'Street light out', 'dark', '2024-07-10 10:00:00', 'Open', '29.74', '-95.38'),
+    # No longer matches
+    ('2400000004', 'Tree limb', 'on fence', '2024-07-11 10:00:00', 'Open', '29.73', '-95.39'),
+    # New
+    ('2400000005', 'CenterPoint', 'transformer', '2024-07-12 10:00:00', 'Open', '29.72', '-95.40'),
+]
+
+def test_incremental_run_matches_full_rerun(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_extract('first.txt', FIRST_EXTRACT, '2024-08-01 00:00:00')
+    write_extract('second.txt', SECOND_EXTRACT, '2024-08-02 00:00:00')
+
+    beryl.process_311_data('first.txt', 'incremental', incremental=True, geojson_mode='compact')
+    beryl.process_311_data('second.txt', 'incremental', incremental=True, geojson_mode='compact')
+    beryl.process_311_data('second.txt', 'full', geojson_mode='compact')
+
+    incremental = pd.read_csv('incremental.csv')
+    full = pd.read_csv('full.csv')
+    assert incremental['request_id'].tolist() == [2400000005, 2400000003, 2400000002, 2400000001]
+    pd.testing.assert_frame_equal(incremental, full)
+    assert (tmp_path / 'incremental.geojson').read_text() == (tmp_path / 'full.geojson').read_text()
@@ -0,0 +1,68 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from category_rules import (BERYL_POWER_KEYWORDS, CONTEXT_WORDS, POWER_EXCLUDE_KEYWORDS, POWER_INDICATORS,
+                            POWER_LINE_KEYWORDS, POWER_OUTAGE_KEYWORDS, POWER_OUTAGE_MATCHER,
+                            TRAFFIC_STREET_LIGHT_KEYWORDS, UTILITY_KEYWORDS, classify_power_outages,
+                            is_actual_power_outage)
+from keyword_matcher import KeywordMatcher, has_any, normalize_text
+
+DIRECT_KEYWORDS = (POWER_OUTAGE_KEYWORDS + POWER_LINE_KEYWORDS + UTILITY_KEYWORDS + BERYL_POWER_KEYWORDS
+                   + TRAFFIC_STREET_LIGHT_KEYWORDS)
+
+CASES = [str.lower, str.upper, str.title]
+
+def power_outage_fixture():
+    """(title, description) pairs reaching every branch of is_actual_power_outage"""
+    pairs = []
+    # Every direct keyword, in either column and any case
+    for keyword, case in itertools.product(DIRECT_KEYWORDS, CASES):
+        pairs.append((f'Report: {case(keyword)}', 'see notes'))
+        pairs.append(('Service request', f'caller says {case(keyword)} on the block'))
+    # Context words alone, with an indicator, and with an indicator plus an exclusion, split across the columns
+    for context, indicator, exclude in itertools.product(CONTEXT_WORDS, POWER_INDICATORS, POWER_EXCLUDE_KEYWORDS):
+        case = CASES[len(pairs) % len(CASES)]
+        pairs.append((case(f'{context} here'), 'no details'))
+        pairs.append((case(context), case(f'the {indicator} again')))
+        pairs.append((case(f'{context} {indicator}'), case(exclude)))
+        pairs.append((case(exclude), case(f'{indicator}, {context}')))
+    # Keywords only as parts of other words, and no keywords at all
+    pairs += [('Outfield', 'Lightning'), ('Sidewalk repair', 'Cracked'), ('Tree down', 'Storm debris'),
+              ('nan', 'nan'), ('', ''), ('POWER', 'OUTAGE'), ('Power', 'Garbage outage')]
+    titles, descriptions = zip(*pairs)
+    return list(titles), list(descriptions)
+
+def test_classify_power_outages_matches_scalar_filter():
+    titles, descriptions = power_outage_fixture()
+    expected = np.array([is_actual_power_outage(t, d) for t, d in zip(titles, descriptions)])
+    # Both outcomes are exercised
+    assert expected.any() and not expected.all()
+    np.testing.assert_array_equal(classify_power_outages(titles, descriptions), expected)
+
+def test_missing_values_match_str_conversion():
+    titles = [None, np.nan, 'Power outage', np.nan]
+    descriptions = ['no power', None, np.nan, np.nan]
+    expected = [is_actual_power_outage(str(t), str(d)) for t, d in zip(titles, descriptions)]
+    np.testing.assert_array_equal(classify_power_outages(titles, descriptions), expected)
+
+@pytest.mark.parametrize('name, keywords', [
+    ('power_outage', POWER_OUTAGE_KEYWORDS),
+    ('context', CONTEXT_WORDS),
+    ('exclude', POWER_EXCLUDE_KEYWORDS),
+    ('indicator', POWER_INDICATORS),
+])
+def test_matcher_bits_match_substring_checks(name, keywords):
+    titles, descriptions = power_outage_fixture()
+    bits = POWER_OUTAGE_MATCHER.match_any(titles, descriptions)
+    expected = [any(k in t.lower() or k in d.lower() for k in keywords) for t, d in zip(titles, descriptions)]
+    np.testing.assert_array_equal(has_any(bits, POWER_OUTAGE_MATCHER.mask(name)), expected)
+
+def test_keywords_are_literals():
+    matcher = KeywordMatcher({'symbols': ['a.b', '(x)', 'c+'], 'plain': ['ab']})
+    texts = normalize_text(['A.B', 'axb', '(X)', 'x', 'C+', 'cc', 'AB'])
+    np.testing.assert_array_equal(has_any(matcher.match(texts), matcher.mask('symbols')),
+                                  [True, False, True, False, True, False, False])
+    np.testing.assert_array_equal(has_any(matcher.match(texts), matcher.mask('plain')),
+                                  [False, False, False, False, False, False, True])
@@ -0,0 +1,73 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+import multi_resolution_vulnerability as mrv
+from areal_weights import EQUAL_AREA_CRS
+from geography_ids import TRACT_GEOID_LENGTH
+from multi_resolution_vulnerability import COUNT_COLUMNS, membership_matrix, rollup, share_matrix
+
+@pytest.fixture
+def block_groups():
+    """A 6 x 5 grid of 1 km block groups, three per tract"""
+    cells = [(x, y) for x in range(6) for y in range(5)]
+    geoids = [f'48201{tract:06d}{group}' for tract, group in
+              zip(np.repeat(np.arange(12), 3)[:len(cells)], np.tile([1, 2, 3], 12)[:len(cells)])]
+    return gpd.GeoDataFrame({'GEOID': geoids},
+                            geometry=[shapely.box(x * 1000, y * 1000, (x + 1) * 1000, (y + 1) * 1000) for x, y in cells],
+                            crs=EQUAL_AREA_CRS)
+
+@pytest.fixture
+def fine_factors(block_groups):
+    rng = np.random.default_rng(0)
+    count = len(block_groups)
+    return pd.DataFrame({
+        'area_m2': block_groups.area.to_numpy(),
+        'call_count': rng.integers(0, 50, count),
+        'income_area': rng.uniform(0, 1e10, count),
+        'income_covered_area': rng.uniform(0, 1e6, count),
+        'flood_area_m2': rng.uniform(0, 1e6, count),
+        'center_count': rng.integers(0, 3, count),
+        'total_square_footage': rng.uniform(0, 1e4, count),
+        'church_count': rng.integers(0, 5, count),
+        'total_church_area': rng.uniform(0, 1e4, count),
+    })
+
+def test_tract_rollup_matches_groupby(block_groups, fine_factors):
+    tracts = block_groups['GEOID'].str[:TRACT_GEOID_LENGTH].to_numpy()
+    matrix, tract_ids = membership_matrix(tracts, len(block_groups))
+    coarse = rollup(fine_factors, matrix)
+
+    expected = fine_factors.groupby(tracts).sum()
+    assert list(tract_ids) == list(expected.index)
+    for column in fine_factors.columns:
+        if column in COUNT_COLUMNS:
+            np.testing.assert_array_equal(coarse[column], expected[column])
+        else:
+            np.testing.assert_allclose(coarse[column], expected[column], rtol=1e-12)
+
+def test_area_share_rollup_matches_direct_apportionment(tmp_path, monkeypatch, block_groups, fine_factors):
+    rng = np.random.default_rng(1)
+    corners = rng.uniform(-500, 5000, (5, 2))
+    coarse = gpd.GeoDataFrame(geometry=shapely.box(corners[:, 0], corners[:, 1], corners[:, 0] + 2500,
+                                                   corners[:, 1] + 2000), crs=EQUAL_AREA_CRS)
+    block_groups_path, coarse_path = tmp_path / 'block_groups.geojson', tmp_path / 'coarse.geojson'
+    block_groups.to_file(block_groups_path)
+    coarse.to_file(coarse_path)
+    monkeypatch.setattr(mrv, 'BLOCK_GROUPS_FILE', str(block_groups_path))
+    monkeypatch.setattr(mrv, 'WEIGHTS_CACHE', str(tmp_path / 'areal_weights_cache'))
+
+    matrix = share_matrix(str(coarse_path), coarse, block_groups, fine_factors['area_m2'].to_numpy())
+    rolled = rollup(fine_factors, matrix)
+
+    # Each block group's factors, split by the share of its area inside every coarse polygon
+    shares = np.array([[unit.intersection(polygon).area / unit.area for unit in block_groups.geometry]
+                       for polygon in coarse.geometry])
+    for column in fine_factors.columns:
+        expected = shares @ fine_factors[column].to_numpy(dtype=float)
+        if column in COUNT_COLUMNS:
+            np.testing.assert_array_equal(rolled[column], np.rint(expected).astype(int))
+        else:
+            np.testing.assert_allclose(rolled[column], expected, rtol=1e-9)
@@ -0,0 +1,28 @@
+import os
+
+import pandas as pd
+
+from query_311 import Query311
+
+def calls_csv(path, request_ids, category):
+    pd.DataFrame({'request_id': request_ids, 'created_date': '2024-07-08 10:00:00', 'distance_meters': 100.0,
+                  'nearby_center': 'Center', 'category': category}).to_csv(path, index=False)
+
+def test_calls_view_keeps_every_call_without_a_case_number(tmp_path):
+    calls_csv(tmp_path / 'storm_debris_calls_2024-07-08_to_2024-07-30.csv', [None, None, None, 24000001],
+              'storm_debris')
+    db = Query311(data_dir=str(tmp_path)).register_defaults()
+    assert db.query('SELECT count(*) AS calls FROM calls')['calls'][0] == 4
+    db.close()
+
+def test_calls_view_takes_a_repeated_call_from_the_newest_file(tmp_path):
+    older = tmp_path / 'other_calls_2024-07-01_to_2024-07-31.csv'
+    newer = tmp_path / 'other_calls_2024-07-08_to_2024-07-30.csv'
+    calls_csv(older, [24000001, 24000002, None], 'old rules')
+    calls_csv(newer, [24000001, None], 'new rules')
+    os.utime(older, (1, 1))
+    db = Query311(data_dir=str(tmp_path)).register_defaults()
+    calls = db.query('SELECT request_id, category FROM calls ORDER BY request_id NULLS LAST, category')
+    db.close()
+    assert calls['request_id'].tolist()[:2] == [24000001, 24000002]
+    assert calls['category'].tolist() == ['new rules', 'old rules', 'new rules', 'old rules']
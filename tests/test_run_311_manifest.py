@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import run_311_manifest
+from run_311_manifest import load_manifest, run_job
+
+def write_manifest(tmp_path, manifest):
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps(manifest))
+    return str(path)
+
+def test_default_prefixes_follow_the_input(tmp_path):
+    jobs = load_manifest(write_manifest(tmp_path, {'jobs': [
+        {'input': 'public/311.txt'},
+        {'input': 'public/extracts/311_2023.txt'},
+        {'input': 'public/extracts/311_2022.txt', 'output_prefix': 'public/2022/311'},
+    ]}))
+    assert [job['output_prefix'] for job in jobs] == ['public/311', 'public/311_2023', 'public/2022/311']
+
+def test_duplicate_prefixes_are_rejected(tmp_path):
+    path = write_manifest(tmp_path, {'jobs': [
+        {'input': 'public/311.txt', 'windows': [{'label': 'Beryl', 'start': '2024-07-08', 'end': '2024-07-30'}]},
+        {'input': 'public/311.txt', 'windows': [{'label': 'June', 'start': '2024-06-01', 'end': '2024-06-30'}]},
+    ]})
+    with pytest.raises(ValueError, match='public/311'):
+        load_manifest(path)
+
+def test_failing_jobs_are_recorded_as_failed(monkeypatch):
+    def process_311_file(path, **options):
+        if path == 'raises.txt':
+            raise OSError('disk full')
+        if path == 'returns_none.txt':
+            return None
+        return {'rows': 10, 'matches': {'June': 3}}
+
+    monkeypatch.setattr(run_311_manifest.processor, 'process_311_file', process_311_file)
+    summaries = [run_job({'input': name, 'output_prefix': f'out/{name}'})
+                 for name in ['raises.txt', 'returns_none.txt', 'ok.txt']]
+    assert [summary['status'] for summary in summaries] == ['failed', 'failed', 'ok']
+    assert summaries[0]['error'] == 'OSError: disk full'
+    assert summaries[2]['rows'] == 10 and summaries[2]['matches'] == {'June': 3}
@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+import pytest
+
+import surge_detector
+from surge_detector import ALL, EwmaBaseline, SurgeDetector, follow, follow_feed, ordered_calls
+
+def step_by_step(counts, alpha):
+    """EWMA mean and variance folding in one bucket at a time, empty buckets included"""
+    mean = variance = 0.0
+    for count in counts:
+        difference = count - mean
+        increment = alpha * difference
+        mean += increment
+        variance = (1 - alpha) * (variance + difference * increment)
+    return mean, variance
+
+@pytest.mark.parametrize('alpha', [0.01, 0.2, 0.9])
+def test_closed_form_gaps_match_step_by_step_updates(alpha):
+    rng = np.random.default_rng(0)
+    # Sparse calls: most buckets are empty, some gaps are long
+    buckets = np.cumsum(rng.geometric(0.15, 300))
+    counts = np.bincount(buckets)
+    baseline = EwmaBaseline(int(buckets[0]))
+    for bucket in buckets:
+        if bucket > baseline.bucket:
+            baseline.advance(int(bucket), alpha)
+        baseline.count += 1
+    # Close the last bucket and ten empty ones after it
+    end = int(buckets[-1]) + 11
+    baseline.advance(end, alpha)
+    mean, variance = step_by_step(np.concatenate([counts[buckets[0]:], np.zeros(10)]), alpha)
+    assert baseline.mean == pytest.approx(mean, rel=1e-9, abs=1e-12)
+    assert baseline.variance == pytest.approx(variance, rel=1e-9, abs=1e-12)
+
+def test_late_calls_are_counted_once_per_call():
+    detector = SurgeDetector()
+    detector.observe_bucket(10, 'A', 'x')
+    detector.observe_bucket(12, 'A', 'y')
+    detector.observe_bucket(12, 'B', 'x')
+    # (A, x) is still open at bucket 10, but (A, All) and (All, x) have moved on to 12
+    detector.observe_bucket(11, 'A', 'x')
+    assert detector.late == 1
+    assert detector.baselines[('A', 'x')].count == 1
+    assert detector.baselines[('A', ALL)].count == 1
+    detector.observe_bucket(5, 'A', 'x')
+    assert detector.late == 2
+
+def test_surge_alerts_once_per_bucket_after_warmup():
+    detector = SurgeDetector(bucket_minutes=60, half_life_hours=24, threshold=4.0, min_calls=5, warmup_hours=48)
+    alerts = []
+    for bucket in range(100):
+        alerts += detector.observe_bucket(bucket, 'A', 'x')
+    assert alerts == []
+    for _ in range(20):
+        alerts += detector.observe_bucket(100, 'A', 'x')
+    keys = [(alert['neighborhood'], alert['category']) for alert in alerts]
+    assert sorted(keys) == sorted([('A', 'x'), ('A', ALL), (ALL, 'x')])
+    assert all(alert['calls'] == alerts[0]['calls'] >= 5 for alert in alerts)
+
+def chunked(buckets, size):
+    labels = np.arange(len(buckets)).astype(object)
+    return [(buckets[i:i + size], labels[i:i + size], labels[i:i + size]) for i in range(0, len(buckets), size)]
+
+def test_reorder_buffer_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    # Every call at most 5 buckets out of order
+    buckets = np.sort(rng.integers(0, 500, 2000)) + rng.integers(0, 6, 2000)
+    calls = list(ordered_calls(chunked(buckets, 100), window=5))
+    order = np.argsort(buckets, kind='stable')
+    assert [call[0] for call in calls] == buckets[order].tolist()
+    assert [call[1] for call in calls] == order.tolist()
+
+def test_reorder_buffer_passes_very_late_calls_on():
+    buckets = np.array([10, 11, 30, 31, 2, 40])
+    calls = [call[0] for call in ordered_calls(chunked(buckets, 2), window=5)]
+    assert sorted(calls) == sorted(buckets.tolist())
+    # 2 arrived after buckets up to 25 had been released
+    assert calls == [10, 11, 2, 30, 31, 40]
+
+def test_follow_batches_lines_and_skips_malformed_ones(tmp_path, capsys):
+    feed = tmp_path / 'feed.jsonl'
+    feed.write_text(json.dumps({'Title': 'a'}) + '\n{not json\n[1, 2]\n\n' + json.dumps({'Title': 'b'}) + '\n'
+                    + '{"Title": "partial')
+    batch = next(follow(str(feed), poll_seconds=0))
+    assert batch == [{'Title': 'a'}, {'Title': 'b'}]
+    assert 'Skipping malformed feed line' in capsys.readouterr().out
+
+class CountingEnricher:
+    def __init__(self):
+        self.queries = []
+
+    def label(self, name, points):
+        self.queries.append(len(points))
+        return np.full(len(points), 'A', dtype=object)
+
+def test_follow_feed_labels_a_batch_at_once(monkeypatch):
+    calls = [{'365 Case Number': str(i), 'Title': 'Tree down', 'Description': '', 'Longitude': -95.3,
+              'Latitude': 29.7, 'Created Date Local': f'2024-07-08 {i % 24:02d}:00:00'} for i in range(30)]
+    calls[3]['Created Date Local'] = None
+    monkeypatch.setattr(surge_detector, 'follow', lambda path, poll_seconds: iter([calls[:20], calls[20:]]))
+    enricher = CountingEnricher()
+    detector = SurgeDetector()
+    list(follow_feed('feed.jsonl', detector, enricher))
+    assert enricher.queries == [20, 10]
+    assert detector.calls == 29